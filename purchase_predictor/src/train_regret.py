@@ -0,0 +1,150 @@
+"""
+Train the local regret classifier from LLM-scored transactions.
+
+Reads every transaction whose regret score came from the LLM (source = 'llm'
+in transaction_metadata), fits a logistic regression on the shared
+regret_features and exports the weights as JSON for server_py/regret_model.py.
+The server picks up a new model file without a restart.
+
+Usage: python purchase_predictor/src/train_regret.py [--db finance.db] [--model out.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import (
+    accuracy_score,
+    precision_score,
+    recall_score,
+    f1_score,
+    roc_auc_score,
+    confusion_matrix,
+)
+
+# ----------------------------
+# Config
+# ----------------------------
+ROOT = Path(__file__).resolve().parents[1]
+SERVER_DIR = ROOT.parent / "server_py"
+
+MIN_TRAINING_ROWS = 50
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--db", help="SQLite database (default: FINANCE_DB_PATH or server_py/finance.db)")
+parser.add_argument("--model", help="Output model path (default: models/regret_classifier.json)")
+args = parser.parse_args()
+
+if args.db:
+    os.environ["FINANCE_DB_PATH"] = args.db
+sys.path.insert(0, str(SERVER_DIR))
+import database  # noqa: E402
+from regret_model import (  # noqa: E402
+    MODEL_PATH, REGRET_LABEL_THRESHOLD, REGRET_MODEL_HIGH, REGRET_MODEL_LOW,
+    RegretClassifier, regret_features,
+)
+
+model_path = Path(args.model) if args.model else MODEL_PATH
+
+# ----------------------------
+# 1) Load data
+# ----------------------------
+rows = database.get_regret_training_rows()
+labels = np.array([int(r["regret_score"] >= REGRET_LABEL_THRESHOLD) for r in rows])
+
+print(f"Loaded {len(rows)} LLM-scored transactions")
+if len(rows) < MIN_TRAINING_ROWS or len(set(labels)) < 2:
+    sys.exit(f"Need at least {MIN_TRAINING_ROWS} scored transactions with both outcomes; not training.")
+print(f"Regretted ratio: {labels.mean():.2f}")
+
+vectorizer = DictVectorizer()
+X = vectorizer.fit_transform([regret_features(r) for r in rows])
+y = labels
+
+# ----------------------------
+# 2) Train/test split (stratified)
+# ----------------------------
+X_train, X_test, y_train, y_test, rows_train, rows_test = train_test_split(
+    X, y, rows, test_size=0.2, random_state=42, stratify=y,
+)
+
+# ----------------------------
+# 3) Train logistic regression
+# ----------------------------
+model = LogisticRegression(max_iter=2000, class_weight="balanced")
+
+print("\nTraining model...")
+model.fit(X_train, y_train)
+
+# ----------------------------
+# 4) Evaluate
+# ----------------------------
+probs = model.predict_proba(X_test)[:, 1]
+preds = (probs >= 0.5).astype(int)
+
+acc = accuracy_score(y_test, preds)
+prec = precision_score(y_test, preds, zero_division=0)
+rec = recall_score(y_test, preds, zero_division=0)
+f1 = f1_score(y_test, preds, zero_division=0)
+auc = roc_auc_score(y_test, probs)
+cm = confusion_matrix(y_test, preds)
+
+confident = (probs <= REGRET_MODEL_LOW) | (probs >= REGRET_MODEL_HIGH)
+coverage = confident.mean()
+confident_acc = accuracy_score(y_test[confident], preds[confident]) if confident.any() else float("nan")
+
+print("\n--- Metrics (threshold=0.50) ---")
+print(f"Accuracy : {acc:.3f}")
+print(f"Precision: {prec:.3f}")
+print(f"Recall   : {rec:.3f}")
+print(f"F1       : {f1:.3f}")
+print(f"AUC      : {auc:.3f}")
+print(f"\nConfusion Matrix:\n{cm}")
+print(f"\n--- Confidence band ({REGRET_MODEL_LOW:.2f}, {REGRET_MODEL_HIGH:.2f}) ---")
+print(f"Scored locally : {coverage:.1%} of test transactions")
+print(f"Local accuracy : {confident_acc:.3f}")
+print(f"Sent to LLM    : {1 - coverage:.1%}")
+
+# ----------------------------
+# 5) Save model + metadata
+# ----------------------------
+weights = {
+    name: round(float(w), 6)
+    for name, w in zip(vectorizer.get_feature_names_out(), model.coef_[0])
+    if w != 0
+}
+exported = {
+    "model_type": "logistic_regression",
+    "intercept": float(model.intercept_[0]),
+    "weights": weights,
+    "label_threshold": REGRET_LABEL_THRESHOLD,
+    "trained_rows": len(rows),
+    "trained_at": datetime.now(timezone.utc).isoformat(),
+    "metrics": {
+        "accuracy": round(acc, 4), "auc": round(auc, 4), "f1": round(f1, 4),
+        "band_coverage": round(float(coverage), 4), "band_accuracy": round(float(confident_acc), 4),
+    },
+    "notes": "Weights are keyed by regret_model.regret_features names; missing features weigh 0.",
+}
+model_path.parent.mkdir(parents=True, exist_ok=True)
+with open(model_path, "w") as f:
+    json.dump(exported, f, indent=2)
+
+# Inference speed of the exported model, as the server runs it
+classifier = RegretClassifier(model_path)
+classifier.load()
+start = time.perf_counter()
+for r in rows_test:
+    classifier.predict_proba(r)
+per_txn_us = (time.perf_counter() - start) / len(rows_test) * 1e6
+print(f"\nInference: {per_txn_us:.1f} µs per transaction")
+
+print(f"\nSaved model to: {model_path}")
@@ -0,0 +1,144 @@
+"""
+Adaptive Concurrency Limiter
+
+AIMD (additive increase, multiplicative decrease) limit on in-flight upstream
+requests, in the spirit of TCP congestion control:
+
+- Every healthy response raises the limit by 1/limit, so about +1 per round trip.
+- A throttled/failed response (429, 5xx, timeout), or recent latency well above
+  the longer-run baseline, cuts the limit by `backoff`, at most once per round trip.
+
+Latency is compared as averages (a fast EWMA against a slow one) so a mix of
+naturally fast and slow endpoints doesn't read as overload.
+
+Requests over the limit wait in FIFO order instead of piling onto a struggling
+upstream. UpstreamGovernor combines a global cap with one limiter per host.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.7,
+        latency_tolerance: float = 2.0,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._baseline: Optional[float] = None
+        self._recent: Optional[float] = None
+        self._last_decrease = 0.0
+        self._stats = {"increases": 0, "decreases": 0, "waited": 0}
+
+    async def acquire(self) -> None:
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return
+        self._stats["waited"] += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record(self, latency: float, overloaded: bool = False) -> None:
+        """Feed back one response: its latency and whether upstream signalled overload."""
+        if not overloaded:
+            if self._baseline is None:
+                self._baseline = self._recent = latency
+            else:
+                self._recent += 0.2 * (latency - self._recent)
+                self._baseline += 0.01 * (latency - self._baseline)
+        slow = self._recent is not None and self._recent > self._baseline * self.latency_tolerance
+
+        if overloaded or slow:
+            now = time.monotonic()
+            if now - self._last_decrease >= (self._baseline or latency):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                self._stats["decreases"] += 1
+        else:
+            if self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._stats["increases"] += 1
+            self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "baseline_latency_ms": round(self._baseline * 1000, 1) if self._baseline else None,
+            "recent_latency_ms": round(self._recent * 1000, 1) if self._recent else None,
+        }
+
+
+class UpstreamGovernor:
+    """
+    Global cap on in-flight upstream requests plus an AdaptiveLimiter per host.
+    A request takes its host slot first, then a global slot, so requests queued
+    behind one slow host never hold global capacity other hosts could use.
+    """
+
+    def __init__(self, global_limit: int = 64, **limiter_options):
+        self.global_limit = global_limit
+        self._global = asyncio.Semaphore(global_limit)
+        self._limiter_options = limiter_options
+        self._hosts: Dict[str, AdaptiveLimiter] = {}
+
+    def limiter(self, host: str) -> AdaptiveLimiter:
+        if host not in self._hosts:
+            self._hosts[host] = AdaptiveLimiter(**self._limiter_options)
+        return self._hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        async with self.limiter(host).slot():
+            async with self._global:
+                yield
+
+    def record(self, host: str, latency: float, overloaded: bool = False) -> None:
+        self.limiter(host).record(latency, overloaded)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "global_limit": self.global_limit,
+            "hosts": {host: limiter.stats() for host, limiter in self._hosts.items()},
+        }
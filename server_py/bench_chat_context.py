@@ -0,0 +1,155 @@
+"""
+Advisor prompt size benchmark: full context vs the token-budgeted ContextBuilder.
+
+For each session it builds the final chat request both ways: the previous
+one (system prompt with the raw financialContext, plus every message) and
+ContextBuilder's budgeted one. It reports prompt tokens and the builder's own
+overhead. With --live (and EXPO_PUBLIC_DEDALUS_API_KEY set) it also streams
+both variants from the model and reports time to first token.
+
+Sessions come from a JSONL file of recorded /api/advisor/chat request bodies
+({messages, financialContext, surveyContext} per line) via --sessions. By
+default, sessions of 1, 10 and 30 turns are generated in the app's
+financial-context format.
+
+Usage: python server_py/bench_chat_context.py [--sessions recorded.jsonl] [--live] [--model openai/gpt-4o-mini]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SERVER_DIR)
+
+MERCHANTS = [("DoorDash", "Food and Drink"), ("Whole Foods", "Food and Drink"), ("Amazon", "Shops"),
+             ("Shell", "Travel"), ("Netflix", "Service"), ("Uber", "Travel"), ("Target", "Shops")]
+QUESTIONS = ["How much did I spend on food this week?", "Am I on track with my dining budget?",
+             "What should I cut back on?", "Can I afford a $1,200 laptop next month?",
+             "How do my subscriptions add up?", "Where do I overspend the most?"]
+
+
+def financial_context():
+    lines = ["Net Worth: $18,240", "", "Accounts:",
+             "- Plaid Checking (depository): $4,210", "- Plaid Saving (depository): $12,500",
+             "- Plaid Credit Card (credit): $1,530", "- Plaid IRA (investment): $3,060"]
+    txns = []
+    for i in range(15):
+        merchant, category = random.choice(MERCHANTS)
+        txns.append(f"- 2026-10-{18 - i // 2:02d}: {merchant} ${random.uniform(5, 140):.2f} "
+                    f"[{category}, Restaurants] (San Francisco, CA)")
+    lines += ["", "Recent Spending (7 days): $642.18", "Number of transactions: 15", "", "Recent Transactions:", *txns,
+              "", "Monthly Budgets:", "- Dining: $210.40 / $300 (70%)", "- Shopping: $180.00 / $250 (72%)",
+              "- Transport: $95.20 / $150 (63%)", "",
+              "Danger Zones (locations with high regret spending):",
+              "- DoorDash: 6 regretted purchases (37.775, -122.418)", "- Target: 3 regretted purchases (37.784, -122.407)",
+              "", "Purchase Prediction: 72% probability (high risk) — NUDGE ACTIVE"]
+    return "\n".join(lines)
+
+
+SURVEY_CONTEXT = """spending_profile:
+  regret_triggers: Late-night food delivery and impulse online shopping
+  goals: Build a 6-month emergency fund and pay down the credit card
+  watch_categories: Food and Drink, Shops, Travel
+
+behavioral_insights:
+  summary: "Spending clusters late at night on delivery apps."
+  high_regret_areas: [Food and Drink (Avg Score: 71), Shops (Avg Score: 58)]"""
+
+
+def generated_session(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": random.choice(QUESTIONS)})
+        if i < turns - 1:
+            reply = " ".join(random.choice(["Your", "dining", "spend", "is", "$210", "this", "month,", "which",
+                                             "is", "70%", "of", "budget.", "Consider", "cooking", "twice", "a",
+                                             "week."]) for _ in range(220))
+            messages.append({"role": "assistant", "content": reply})
+    return {"messages": messages, "financialContext": financial_context(), "surveyContext": SURVEY_CONTEXT,
+            "label": f"{turns} turns"}
+
+
+async def first_token_latency(client, model, messages):
+    start = time.perf_counter()
+    stream = await client.chat_completion(model, messages, stream=True)
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            return time.perf_counter() - start
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", help="JSONL of recorded /api/advisor/chat request bodies")
+    parser.add_argument("--live", action="store_true", help="Also measure time to first token against the model")
+    parser.add_argument("--model", default="openai/gpt-4o-mini")
+    parser.add_argument("--runs", type=int, default=3, help="TTFT samples per variant (median reported)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "bench")
+    from chat import ChatService
+    from context_builder import message_tokens, count_tokens, _encoding
+
+    random.seed(3)
+    if args.sessions:
+        with open(args.sessions) as f:
+            sessions = [json.loads(line) for line in f if line.strip()]
+        for i, s in enumerate(sessions):
+            s.setdefault("label", f"recorded #{i + 1}")
+    else:
+        sessions = [generated_session(turns) for turns in (1, 10, 30)]
+
+    service = ChatService()
+    builder = service.context_builder
+    print(f"Token counts via {'tiktoken' if _encoding is not None else '4-chars-per-token estimate'}; "
+          f"budget {builder.token_budget} ({builder.financial_budget} for financial data, "
+          f"{builder.survey_budget} for the survey)\n")
+    print(f"{'session':>12}  {'msgs':>4}  {'before':>7}  {'after':>6}  {'saved':>6}  {'build':>8}  {'kept/summarized':>15}")
+
+    rows = []
+    for s in sessions:
+        messages = s["messages"]
+        financial, survey = s.get("financialContext", ""), s.get("surveyContext", "")
+        before = [{"role": "system", "content": service._get_system_prompt(financial, survey)}] + messages
+
+        builder._compacted.clear()  # time a cold compaction
+        start = time.perf_counter()
+        after, report = builder.build(
+            service._get_system_prompt(builder.compact_financial_context(financial),
+                                       builder.compact_survey_context(survey)), messages
+        )
+        build_ms = (time.perf_counter() - start) * 1000
+
+        before_tokens, after_tokens = message_tokens(before), report["prompt_tokens"]
+        print(f"{s['label']:>12}  {len(messages):>4}  {before_tokens:>7}  {after_tokens:>6}  "
+              f"{1 - after_tokens / before_tokens:>6.0%}  {build_ms:>6.2f}ms  "
+              f"{report['kept_messages']:>7}/{report['summarized_messages']:<7}")
+        rows.append((s["label"], before, after))
+
+    financial = sessions[0].get("financialContext", "")
+    print(f"\nFinancial context: {count_tokens(financial)} tokens raw -> "
+          f"{count_tokens(builder.compact_financial_context(financial))} compacted")
+
+    if not args.live:
+        print("\nTime to first token not measured (run with --live and EXPO_PUBLIC_DEDALUS_API_KEY set).")
+        return
+
+    print(f"\nTime to first token, median of {args.runs} ({args.model})\n")
+    print(f"{'session':>12}  {'before':>8}  {'after':>8}")
+    for label, before, after in rows:
+        samples = {"before": [], "after": []}
+        for _ in range(args.runs):
+            for variant, messages in (("before", before), ("after", after)):
+                samples[variant].append(await first_token_latency(service.dedalus_client, args.model, messages))
+        print(f"{label:>12}  {statistics.median(samples['before']) * 1000:>6.0f}ms  "
+              f"{statistics.median(samples['after']) * 1000:>6.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+Nessie snapshot benchmark: client per request vs one pooled client.
+
+Starts a local HTTPS stand-in for the Nessie API (self-signed certificate, a
+few ms of latency per call) and times GET /api/capitalone/customer/{id}/snapshot
+for customers with 1, 10 and 50 accounts (8 upstream calls per account),
+first with a new httpx.AsyncClient per request (the previous behaviour), then
+with NessieClient's shared pool.
+
+Usage: python server_py/bench_nessie_snapshot.py [runs_per_size]
+"""
+
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+PORT = 5079
+ACCOUNT_COUNTS = [1, 10, 50]
+UPSTREAM_LATENCY = 0.005
+
+# --- Nessie stand-in (run by uvicorn in a subprocess) ---
+stand_in = FastAPI()
+
+
+@stand_in.get("/customers/{customer_id}/accounts")
+async def accounts(customer_id: str):
+    await asyncio.sleep(UPSTREAM_LATENCY)
+    count = int(customer_id.split("_")[-1])
+    return [{"_id": f"{customer_id}_acc_{i}", "type": "Checking", "balance": 1000 + i} for i in range(count)]
+
+
+@stand_in.get("/accounts/{account_id}")
+@stand_in.get("/accounts/{account_id}/{resource}")
+async def account_resource(account_id: str, resource: str = ""):
+    await asyncio.sleep(UPSTREAM_LATENCY)
+    if resource == "customer":
+        return {"_id": "cust", "first_name": "Bench", "last_name": "User"}
+    if resource:
+        return [{"_id": f"{account_id}_{resource}_{i}", "amount": 10 + i, "status": "executed"} for i in range(5)]
+    return {"_id": account_id, "type": "Checking", "balance": 1000}
+
+
+def make_certificate(directory):
+    key, cert = os.path.join(directory, "key.pem"), os.path.join(directory, "cert.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return key, cert
+
+
+def start_stand_in(key, cert):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench_nessie_snapshot:stand_in", "--port", str(PORT),
+         "--ssl-keyfile", key, "--ssl-certfile", cert, "--log-level", "warning",
+         "--backlog", "4096"],
+        cwd=SERVER_DIR,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"https://127.0.0.1:{PORT}/accounts/probe", verify=cert, timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Nessie stand-in did not start")
+
+
+async def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        key, cert = make_certificate(tmp)
+        # httpx trusts SSL_CERT_FILE, so both client variants verify the stand-in's certificate
+        os.environ["SSL_CERT_FILE"] = cert
+        os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "bench")
+        os.environ.setdefault("FINANCE_DB_PATH", os.path.join(tmp, "bench.db"))
+        server = start_stand_in(key, cert)
+        try:
+            sys.path.insert(0, SERVER_DIR)
+            import main as app_main
+            from nessie_client import NessieClient
+
+            base_url = f"https://127.0.0.1:{PORT}"
+
+            class PerRequestNessieClient(NessieClient):
+                """The previous behaviour: a fresh AsyncClient (new TCP + TLS connection) per call."""
+
+                async def _get(self, path, params=None):
+                    async with httpx.AsyncClient(timeout=20) as client:
+                        r = await client.get(f"{self.base_url}{path}", params=params or {})
+                        r.raise_for_status()
+                        return r.json()
+
+            transport = httpx.ASGITransport(app=app_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=120) as api:
+                async def time_snapshot(count):
+                    samples = []
+                    for _ in range(runs):
+                        start = time.perf_counter()
+                        r = await api.get(f"/api/capitalone/customer/cust_{count}/snapshot")
+                        samples.append(time.perf_counter() - start)
+                        assert r.status_code == 200 and len(r.json()["accounts"]) == count, r.text[:200]
+                    return statistics.median(samples)
+
+                results = {}
+                for label, client in [("per-request", PerRequestNessieClient(base_url=base_url)),
+                                      ("pooled", NessieClient(base_url=base_url))]:
+                    app_main.nessie_client = client
+                    await time_snapshot(1)  # warm up (and open pooled connections)
+                    results[label] = {count: await time_snapshot(count) for count in ACCOUNT_COUNTS}
+                    await client.close()
+
+            print(f"\nSnapshot latency, median of {runs} (upstream latency {UPSTREAM_LATENCY * 1000:.0f}ms, HTTPS)\n")
+            print(f"{'accounts':>8}  {'calls':>5}  {'per-request':>11}  {'pooled':>8}  {'speedup':>7}")
+            for count in ACCOUNT_COUNTS:
+                old, new = results["per-request"][count], results["pooled"][count]
+                print(f"{count:>8}  {1 + 8 * count:>5}  {old * 1000:>9.0f}ms  {new * 1000:>6.0f}ms  {old / new:>6.1f}x")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
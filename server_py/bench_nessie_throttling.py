@@ -0,0 +1,114 @@
+"""
+Nessie fan-out under upstream throttling.
+
+Runs GET /api/capitalone/customer/{id}/snapshot in-process against a simulated
+Nessie that slows down as concurrent requests rise and answers 429 above a
+concurrency threshold, like a rate-limited API. Compares:
+- unbounded: the previous behaviour (one attempt per call, errors embedded in the snapshot)
+- retries:   jittered retries alone, with no concurrency limit
+- governed:  NessieClient's adaptive concurrency governor plus retries
+
+Usage: python server_py/bench_nessie_throttling.py [runs_per_size]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+ACCOUNT_COUNTS = [10, 50, 100]
+
+# Simulated upstream: base latency, degradation past CAPACITY concurrent, 429s past THROTTLE_AT
+BASE_LATENCY = 0.02
+CAPACITY = 16
+THROTTLE_AT = 40
+
+
+class ThrottlingNessie:
+    def __init__(self):
+        self.inflight = 0
+        self.calls = 0
+        self.throttled = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.inflight >= THROTTLE_AT:
+            self.throttled += 1
+            await asyncio.sleep(0.002)
+            return httpx.Response(429, json={"message": "Too many requests"})
+        self.inflight += 1
+        try:
+            await asyncio.sleep(BASE_LATENCY * max(1.0, self.inflight / CAPACITY))
+        finally:
+            self.inflight -= 1
+        path = request.url.path
+        if path.startswith("/customers/") and path.endswith("/accounts"):
+            count = int(path.split("/")[2].split("_")[-1])
+            return httpx.Response(200, json=[{"_id": f"acc_{i}"} for i in range(count)])
+        return httpx.Response(200, json=[{"_id": "x", "amount": 10}])
+
+
+def count_errors(snapshot):
+    return sum(
+        1 for account in snapshot["accounts"] for value in account.values()
+        if isinstance(value, dict) and "error" in value
+    )
+
+
+async def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "bench")
+    os.environ.setdefault("FINANCE_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    sys.path.insert(0, SERVER_DIR)
+    import main as app_main
+    from adaptive_limiter import UpstreamGovernor
+    from nessie_client import NessieClient
+
+    class UngovernedNessieClient(NessieClient):
+        """The previous behaviour: every call goes out immediately, once."""
+
+        async def _get(self, path, params=None):
+            r = await self.start().get(path, params=params or {})
+            r.raise_for_status()
+            return r.json()
+
+    def make_client(cls, upstream, **kwargs):
+        client = cls(base_url="http://nessie.test", **kwargs)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url=client.base_url)
+        return client
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    print(f"Upstream: {BASE_LATENCY * 1000:.0f}ms base latency, degrades past {CAPACITY} concurrent, 429 at {THROTTLE_AT}\n")
+    print(f"{'accounts':>8}  {'mode':>10}  {'time':>7}  {'failed parts':>12}  {'upstream calls':>14}  {'429s':>5}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=300) as api:
+        for count in ACCOUNT_COUNTS:
+            for mode in ("unbounded", "retries", "governed"):
+                times, errors, calls, throttled = [], [], [], []
+                for _ in range(runs):
+                    upstream = ThrottlingNessie()
+                    if mode == "unbounded":
+                        app_main.nessie_client = make_client(UngovernedNessieClient, upstream)
+                    elif mode == "retries":
+                        no_limit = UpstreamGovernor(global_limit=100_000, initial_limit=100_000, max_limit=100_000)
+                        app_main.nessie_client = make_client(NessieClient, upstream, governor=no_limit)
+                    else:
+                        # Fresh governor per run so each starts from the configured initial limit
+                        app_main.nessie_client = make_client(NessieClient, upstream, governor=UpstreamGovernor())
+                    start = time.perf_counter()
+                    snapshot = (await api.get(f"/api/capitalone/customer/cust_{count}/snapshot")).json()
+                    times.append(time.perf_counter() - start)
+                    errors.append(count_errors(snapshot))
+                    calls.append(upstream.calls)
+                    throttled.append(upstream.throttled)
+                print(f"{count:>8}  {mode:>10}  {statistics.median(times):>6.2f}s  "
+                      f"{statistics.median(errors):>5.0f}/{count * 8:<6}  {statistics.median(calls):>14.0f}  "
+                      f"{statistics.median(throttled):>5.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""
+Regret scoring benchmark: one transaction per request vs batched requests.
+
+Starts a mock OpenAI-compatible /chat/completions server that answers regret
+prompts for whatever transaction ids it is sent, with a latency model of a
+fixed time to first token plus a per-output-token cost. ChatService is pointed
+at it through DEDALUS_BASE_URL, so the real prompt building, parsing and
+batch splitting code runs. Reports requests, prompt/completion tokens
+(approximated as characters / 4) and wall-clock per 1,000 transactions.
+
+Usage: python server_py/bench_regret_batching.py [transactions] [malformed_rate]
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+PORT = 5078
+FIRST_TOKEN_SECONDS = 0.3
+SECONDS_PER_OUTPUT_TOKEN = 0.002
+CONCURRENCY = 8
+BATCH_SIZES = [1, 10, 20, 50]
+
+os.environ["DEDALUS_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "bench")
+
+mock = FastAPI()
+counters = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "malformed": 0}
+malformed_rate = 0.0
+
+
+def approx_tokens(text):
+    return max(1, len(text) // 4)
+
+
+@mock.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = "".join(m["content"] for m in body["messages"])
+    ids = re.findall(r'"transaction_id": "([^"]+)"', body["messages"][-1]["content"])
+    content = json.dumps({"results": [
+        {"transaction_id": tid, "score": hash(tid) % 101, "reason": "Discretionary purchase that conflicts with the savings goal."}
+        for tid in ids
+    ]})
+    if len(ids) > 1 and random.random() < malformed_rate:
+        # Simulate a truncated / invalid structured output
+        counters["malformed"] += 1
+        content = content[: len(content) // 2]
+
+    prompt_tokens, completion_tokens = approx_tokens(prompt), approx_tokens(content)
+    counters["requests"] += 1
+    counters["prompt_tokens"] += prompt_tokens
+    counters["completion_tokens"] += completion_tokens
+    await asyncio.sleep(FIRST_TOKEN_SECONDS + completion_tokens * SECONDS_PER_OUTPUT_TOKEN)
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def start_mock_server():
+    server = uvicorn.Server(uvicorn.Config(mock, port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def make_transactions(count):
+    today = date.today()
+    merchants = ["DoorDash", "Amazon", "Starbucks", "Whole Foods", "Uber", "Steam", "Target", "Shell"]
+    return [
+        {
+            "transaction_id": f"bench_txn_{i}",
+            "name": merchants[i % len(merchants)],
+            "merchant_name": merchants[i % len(merchants)],
+            "amount": round(random.uniform(3, 250), 2),
+            "date": str(today - timedelta(days=i % 90)),
+            "category": ["Food and Drink" if i % 2 else "Shops"],
+            "payment_channel": "online" if i % 3 else "in store",
+        }
+        for i in range(count)
+    ]
+
+
+USER_PROFILE = {
+    "spending_regret": "Late-night food delivery and impulse online shopping when stressed.",
+    "user_goals": "Build a 3-month emergency fund and pay down a credit card.",
+    "top_categories": ["Food & Drink", "Shopping", "Entertainment", "Groceries", "Travel"],
+}
+
+
+async def run(chat_service, transactions, batch_size):
+    """Score everything with CONCURRENCY requests in flight, like the regret queue workers."""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    batches = [transactions[i:i + batch_size] for i in range(0, len(transactions), batch_size)]
+
+    async def score(batch):
+        async with semaphore:
+            return await chat_service.analyze_transactions_regret(batch, USER_PROFILE, batch_size=batch_size)
+
+    results = {}
+    for part in await asyncio.gather(*(score(b) for b in batches)):
+        results.update(part)
+    return results
+
+
+async def main():
+    global malformed_rate
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    malformed_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    from chat import ChatService
+
+    start_mock_server()
+    chat_service = ChatService()
+    transactions = make_transactions(count)
+    per_thousand = 1000 / count
+
+    print(f"{count} transactions, {CONCURRENCY} concurrent requests, malformed rate {malformed_rate:.0%}\n")
+    print(f"{'batch':>5}  {'requests':>8}  {'prompt tok/1k':>13}  {'compl tok/1k':>12}  {'sec/1k':>7}  {'scored':>6}")
+    for batch_size in BATCH_SIZES:
+        for key in counters:
+            counters[key] = 0
+        start = time.perf_counter()
+        results = await run(chat_service, transactions, batch_size)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{batch_size:>5}  {counters['requests']:>8}  {counters['prompt_tokens'] * per_thousand:>13.0f}  "
+            f"{counters['completion_tokens'] * per_thousand:>12.0f}  {elapsed * per_thousand:>7.2f}  {len(results):>6}"
+            + (f"  ({counters['malformed']} malformed, split and retried)" if counters["malformed"] else "")
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,218 @@
+"""
+Advisor chat SSE framing benchmark.
+
+Streams N concurrent advisor chat responses (default 1,000). Each comes from a
+mock upstream that emits short tokens with jittered, bursty gaps, like a model
+would. Compared:
+- upstream only: the mock streams drained with no framing (the floor);
+- per-token: the previous event_generator, one json.dumps'd frame per token;
+- sse_events (sse.py) with 0ms, 25ms and 50ms coalescing.
+
+By default, each response runs in this process through Starlette's
+StreamingResponse with a counting ASGI `send`. Every reply is checked for
+intact content after the timed run. With --http, a uvicorn server runs in a
+subprocess and the chats are real HTTP requests. CPU is then the server
+process's own, read from /proc (Linux).
+
+Reported per variant: wall time, CPU in total and per stream, frames sent and
+frames/sec, and bytes.
+
+Usage: python server_py/bench_sse_framing.py [--chats 1000] [--tokens 150] [--gap-ms 20] [--http]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SERVER_DIR)
+
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from sse import sse_events
+
+VARIANTS = ["upstream-only", "per-token", "0", "25", "50"]
+PORT = 5078
+WORDS = ["Your", " dining", " spend", " is", " $210", " this", " month", ",", " about", " 70%", " of", " budget",
+         ".", " Try", " cooking", " twice", " a", " week", " —", " saves", " ~$80", "."]
+
+
+def reply_tokens(seed, count):
+    rng = random.Random(seed)
+    return [rng.choice(WORDS) for _ in range(count)]
+
+
+async def mock_upstream(tokens, gap):
+    rng = random.Random(len(tokens))
+    for token in tokens:
+        # Models often deliver tokens in bursts: some gaps are ~0, others longer
+        await asyncio.sleep(rng.choice((0.0, 0.0, gap, 2 * gap)))
+        yield token
+
+
+async def per_token_frames(chunks):
+    """The previous /api/advisor/chat event_generator."""
+    try:
+        async for chunk in chunks:
+            yield f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n"
+        yield "data: [DONE]\n\n"
+    except Exception as e:
+        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+
+async def drain_only(chunks):
+    async for _ in chunks:
+        pass
+    yield b""
+
+
+def framed(variant, request, tokens, gap):
+    chunks = mock_upstream(tokens, gap)
+    if variant == "upstream-only":
+        return drain_only(chunks)
+    if variant == "per-token":
+        return per_token_frames(chunks)
+    return sse_events(request, chunks, flush_interval_ms=float(variant))
+
+
+def parse_content(body):
+    text = []
+    for line in body.decode().split("\n"):
+        if line.startswith("data: {"):
+            text.append(json.loads(line[6:])["choices"][0]["delta"]["content"])
+    return "".join(text)
+
+
+# --- In-process: StreamingResponse with a counting ASGI send ---
+
+async def run_chat(variant, tokens, gap, totals, bodies):
+    done = asyncio.Event()
+    body = bytearray()
+
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            totals["frames"] += 1
+            body.extend(message["body"])
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.3"}, "method": "POST", "path": "/api/advisor/chat",
+             "headers": [], "query_string": b""}
+    frames = framed(variant, Request(scope, receive), tokens, gap)
+    await StreamingResponse(frames, media_type="text/event-stream")(scope, receive, send)
+    done.set()
+    bodies.append((tokens, bytes(body)))
+
+
+async def run_in_process(variant, replies, gap):
+    totals, bodies = {"frames": 0}, []
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(run_chat(variant, tokens, gap, totals, bodies) for tokens in replies))
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    totals["bytes"] = sum(len(body) for _, body in bodies)
+    if variant != "upstream-only":
+        totals["intact"] = all(parse_content(body) == "".join(tokens) for tokens, body in bodies)
+    return wall, cpu, totals
+
+
+# --- Over HTTP: uvicorn in a subprocess ---
+
+def serve(port, tokens, gap):
+    import uvicorn
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        variant = scope["path"].strip("/")
+        seed = int(scope["query_string"].decode().split("=")[1])
+        response = StreamingResponse(framed(variant, Request(scope, receive), reply_tokens(seed, tokens), gap),
+                                     media_type="text/event-stream")
+        await response(scope, receive, send)
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def server_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def http_chat(variant, seed, totals):
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    writer.write(f"GET /{variant}?seed={seed} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n".encode())
+    data = await reader.read()
+    writer.close()
+    body = data.split(b"\r\n\r\n", 1)[1]
+    totals["frames"] += body.count(b"\n\n")
+    totals["bytes"] += len(body)
+
+
+async def run_over_http(variant, chats, pid):
+    totals = {"frames": 0, "bytes": 0}
+    cpu, wall = server_cpu_seconds(pid), time.perf_counter()
+    await asyncio.gather(*(http_chat(variant, seed, totals) for seed in range(chats)))
+    return time.perf_counter() - wall, server_cpu_seconds(pid) - cpu, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--tokens", type=int, default=150, help="Tokens per reply")
+    parser.add_argument("--gap-ms", type=float, default=20, help="Typical gap between upstream tokens")
+    parser.add_argument("--http", action="store_true", help="Stream over HTTP from a uvicorn subprocess")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(PORT, args.tokens, args.gap_ms / 1000)
+    else:
+        asyncio.run(run(args))
+
+
+async def run(args):
+    gap = args.gap_ms / 1000
+    print(f"{args.chats} concurrent chats x {args.tokens} tokens, ~{args.gap_ms:.0f}ms between upstream tokens, "
+          f"{'over HTTP (server CPU)' if args.http else 'in process'}\n")
+    print(f"{'variant':>14}  {'wall':>6}  {'CPU':>6}  {'CPU/stream':>10}  {'frames':>8}  {'frames/s':>9}  "
+          f"{'bytes':>10}  {'intact':>6}")
+
+    server = None
+    if args.http:
+        server = subprocess.Popen([sys.executable, __file__, "--serve", "--tokens", str(args.tokens),
+                                   "--gap-ms", str(args.gap_ms)])
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", PORT)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+    else:
+        replies = [reply_tokens(seed, args.tokens) for seed in range(args.chats)]
+
+    try:
+        for variant in VARIANTS:
+            if args.http:
+                wall, cpu, totals = await run_over_http(variant, args.chats, server.pid)
+            else:
+                wall, cpu, totals = await run_in_process(variant, replies, gap)
+            label = variant if not variant.isdigit() else f"coalesce {variant}ms"
+            intact = {True: "yes", False: "NO"}.get(totals.get("intact"), "-")
+            print(f"{label:>14}  {wall:>5.1f}s  {cpu:>5.1f}s  {cpu / args.chats * 1000:>8.2f}ms  "
+                  f"{totals['frames']:>8}  {totals['frames'] / wall:>9.0f}  {totals['bytes']:>10}  {intact:>6}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: list-of-dicts vs TransactionColumns at 1M transactions.
+
+Reports memory per transaction (tracemalloc) and the time to aggregate spend
+by category, filter, and serialize a page, for both representations.
+
+Usage: python server_py/bench_transaction_columns.py [n_transactions]
+"""
+
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from transaction_columns import TransactionColumns
+
+CATEGORIES = [
+    ["Food and Drink", "Restaurants"],
+    ["Food and Drink", "Groceries"],
+    ["Travel", "Airlines and Aviation Services"],
+    ["Transfer", "Credit Card Payment"],
+    ["Payment", "Payroll"],
+    ["Shops", "Electronics"],
+    ["Service", "Utilities"],
+]
+MERCHANTS = [f"Merchant {i}" for i in range(500)]
+
+
+def generate(n):
+    rng = random.Random(42)
+    today = date.today()
+    for i in range(n):
+        merchant = rng.choice(MERCHANTS)
+        yield {
+            "transaction_id": f"txn_{i:032d}",
+            "account_id": rng.choice(["acc_checking", "acc_credit"]),
+            "name": merchant,
+            "amount": round(rng.uniform(-500, 500), 2),
+            "date": str(today - timedelta(days=rng.randrange(730))),
+            "category": list(rng.choice(CATEGORIES)),
+            "pending": False,
+            "merchant_name": merchant,
+            "payment_channel": rng.choice(["in store", "online", "other"]),
+            "iso_currency_code": "USD",
+            "regretScore": rng.choice([None, rng.randrange(101)]),
+            "regretReason": None,
+        }
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def timed(label, fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<28} {best * 1000:10.1f} ms")
+    return result
+
+
+def dict_sum_by_category(rows):
+    totals = {}
+    for t in rows:
+        if t["amount"] > 0:
+            key = t["category"][0] if t["category"] else "Uncategorized"
+            agg = totals.setdefault(key, [0.0, 0])
+            agg[0] += t["amount"]
+            agg[1] += 1
+    return totals
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    cutoff = str(date.today() - timedelta(days=30))
+    print(f"Benchmarking {n:,} transactions\n")
+
+    rows, dict_bytes = measure(lambda: list(generate(n)))
+    columns, column_bytes = measure(lambda: TransactionColumns.from_dicts(generate(n)))
+
+    print("Memory")
+    print(f"  list of dicts                {dict_bytes / n:10.1f} bytes/txn")
+    print(f"  TransactionColumns           {column_bytes / n:10.1f} bytes/txn")
+    print(f"  reduction                    {dict_bytes / column_bytes:10.1f}x\n")
+
+    print("Aggregate spend by category")
+    timed("list of dicts", lambda: dict_sum_by_category(rows))
+    timed("TransactionColumns", lambda: columns.spend().sum_by("category"))
+
+    print("Filter (last 30 days, Food and Drink, amount >= 20)")
+    timed("list of dicts", lambda: [
+        t for t in rows
+        if t["date"] >= cutoff and t["category"][0] == "Food and Drink" and t["amount"] >= 20
+    ])
+    timed("TransactionColumns", lambda: columns.filter(start_date=cutoff, category="Food and Drink", min_amount=20))
+
+    print("Serialize first 1,000 rows to JSON")
+    timed("list of dicts", lambda: json.dumps(rows[:1000]))
+    timed("TransactionColumns", lambda: json.dumps(columns[:1000].to_dicts()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Multi-worker load test.
+
+Seeds a throwaway database with a Plaid connection and 5,000 stored
+transactions, starts the API under uvicorn with 1, 2 and 4 workers, and
+measures throughput of GET /api/plaid/transactions/query from several client
+processes. Every request reads the shared session store, so this also checks
+that all workers see the same connection.
+
+Usage: python server_py/bench_workers.py [seconds_per_run]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_COUNTS = [1, 2, 4]
+CLIENT_PROCESSES = 4
+CONNECTIONS_PER_CLIENT = 16
+PORT = 5077
+URL = f"http://127.0.0.1:{PORT}/api/plaid/transactions/query?limit=200"
+
+
+def seed(db_path):
+    os.environ["FINANCE_DB_PATH"] = db_path
+    sys.path.insert(0, SERVER_DIR)
+    import database
+    from session_store import PlaidConnection, SQLiteSessionStore
+
+    database.init_db()
+    PlaidConnection(SQLiteSessionStore()).set("bench-access-token", "bench-item")
+    today = date.today()
+    transactions = [
+        {
+            "transaction_id": f"bench_{i}",
+            "account_id": "acc",
+            "name": f"Merchant {i % 50}",
+            "amount": round((i % 200) + 0.99, 2),
+            "date": str(today - timedelta(days=i % 365)),
+            "category": ["Food and Drink", "Restaurants"],
+            "pending": False,
+            "merchant_name": f"Merchant {i % 50}",
+            "payment_channel": "online",
+            "iso_currency_code": "USD",
+        }
+        for i in range(5000)
+    ]
+    database.apply_transaction_sync("bench-item", transactions, [], [], "bench-cursor")
+
+
+def client_process(duration, counter):
+    async def run():
+        done = 0
+        deadline = time.perf_counter() + duration
+        limits = httpx.Limits(max_connections=CONNECTIONS_PER_CLIENT)
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            async def worker():
+                nonlocal done
+                while time.perf_counter() < deadline:
+                    r = await client.get(URL)
+                    r.raise_for_status()
+                    done += 1
+            await asyncio.gather(*(worker() for _ in range(CONNECTIONS_PER_CLIENT)))
+        return done
+
+    total = asyncio.run(run())
+    with counter.get_lock():
+        counter.value += total
+
+
+def wait_for_server(timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(URL, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError("Server did not become ready")
+
+
+def run_load(workers, duration, env):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server()
+        counter = multiprocessing.Value("i", 0)
+        clients = [
+            multiprocessing.Process(target=client_process, args=(duration, counter))
+            for _ in range(CLIENT_PROCESSES)
+        ]
+        for p in clients:
+            p.start()
+        for p in clients:
+            p.join()
+        return counter.value / duration
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path)
+        env = dict(os.environ, FINANCE_DB_PATH=db_path)
+        env.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "bench")
+
+        print(f"CPU cores: {os.cpu_count()}  clients: {CLIENT_PROCESSES}x{CONNECTIONS_PER_CLIENT} connections\n")
+        baseline = None
+        for workers in WORKER_COUNTS:
+            rps = run_load(workers, duration, env)
+            baseline = baseline or rps
+            print(f"  {workers} worker(s): {rps:8.1f} req/s   ({rps / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
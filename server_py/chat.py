@@ -1,12 +1,92 @@
 import os
 import json
 import asyncio
-from typing import List, Dict, AsyncGenerator
+import time
+from typing import List, Dict, AsyncGenerator, Callable, Optional
 from openai import AsyncOpenAI
 
+from chat_cache import ChatResponseCache
+from context_builder import ContextBuilder
+from llm_cache import LLMResponseCache, cache_key
+from model_health import ModelHealth
+from transaction_columns import TransactionColumns
+from workflow import Step, Workflow
+
 # Load environment variables
 import dotenv; dotenv.load_dotenv()
 
+DEDALUS_BASE_URL = os.environ.get("DEDALUS_BASE_URL", "https://api.dedaluslabs.ai/v1")
+
+# Capability classes the router chooses between, each with interchangeable models
+# in order of preference (override with ROUTER_MODEL_CLASSES='{"fast": [...]}')
+ROUTER_MODEL_CLASSES = {
+    # User requested change: Claude was not responding, switched to GPT-4o (kept as the fallback)
+    "advanced": ["openai/gpt-4o", "anthropic/claude-3-5-sonnet-20241022"],
+    "quantitative": ["google/gemini-2.0-flash", "openai/gpt-4o-mini"],
+    "fast": ["openai/gpt-4o-mini", "google/gemini-2.0-flash"],
+    **json.loads(os.environ.get("ROUTER_MODEL_CLASSES", "{}")),
+}
+CAPABILITY_NAMES = {
+    "advanced": "Advanced Reasoning",
+    "quantitative": "Quantitative Reasoning",
+    "fast": "Fast Reasoning",
+}
+
+# Seconds to wait for the chosen model's first token before also asking a backup
+# model from the same class; the first to produce a token is used. Off (0) by default,
+# since a hedge can double the upstream cost of a slow request
+CHAT_HEDGE_DEADLINE = float(os.environ.get("CHAT_HEDGE_DEADLINE", "0"))
+
+# Prompt template versions for cached analyses; bump when a template changes
+SURVEY_PROMPT_VERSION = "survey-v1"
+BEHAVIORAL_SUMMARY_PROMPT_VERSION = "behavioral-summary-v1"
+
+# Transactions packed into one regret-scoring request
+REGRET_BATCH_SIZE = int(os.environ.get("REGRET_BATCH_SIZE", "20"))
+
+REGRET_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "regret_scores",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "transaction_id": {"type": "string"},
+                            "score": {"type": "integer"},
+                            "reason": {"type": "string"},
+                        },
+                        "required": ["transaction_id", "score", "reason"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+class StreamError(str):
+    """An error message yielded into a chat stream in place of model output (never cached)."""
+
+
+class StreamNote(str):
+    """Text about this run only (e.g. step timings): streamed, but left out of the cached reply."""
+
+
+async def _first_chunk(stream: AsyncGenerator[str, None]) -> Optional[str]:
+    """The stream's first chunk (None if it ends empty), leaving the rest unconsumed."""
+    async for chunk in stream:
+        return chunk
+    return None
+
+
 class DedalusClient:
     def __init__(self):
         self.api_key = os.environ.get("EXPO_PUBLIC_DEDALUS_API_KEY")
@@ -14,11 +94,11 @@ class DedalusClient:
             print("Warning: EXPO_PUBLIC_DEDALUS_API_KEY not set")
             
         self.client = AsyncOpenAI(
-            base_url="https://api.dedaluslabs.ai/v1",
+            base_url=DEDALUS_BASE_URL,
             api_key=self.api_key
         )
 
-    async def chat_completion(self, model: str, messages: List[Dict], stream: bool = False):
+    async def chat_completion(self, model: str, messages: List[Dict], stream: bool = False, **kwargs):
         try:
             # Adjust max_tokens based on model if needed
             max_tokens = 2048
@@ -27,7 +107,8 @@ class DedalusClient:
                 model=model,
                 messages=messages,
                 stream=stream,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **kwargs
             )
             return response
         except Exception as e:
@@ -35,26 +116,105 @@ class DedalusClient:
             raise e
 
 class QueryRouter:
-    def route(self, query: str, context: str = "") -> str:
+    """
+    Keyword heuristics pick a capability class; within it, `health` picks the
+    fastest model that isn't failing (see model_health.py).
+    """
+
+    def __init__(self, model_classes: Dict[str, List[str]] = None, health: ModelHealth = None):
+        self.model_classes = model_classes or ROUTER_MODEL_CLASSES
+        self.health = health or ModelHealth()
+
+    def classify(self, query: str) -> str:
         query_lower = query.lower()
         
         # Heuristics for routing
         if any(keyword in query_lower for keyword in ["analyze", "plan", "strategy"]):
-             # User requested change: Claude was not responding, switched to GPT-4o
-             return "openai/gpt-4o"
+             return "advanced"
         
         if any(keyword in query_lower for keyword in ["spending", "budget", "numbers", "calculate", "total", "sum", "average"]):
-             return "google/gemini-2.0-flash"
+             return "quantitative"
             
         # Default to fast/cheap model
-        return "openai/gpt-4o-mini"
+        return "fast"
+
+    def route(self, query: str, context: str = "") -> str:
+        return self.health.pick(self.model_classes[self.classify(query)])
+
+    def backup(self, query: str, exclude: List[str]) -> Optional[str]:
+        """Fastest healthy model in the query's class other than `exclude`, or None."""
+        candidates = [m for m in self.model_classes[self.classify(query)]
+                      if m not in exclude and self.health.available(m)]
+        return self.health.pick(candidates) if candidates else None
+
+    def stats(self) -> Dict:
+        return {"classes": self.model_classes, "models": self.health.stats()}
 
 class ChatService:
     def __init__(self):
         self.dedalus_client = DedalusClient()
         self.router = QueryRouter()
+        self.llm_cache = LLMResponseCache()
+        self.chat_cache = ChatResponseCache()
+        self.context_builder = ContextBuilder()
+        self.hedge_deadline = CHAT_HEDGE_DEADLINE
+        self.hedge_stats = {
+            "requests": 0,         # streams with a backup model available
+            "hedged": 0,           # backup started because the first token was late
+            "failovers": 0,        # backup started because the chosen model failed first
+            "backup_wins": 0,
+            "primary_wins_after_hedge": 0,
+            "all_failed": 0,
+        }
+
+    async def _cached_completion(self, prompt_version: str, model: str, messages: List[Dict], validate=None, **kwargs) -> str:
+        """
+        Non-streaming completion through the LLM response cache. Identical
+        (prompt version, model, messages, params) return the stored answer without
+        calling the model; fresh answers are stored only if `validate` accepts them.
+        """
+        key = cache_key(prompt_version, model, messages, kwargs)
+        cached = self.llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = await self.dedalus_client.chat_completion(model, messages, stream=False, **kwargs)
+        content = response.choices[0].message.content
+        if validate is not None:
+            validate(content)
+        self.llm_cache.put(key, prompt_version, model, content, getattr(response, "usage", None))
+        return content
 
-    async def get_response_stream(self, messages: List[Dict], financial_context: str = "", survey_context: str = "") -> AsyncGenerator[str, None]:
+    async def get_response_stream(self, messages: List[Dict], financial_context: str = "", survey_context: str = "",
+                                  cache_scope: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """
+        Stream the advisor's reply. With a `cache_scope` (the user), a near-duplicate
+        of a question this user already asked with the same context and history is
+        replayed from the chat cache; otherwise the fresh reply is recorded for reuse.
+        """
+        if not cache_scope or not messages:
+            async for chunk in self._generate_response_stream(messages, financial_context, survey_context):
+                yield chunk
+            return
+
+        question = messages[-1].get("content") or ""
+        bucket = self.chat_cache.bucket_key(cache_scope, messages, financial_context, survey_context)
+        cached = self.chat_cache.lookup(bucket, question)
+        if cached is not None:
+            for chunk in cached["chunks"]:
+                yield chunk
+            return
+
+        chunks, failed = [], False
+        async for chunk in self._generate_response_stream(messages, financial_context, survey_context):
+            failed = failed or isinstance(chunk, StreamError)
+            if not isinstance(chunk, StreamNote):
+                chunks.append(chunk)
+            yield chunk
+        if not failed:
+            self.chat_cache.store(bucket, question, chunks)
+
+    async def _generate_response_stream(self, messages: List[Dict], financial_context: str = "", survey_context: str = "") -> AsyncGenerator[str, None]:
         user_message = messages[-1]["content"] if messages else ""
         
         # Check for multi-step workflow trigger
@@ -67,10 +227,11 @@ class ChatService:
         model = self.router.route(user_message, financial_context)
         print(f"Routing query to: {model}")
         
-        friendly_name = self._get_friendly_model_name(model)
+        friendly_name = CAPABILITY_NAMES.get(self.router.classify(user_message)) or self._get_friendly_model_name(model)
         yield f"__Using {friendly_name}__\n\n"
         
-        async for chunk in self._stream_dedalus(model, messages, financial_context, survey_context):
+        backup = lambda tried: self.router.backup(user_message, tried)
+        async for chunk in self._stream_dedalus(model, messages, financial_context, survey_context, backup):
             yield chunk
 
     def _get_friendly_model_name(self, model: str) -> str:
@@ -82,48 +243,190 @@ class ChatService:
             return "Quantitative Reasoning"
         return "AI Model"
 
-    async def _stream_dedalus(self, model: str, messages: List[Dict], financial_context: str, survey_context: str):
-        system_prompt = self._get_system_prompt(financial_context, survey_context)
-        # Ensure system prompt is first
-        full_messages = [{"role": "system", "content": system_prompt}] + messages
+    async def _stream_dedalus(self, model: str, messages: List[Dict], financial_context: str, survey_context: str,
+                              backup: Optional[Callable[[List[str]], Optional[str]]] = None):
+        system_prompt = self._get_system_prompt(
+            self.context_builder.compact_financial_context(financial_context),
+            self.context_builder.compact_survey_context(survey_context),
+        )
+        # System prompt first, then as much recent history as fits the token budget
+        full_messages, report = self.context_builder.build(system_prompt, messages)
         
-        print(f"Streaming request to Dedalus for model: {model}")
+        print(f"Streaming request to Dedalus for model: {model} ({report['prompt_tokens']} prompt tokens, "
+              f"{report['kept_messages']} messages kept, {report['summarized_messages']} summarized)")
         try:
-            stream = await self.dedalus_client.chat_completion(model, full_messages, stream=True)
+            stream = (self._stream_hedged(model, full_messages, backup) if backup
+                      else self._stream_completion(model, full_messages))
+            async for content in stream:
+                yield content
+        except Exception as e:
+             print(f"Error streaming from Dedalus: {e}")
+             yield StreamError(f"Error: {str(e)}")
+
+    async def _stream_hedged(self, model: str, messages: List[Dict],
+                             backup: Callable[[List[str]], Optional[str]]) -> AsyncGenerator[str, None]:
+        """
+        _stream_completion with a backup model. If `model` has produced no token
+        after hedge_deadline seconds, or fails before its first token, the same
+        request also goes to backup(tried models); whichever stream produces a
+        token first is used and the other is cancelled. Errors after the first
+        token are raised as usual.
+        """
+        self.hedge_stats["requests"] += 1
+        pending = {}  # first-chunk task -> (model, stream, started)
+        tried = []
+
+        def launch(m):
+            stream = self._stream_completion(m, messages)
+            pending[asyncio.create_task(_first_chunk(stream))] = (m, stream, time.perf_counter())
+            tried.append(m)
+
+        launch(model)
+        timeout = self.hedge_deadline if self.hedge_deadline > 0 else None
+        winner, error = None, None
+        try:
+            while pending and winner is None:
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # First-token deadline passed: hedge with a backup model
+                    timeout = None
+                    alternate = backup(tried)
+                    if alternate:
+                        print(f"No token from {model} after {self.hedge_deadline}s, hedging with {alternate}")
+                        self.hedge_stats["hedged"] += 1
+                        launch(alternate)
+                    continue
+                for task in done:
+                    m, stream, _ = pending.pop(task)
+                    if task.exception() is None:
+                        winner = (m, stream, task.result())
+                        break
+                    error = task.exception()
+                    if len(tried) == 1:
+                        timeout = None
+                        alternate = backup(tried)
+                        if alternate:
+                            print(f"{m} failed before its first token ({error}), failing over to {alternate}")
+                            self.hedge_stats["failovers"] += 1
+                            launch(alternate)
+        finally:
+            racing = [task for task in pending if not task.done()]
+            for task in racing:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task, (m, stream, started) in pending.items():
+                await stream.aclose()
+                if winner is not None and task in racing:
+                    # Lost the race: its first token takes at least this long
+                    self.router.health.record_censored(m, time.perf_counter() - started)
+
+        if winner is None:
+            self.hedge_stats["all_failed"] += 1
+            raise error
+        m, stream, first = winner
+        if m != model:
+            self.hedge_stats["backup_wins"] += 1
+        elif len(tried) > 1:
+            self.hedge_stats["primary_wins_after_hedge"] += 1
+        try:
+            if first is not None:
+                yield first
+            async for content in stream:
+                yield content
+        finally:
+            await stream.aclose()
+
+    async def _stream_completion(self, model: str, messages: List[Dict]) -> AsyncGenerator[str, None]:
+        """
+        Content deltas of a streamed completion; errors are raised, not yielded.
+        Time to first token, output rate and failures are fed to the router's model health.
+        """
+        start = time.perf_counter()
+        first_token_at, tokens, outcome, stream = None, 0, None, None
+        try:
+            stream = await self.dedalus_client.chat_completion(model, messages, stream=True)
             async for chunk in stream:
                 # print(f"DEBUG CHUNK: {chunk}") # Uncomment for verbose debugging
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
                     if delta.content:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        tokens += 1
                         yield delta.content
-        except Exception as e:
-             print(f"Error streaming from Dedalus: {e}")
-             yield f"Error: {str(e)}"
+            outcome = True
+        except Exception:
+            outcome = False
+            raise
+        finally:
+            if stream is not None:
+                # Release the upstream connection now, also when the consumer stops early
+                await stream.aclose()
+            if outcome is None:
+                # Abandoned by the consumer: no verdict on the model's health
+                self.router.health.release(model)
+            else:
+                self.router.health.record(
+                    model, ok=outcome,
+                    ttft=first_token_at - start if first_token_at else None,
+                    tokens=tokens,
+                    stream_seconds=time.perf_counter() - first_token_at if first_token_at else None,
+                )
+
+    def _analysis_workflow(self, messages: List[Dict], financial_context: str) -> Workflow:
+        """Deep analysis: categorization and pattern recognition run concurrently, then the plan."""
+
+        async def categorize(outputs):
+            sys_prompt_1 = "You are a data analyst. Summarize the transaction data provided into 3 main spending categories."
+            compact = self.context_builder.compact_financial_context(financial_context)
+            if compact:
+                sys_prompt_1 += f"\n\nTransaction data:\n{compact}"
+            msgs_1, _ = self.context_builder.build(sys_prompt_1, messages)
+            async for chunk in self._stream_completion("openai/gpt-4o-mini", msgs_1):
+                yield chunk
+
+        async def patterns(outputs):
+            # Placeholder for a dedicated pattern model ("GPT-5"); no model call yet
+            yield "Deep pattern recognition complete. Identified potential savings of 15%."
+
+        async def plan(outputs):
+            sys_prompt_3 = f"You are a financial planner. Based on this summary: {outputs['categorize']}, create a detailed savings plan."
+            msgs_3 = [{"role": "user", "content": sys_prompt_3}]
+            async for chunk in self._stream_dedalus("openai/gpt-4o", msgs_3, "", ""):
+                if isinstance(chunk, StreamError):
+                    raise RuntimeError(chunk)
+                yield chunk
+
+        return Workflow([
+            Step("categorize", "Categorizing data (GPT-4o-mini)", categorize),
+            Step("patterns", "Deep Analysis (Simulating GPT-5)", patterns),
+            Step("plan", "Creating Detailed Savings Plan (Advanced Reasoning)", plan, depends_on=("categorize",)),
+        ])
 
     async def _handle_multi_step_workflow(self, messages: List[Dict], financial_context: str):
         yield "__Starting Deep Analysis Workflow__\n\n"
-        
-        # Step 1: Categorization (GPT-4o-mini via Dedalus)
-        yield "**Step 1: Categorizing data (GPT-4o-mini)...**\n"
-        sys_prompt_1 = "You are a data analyst. Summarize the transaction data provided into 3 main spending categories."
-        msgs_1 = [{"role": "system", "content": sys_prompt_1}] + messages
-        resp_1 = await self.dedalus_client.chat_completion("openai/gpt-4o-mini", msgs_1, stream=False)
-        summary = resp_1.choices[0].message.content
-        yield f"{summary}\n\n"
-        
-        # Step 2: Handoff to 'GPT-5' (Mock)
-        yield "**Step 2: Deep Analysis (Simulating GPT-5)...**\n"
-        await asyncio.sleep(1) 
-        yield "Deep pattern recognition complete. Identified potential savings of 15%.\n\n"
-        
-        # Step 3: Detailed Plan (GPT-4o via Dedalus)
-        yield "**Step 3: Creating Detailed Savings Plan (Advanced Reasoning)...**\n\n"
-        sys_prompt_3 = f"You are a financial planner. Based on this summary: {summary}, create a detailed savings plan."
-        msgs_3 = [{"role": "user", "content": sys_prompt_3}]
-        
-        async for chunk in self._stream_dedalus("openai/gpt-4o", msgs_3, "", ""):
-            yield chunk
 
+        workflow = self._analysis_workflow(messages, financial_context)
+        timings = []
+        number = {step.name: i + 1 for i, step in enumerate(workflow.steps)}
+        async for event in workflow.stream():
+            label = f"Step {number[event.step.name]}: {event.step.title}"
+            if event.kind == "started":
+                yield f"**{label}...**\n\n"
+            elif event.kind == "chunk":
+                yield event.text
+            elif event.kind == "finished":
+                timings.append(f"{event.step.name} {event.duration:.1f}s (started at {event.started_at:.1f}s)")
+                yield "\n\n"
+            elif event.kind == "failed":
+                timings.append(f"{event.step.name} failed after {event.duration:.1f}s")
+                yield StreamError(f"\n\n_{label} failed: {event.error}_\n\n")
+            elif event.kind == "skipped":
+                timings.append(f"{event.step.name} skipped")
+                yield StreamError(f"_{label} skipped: an earlier step failed._\n\n")
+
+        print(f"Deep analysis workflow timing: {', '.join(timings)}")
+        yield StreamNote(f"_Step timing: {'; '.join(timings)}_\n")
 
     def _get_system_prompt(self, financial_context: str, survey_context: str) -> str:
         return f"""You are Origin, a professional AI financial advisor.
@@ -155,7 +458,7 @@ Guidelines:
         User Financial Context: {financial_context}
         
         Survey Answers:
-        {json.dumps(answers, indent=2)}
+        {json.dumps(answers, indent=2, sort_keys=True)}
         
         Analyze the user's financial personality, regrets, and goals.
         """
@@ -165,12 +468,13 @@ Guidelines:
             {"role": "user", "content": user_prompt}
         ]
         
-        try:
-            response = await self.dedalus_client.chat_completion("openai/gpt-4o", messages, stream=False)
-            content = response.choices[0].message.content
+        def parse(content):
             # Strip potential markdown code blocks if present
-            content = content.replace("```json", "").replace("```", "").strip()
-            return json.loads(content)
+            return json.loads(content.replace("```json", "").replace("```", "").strip())
+
+        try:
+            content = await self._cached_completion(SURVEY_PROMPT_VERSION, "openai/gpt-4o", messages, validate=parse)
+            return parse(content)
         except Exception as e:
             print(f"Error analyzing survey: {e}")
             # Fallback
@@ -180,22 +484,35 @@ Guidelines:
                 "top_categories": ["Food & Drink", "Shopping", "Travel", "Groceries", "Entertainment"]
             }
 
-    async def generate_behavioral_summary(self, transactions: List[Dict], user_profile: Dict = None) -> str:
+    async def generate_behavioral_summary(self, transactions, user_profile: Dict = None) -> str:
+        """`transactions` may be a TransactionColumns or a list of transaction dicts."""
+        if not isinstance(transactions, TransactionColumns):
+            transactions = TransactionColumns.from_dicts(transactions)
         if not transactions:
             return "No transaction data available for analysis."
             
         # Summarize transactions for prompt context (limit to recent 20 for brevity)
         recent_txns = transactions[:20]
         txn_summary = "\n".join([
-            f"- {t.get('date', 'N/A')}: {t.get('name', 'Unknown')} ${t.get('amount', 0)} ({t.get('category', ['Misc'])[0]})"
+            f"- {t.get('date') or 'N/A'}: {t.get('name') or 'Unknown'} ${t.get('amount', 0)} ({(t.get('category') or ['Misc'])[0]})"
             for t in recent_txns
         ])
+
+        # Category totals over the full set, not just the 20 listed above
+        category_totals = transactions.spend().sum_by("category")
+        category_summary = "\n".join(
+            f"- {category}: ${agg['total']:.2f} across {agg['count']} transactions"
+            for category, agg in list(category_totals.items())[:5]
+        )
         
         system_prompt = "You are a behavioral finance expert. Provide a concise (2-3 sentences) summary of the user's spending behavior based on their recent transactions and profile."
         
         user_prompt = f"""
         Recent Transactions:
         {txn_summary}
+
+        Top Spending Categories:
+        {category_summary}
         
         User Profile:
         {json.dumps(user_profile if user_profile else {}, indent=2)}
@@ -208,11 +525,124 @@ Guidelines:
             {"role": "user", "content": user_prompt}
         ]
         
+        def require_text(content):
+            if not content or not content.strip():
+                raise ValueError("empty behavioral summary")
+
         try:
             print("Generating behavioral summary...")
-            response = await self.dedalus_client.chat_completion("openai/gpt-4o-mini", messages, stream=False)
-            return response.choices[0].message.content
+            return await self._cached_completion(BEHAVIORAL_SUMMARY_PROMPT_VERSION, "openai/gpt-4o-mini", messages,
+                                                 validate=require_text)
         except Exception as e:
             print(f"Error generating behavioral summary: {e}")
             return "Unable to generate summary at this time. Please try again later."
 
+    def _regret_line(self, transaction: Dict) -> str:
+        category = (transaction.get("category") or ["Misc"])[0]
+        return json.dumps({
+            "transaction_id": transaction["transaction_id"],
+            "date": str(transaction.get("date", "N/A")),
+            "merchant": transaction.get("merchant_name") or transaction.get("name", "Unknown"),
+            "amount": transaction.get("amount", 0),
+            "category": category,
+            "channel": transaction.get("payment_channel", "unknown"),
+        })
+
+    async def _score_regret_batch(self, transactions: List[Dict], user_profile: Dict = None) -> Dict[str, Dict]:
+        """One structured-output request for a batch. Returns the valid results by transaction_id."""
+        system_prompt = """You are a behavioral finance expert. Rate how likely this user is to regret each of the given transactions, based on their spending regrets and goals.
+
+        Output MUST be valid JSON with this structure:
+        {
+            "results": [
+                {
+                    "transaction_id": "string (copied from the input)",
+                    "score": integer 0-100 (0 = clearly worthwhile, 100 = almost certainly regretted),
+                    "reason": "string (one short sentence)"
+                }
+            ]
+        }
+        Return exactly one result per transaction.
+        """
+
+        transaction_lines = "\n".join(self._regret_line(t) for t in transactions)
+        user_prompt = f"""
+        User Profile:
+        {json.dumps(user_profile if user_profile else {}, indent=2)}
+
+        Transactions (one JSON object per line):
+        {transaction_lines}
+        """
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        response = await self.dedalus_client.chat_completion(
+            "openai/gpt-4o-mini", messages, stream=False, response_format=REGRET_RESPONSE_FORMAT
+        )
+        content = response.choices[0].message.content
+        content = content.replace("```json", "").replace("```", "").strip()
+        items = json.loads(content)["results"]
+
+        wanted = {t["transaction_id"] for t in transactions}
+        results = {}
+        for item in items:
+            tid = item.get("transaction_id") if isinstance(item, dict) else None
+            if tid not in wanted:
+                continue
+            try:
+                score = max(0, min(100, int(item["score"])))
+            except (KeyError, TypeError, ValueError):
+                continue
+            results[tid] = {"score": score, "reason": str(item.get("reason", ""))}
+        return results
+
+    async def _score_regret_with_split(self, transactions: List[Dict], user_profile: Dict = None) -> Dict[str, Dict]:
+        """
+        Score a batch; when the response can't be parsed, split the batch in half
+        and retry each half. Transactions the model skipped are retried the same way.
+        A single transaction that still fails is left out of the results.
+        """
+        try:
+            results = await self._score_regret_batch(transactions, user_profile)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            if len(transactions) == 1:
+                print(f"Error parsing regret score for {transactions[0]['transaction_id']}: {e}")
+                return {}
+            results = {}
+            missing = transactions
+        else:
+            missing = [t for t in transactions if t["transaction_id"] not in results]
+            if not missing or len(transactions) == 1:
+                return results
+
+        mid = (len(missing) + 1) // 2
+        halves = [missing[:mid], missing[mid:]] if len(missing) > 1 else [missing]
+        for part in await asyncio.gather(*(self._score_regret_with_split(h, user_profile) for h in halves if h)):
+            results.update(part)
+        return results
+
+    async def analyze_transactions_regret(self, transactions: List[Dict], user_profile: Dict = None,
+                                          batch_size: int = REGRET_BATCH_SIZE) -> Dict[str, Dict]:
+        """
+        Score many transactions for regret, packing up to `batch_size` into each request.
+        Returns {transaction_id: {"score", "reason"}}; transactions that could not be
+        scored are missing from the result. API errors are raised so callers can retry.
+        """
+        batches = [transactions[i:i + batch_size] for i in range(0, len(transactions), batch_size)]
+        results = {}
+        for part in await asyncio.gather(*(self._score_regret_with_split(b, user_profile) for b in batches)):
+            results.update(part)
+        return results
+
+    async def analyze_transaction_regret(self, transaction: Dict, user_profile: Dict = None) -> Dict:
+        """
+        Score how likely the user is to regret a transaction (0-100) with a short reason.
+        Raises on API or parse errors so callers can retry.
+        """
+        results = await self.analyze_transactions_regret([transaction], user_profile)
+        if transaction["transaction_id"] not in results:
+            raise ValueError(f"No regret score returned for {transaction['transaction_id']}")
+        return results[transaction["transaction_id"]]
@@ -0,0 +1,222 @@
+"""
+Advisor Chat Cache
+
+Near-duplicate question cache for /api/advisor/chat, computed locally (no
+embedding service).
+
+- Questions are normalized (lowercase, contractions expanded, punctuation and
+  stopwords dropped, plural "s" trimmed) and shingled into word unigrams and
+  bigrams. "What's my budget?" and "what is my budget" share every shingle.
+- Entries live in buckets keyed by (user scope, fingerprint of the financial
+  context, survey context and earlier messages), so an answer is never shared
+  across users, across changed account data or across conversations.
+- Within a bucket, MinHash signatures with LSH banding find candidates and the
+  exact Jaccard similarity of the shingle sets decides: a hit needs at least
+  CHAT_CACHE_THRESHOLD and identical numbers ("$500" never matches "$600").
+- Buckets and entries are evicted least recently used, entries also by age.
+"""
+
+import hashlib
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+CHAT_CACHE_THRESHOLD = float(os.environ.get("CHAT_CACHE_THRESHOLD", "0.85"))
+CHAT_CACHE_TTL = float(os.environ.get("CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get("CHAT_CACHE_MAX_ENTRIES", "200"))  # per bucket
+CHAT_CACHE_MAX_BUCKETS = int(os.environ.get("CHAT_CACHE_MAX_BUCKETS", "1000"))
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands of 4 rows: near-certain candidates above ~0.7 similarity
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1234)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "how's": "how is", "where's": "where is",
+    "i'm": "i am", "im": "i am", "i've": "i have", "ive": "i have", "can't": "can not",
+    "won't": "will not", "don't": "do not", "dont": "do not", "didn't": "did not",
+    "isn't": "is not", "it's": "it is",
+}
+# Negations and question words that change the meaning stay in
+STOPWORDS = {
+    "a", "an", "the", "is", "am", "are", "was", "were", "be", "been", "do", "does", "did",
+    "i", "me", "my", "mine", "you", "your", "we", "our", "it", "its", "this", "that",
+    "of", "on", "in", "to", "for", "at", "by", "with", "about", "so", "far",
+    "please", "can", "could", "would", "tell", "show", "hey", "hi", "just", "really",
+}
+_TOKEN = re.compile(r"\$?\d[\d,]*(?:\.\d+)?%?|[a-z']+")
+
+
+def normalize(text: str) -> List[str]:
+    tokens = []
+    for raw in _TOKEN.findall(text.lower()):
+        for word in CONTRACTIONS.get(raw, raw).split():
+            word = word.strip("'").replace(",", "")
+            if not word or word in STOPWORDS:
+                continue
+            if word.endswith("s") and not word.endswith("ss") and len(word) > 3 and word[0].isalpha():
+                word = word[:-1]
+            tokens.append(word)
+    return tokens
+
+
+def shingles(tokens: List[str]) -> FrozenSet[str]:
+    return frozenset(tokens) | frozenset(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+
+
+def minhash(shingle_set: FrozenSet[str]) -> Tuple[int, ...]:
+    hashes = [_hash(s) for s in shingle_set] or [0]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of context strings/messages, insensitive to whitespace changes."""
+    digest = hashlib.sha256()
+    for part in parts:
+        text = part if isinstance(part, str) else repr(part)
+        digest.update(" ".join(text.split()).encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+@dataclass
+class _Entry:
+    question: str
+    shingles: FrozenSet[str]
+    numbers: FrozenSet[str]
+    signature: Tuple[int, ...]
+    chunks: List[str]
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+
+class _Bucket:
+    def __init__(self):
+        self.entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self.bands: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = {}
+
+    def band_keys(self, signature: Tuple[int, ...]):
+        return [(i, signature[i * ROWS:(i + 1) * ROWS]) for i in range(BANDS)]
+
+    def add(self, entry_id: int, entry: _Entry) -> None:
+        self.entries[entry_id] = entry
+        for key in self.band_keys(entry.signature):
+            self.bands.setdefault(key, set()).add(entry_id)
+
+    def remove(self, entry_id: int) -> None:
+        entry = self.entries.pop(entry_id)
+        for key in self.band_keys(entry.signature):
+            ids = self.bands.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self.bands[key]
+
+    def candidates(self, signature: Tuple[int, ...]) -> Set[int]:
+        found: Set[int] = set()
+        for key in self.band_keys(signature):
+            found |= self.bands.get(key, set())
+        return found
+
+
+class ChatResponseCache:
+    def __init__(
+        self,
+        threshold: float = CHAT_CACHE_THRESHOLD,
+        ttl: float = CHAT_CACHE_TTL,
+        max_entries: int = CHAT_CACHE_MAX_ENTRIES,
+        max_buckets: int = CHAT_CACHE_MAX_BUCKETS,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[str, str], _Bucket]" = OrderedDict()
+        self._ids = count()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def bucket_key(scope: str, messages: List[Dict], financial_context: str, survey_context: str) -> Tuple[str, str]:
+        history = [(m.get("role"), m.get("content")) for m in messages[:-1]]
+        return scope, fingerprint(financial_context, survey_context, history)
+
+    def _prepare(self, question: str):
+        tokens = normalize(question)
+        shingle_set = shingles(tokens)
+        numbers = frozenset(t for t in tokens if not t[0].isalpha())
+        return shingle_set, numbers, minhash(shingle_set)
+
+    def lookup(self, bucket_key: Tuple[str, str], question: str) -> Optional[Dict[str, Any]]:
+        """Best cached answer at or above the threshold, as {"chunks", "similarity", "question"}, else None."""
+        bucket = self._buckets.get(bucket_key)
+        shingle_set, numbers, signature = self._prepare(question)
+        best, best_id, best_similarity = None, None, 0.0
+        if bucket is not None and shingle_set:
+            now = time.monotonic()
+            for entry_id in bucket.candidates(signature):
+                entry = bucket.entries[entry_id]
+                if now - entry.created_at > self.ttl:
+                    bucket.remove(entry_id)
+                    self._stats["evictions"] += 1
+                    continue
+                if entry.numbers != numbers:
+                    continue
+                similarity = len(shingle_set & entry.shingles) / len(shingle_set | entry.shingles)
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best, best_id, best_similarity = entry, entry_id, similarity
+
+        if best is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        best.hits += 1
+        bucket.entries.move_to_end(best_id)
+        self._buckets.move_to_end(bucket_key)
+        return {"chunks": best.chunks, "similarity": round(best_similarity, 3), "question": best.question}
+
+    def store(self, bucket_key: Tuple[str, str], question: str, chunks: List[str]) -> None:
+        shingle_set, numbers, signature = self._prepare(question)
+        if not shingle_set:
+            return
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._buckets[bucket_key] = _Bucket()
+            while len(self._buckets) > self.max_buckets:
+                _, evicted = self._buckets.popitem(last=False)
+                self._stats["evictions"] += len(evicted.entries)
+        self._buckets.move_to_end(bucket_key)
+        bucket.add(next(self._ids), _Entry(question, shingle_set, numbers, signature, list(chunks)))
+        while len(bucket.entries) > self.max_entries:
+            bucket.remove(next(iter(bucket.entries)))
+            self._stats["evictions"] += 1
+        self._stats["stores"] += 1
+
+    def clear(self, scope: Optional[str] = None) -> int:
+        """Drop every entry (or one user's); returns how many were removed."""
+        keys = [k for k in self._buckets if scope is None or k[0] == scope]
+        removed = 0
+        for key in keys:
+            removed += len(self._buckets.pop(key).entries)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+            "buckets": len(self._buckets),
+            "entries": sum(len(b.entries) for b in self._buckets.values()),
+        }
@@ -0,0 +1,269 @@
+"""
+Advisor Context Builder
+
+Fits each advisor chat request into a token budget instead of sending the
+whole financial context and message history every turn.
+
+- Financial context: the text the app sends (net worth, accounts, recent
+  transactions, budgets, danger zones, prediction) is parsed into a compact,
+  deterministic block with per-category totals. Transaction lines are dropped
+  oldest first until it fits FINANCIAL_CONTEXT_TOKEN_BUDGET. The result is
+  memoized by content hash, so unchanged data yields a byte-identical system
+  prompt on every turn (and keeps provider prompt-prefix caches warm).
+  Unrecognized text is whitespace-collapsed and truncated.
+- Survey context: the survey analysis is sent as is, without blank lines,
+  and truncated to SURVEY_CONTEXT_TOKEN_BUDGET.
+- History: the newest turns are kept verbatim while they fit. Older turns are
+  summarized locally, a line per turn: the user's question and the start of
+  the reply. The summary only grows at the end as the window slides, and no
+  extra model call sits in front of the first token.
+
+Token counts use tiktoken when installed, otherwise a 4-characters-per-token
+estimate.
+"""
+
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHAT_CONTEXT_TOKEN_BUDGET", "3000"))
+FINANCIAL_CONTEXT_TOKEN_BUDGET = int(os.environ.get("FINANCIAL_CONTEXT_TOKEN_BUDGET", "700"))
+SURVEY_CONTEXT_TOKEN_BUDGET = int(os.environ.get("SURVEY_CONTEXT_TOKEN_BUDGET", "300"))
+# Older turns are summarized to about this many words of each reply
+SUMMARY_REPLY_WORDS = 25
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # optional dependency (or its encoding files) unavailable
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(messages: List[Dict]) -> int:
+    # ~4 tokens of per-message framing in the chat format
+    return sum(count_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+def _truncate(text: str, budget: int) -> str:
+    if count_tokens(text) <= budget:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:mid]) + " …") <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low]) + " …"
+
+
+_MONEY = r"\$?(-?[\d,]+(?:\.\d+)?)"
+_TRANSACTION = re.compile(rf"^- (\d{{4}}-\d{{2}}-\d{{2}}): (.*?) {_MONEY}(?: \[(.*?)\])?(?: \((.*)\))?$")
+
+
+def _amount(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def _parse_financial_context(text: str) -> Optional[Dict]:
+    """Sections of the app's financial context text, or None if it isn't in that format."""
+    if not text.startswith("Net Worth:"):
+        return None
+    data = {"accounts": [], "transactions": [], "budgets": [], "danger_zones": [], "other": []}
+    section = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("Net Worth:"):
+            data["net_worth"] = line.split(":", 1)[1].strip()
+        elif line.startswith("Recent Spending"):
+            data["spending"] = line
+        elif line.startswith("Number of transactions:"):
+            data["transaction_count"] = line.split(":", 1)[1].strip()
+        elif line.startswith("Purchase Prediction:"):
+            data["prediction"] = line.split(":", 1)[1].strip()
+        elif line.endswith(":") and not line.startswith("-"):
+            section = line[:-1]
+        elif line.startswith("- ") and section == "Accounts":
+            data["accounts"].append(line[2:])
+        elif line.startswith("- ") and section == "Recent Transactions":
+            match = _TRANSACTION.match(line)
+            if match is None:
+                data["other"].append(line[2:])
+                continue
+            date, name, amount, category, _location = match.groups()
+            data["transactions"].append((date, name, _amount(amount), (category or "Misc").split(",")[0].strip()))
+        elif line.startswith("- ") and section == "Monthly Budgets":
+            data["budgets"].append(line[2:])
+        elif line.startswith("- ") and section and section.startswith("Danger Zones"):
+            # Coordinates aren't useful to the model; keep merchant and count
+            data["danger_zones"].append(re.sub(r" \([-\d., ]+\)$", "", line[2:]))
+        else:
+            data["other"].append(line.lstrip("- "))
+    return data
+
+
+def _render_financial_context(data: Dict, max_transactions: int) -> str:
+    lines = [f"net_worth: {data.get('net_worth', 'unknown')}"]
+    if data["accounts"]:
+        lines.append("accounts: " + "; ".join(data["accounts"]))
+    if data.get("spending"):
+        count = f" across {data['transaction_count']} transactions" if data.get("transaction_count") else ""
+        lines.append(f"{data['spending'].rstrip('.')}{count}")
+    transactions = data["transactions"]
+    if transactions:
+        totals: Dict[str, Tuple[float, int]] = {}
+        for _, _, amount, category in transactions:
+            if amount > 0:
+                total, count = totals.get(category, (0.0, 0))
+                totals[category] = (total + amount, count + 1)
+        if totals:
+            ranked = sorted(totals.items(), key=lambda kv: (-kv[1][0], kv[0]))
+            lines.append("spend_by_category: " + "; ".join(f"{c} ${t:.2f} ({n})" for c, (t, n) in ranked))
+        shown = transactions[:max_transactions]
+        if shown:
+            lines.append("recent_transactions (date merchant amount category): " + "; ".join(
+                f"{date[5:]} {name} ${amount:.2f} {category}" for date, name, amount, category in shown
+            ))
+        if len(transactions) > len(shown):
+            lines.append(f"({len(transactions) - len(shown)} older transactions omitted; included in totals)")
+    if data["budgets"]:
+        lines.append("budgets: " + "; ".join(data["budgets"]))
+    if data["danger_zones"]:
+        lines.append("danger_zones: " + "; ".join(data["danger_zones"]))
+    if data.get("prediction"):
+        lines.append(f"purchase_prediction: {data['prediction']}")
+    lines.extend(data["other"])
+    return "\n".join(lines)
+
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+# The summary message's header and framing, plus a token of slack for tokenizer merges at the join
+SUMMARY_OVERHEAD = message_tokens([{"content": SUMMARY_HEADER}]) + 1
+
+
+class ContextBuilder:
+    """Builds budgeted message lists for the advisor chat."""
+
+    def __init__(
+        self,
+        token_budget: int = CHAT_CONTEXT_TOKEN_BUDGET,
+        financial_budget: int = FINANCIAL_CONTEXT_TOKEN_BUDGET,
+        survey_budget: int = SURVEY_CONTEXT_TOKEN_BUDGET,
+        memo_size: int = 256,
+    ):
+        self.token_budget = token_budget
+        self.financial_budget = financial_budget
+        self.survey_budget = survey_budget
+        self.memo_size = memo_size
+        self._compacted: "OrderedDict[str, str]" = OrderedDict()
+        self._stats = {"builds": 0, "compactions": 0, "compaction_reuses": 0, "summarized_turns": 0}
+
+    def compact_financial_context(self, text: str) -> str:
+        if not text:
+            return ""
+        key = hashlib.sha256(text.encode()).hexdigest()
+        if key in self._compacted:
+            self._compacted.move_to_end(key)
+            self._stats["compaction_reuses"] += 1
+            return self._compacted[key]
+
+        data = _parse_financial_context(text)
+        if data is None:
+            compacted = _truncate(" ".join(text.split()), self.financial_budget)
+        else:
+            shown = len(data["transactions"])
+            compacted = _render_financial_context(data, shown)
+            while shown > 0 and count_tokens(compacted) > self.financial_budget:
+                shown -= 1
+                compacted = _render_financial_context(data, shown)
+            compacted = _truncate(compacted, self.financial_budget)
+
+        self._stats["compactions"] += 1
+        self._compacted[key] = compacted
+        while len(self._compacted) > self.memo_size:
+            self._compacted.popitem(last=False)
+        return compacted
+
+    def compact_survey_context(self, text: str) -> str:
+        if not text:
+            return ""
+        text = "\n".join(line.rstrip() for line in text.strip().splitlines() if line.strip())
+        return _truncate(text, self.survey_budget)
+
+    @staticmethod
+    def summarize_turns(messages: List[Dict]) -> str:
+        lines = []
+        for m in messages:
+            words = " ".join((m.get("content") or "").split()).split(" ")
+            if m.get("role") == "user":
+                lines.append(f"- User asked: {' '.join(words[:40])}")
+            else:
+                reply = " ".join(words[:SUMMARY_REPLY_WORDS])
+                lines.append(f"  Advisor: {reply}{' …' if len(words) > SUMMARY_REPLY_WORDS else ''}")
+        return "\n".join(lines)
+
+    def build(self, system_prompt: str, messages: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        Fit `messages` behind `system_prompt` into the token budget.
+        Returns the message list to send and a report of what was kept.
+        """
+        self._stats["builds"] += 1
+        system = {"role": "system", "content": system_prompt}
+        remaining = self.token_budget - message_tokens([system])
+
+        # The newest message is always sent (truncated only if it alone exceeds the budget)
+        last = dict(messages[-1]) if messages else None
+        window: List[Dict] = []
+        if last is not None:
+            last["content"] = _truncate(last.get("content") or "", max(remaining - 4, 50))
+            window = [last]
+            remaining -= message_tokens(window)
+
+        older = list(messages[:-1])
+        # Reserve room for the summary line of each turn that falls out of the window
+        while older:
+            candidate = older[-1]
+            cost = message_tokens([candidate])
+            summary_cost = count_tokens(self.summarize_turns(older[:-1])) + SUMMARY_OVERHEAD if len(older) > 1 else 0
+            if cost + summary_cost > remaining:
+                break
+            window.insert(0, candidate)
+            remaining -= cost
+            older.pop()
+
+        result = [system]
+        if older:
+            room = remaining - SUMMARY_OVERHEAD
+            summary = _truncate(self.summarize_turns(older), room) if room > 0 else ""
+            if summary:
+                result.append({"role": "system", "content": SUMMARY_HEADER + summary})
+            self._stats["summarized_turns"] += len(older)
+        result.extend(window)
+        report = {
+            "prompt_tokens": message_tokens(result),
+            "kept_messages": len(window),
+            "summarized_messages": len(older),
+        }
+        return result, report
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            "token_budget": self.token_budget,
+            "financial_budget": self.financial_budget,
+            "survey_budget": self.survey_budget,
+            "tokenizer": "tiktoken" if _encoding is not None else "estimate",
+        }
@@ -1,9 +1,12 @@
 import sqlite3
 import json
 import os
-from datetime import datetime
+import base64
+import hashlib
+import time
+from datetime import datetime, timedelta
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "finance.db")
+DB_PATH = os.environ.get("FINANCE_DB_PATH", os.path.join(os.path.dirname(__file__), "finance.db"))
 
 def get_db_connection():
     conn = sqlite3.connect(DB_PATH)
@@ -13,6 +16,9 @@ def get_db_connection():
 def init_db():
     conn = get_db_connection()
     c = conn.cursor()
+
+    # WAL lets API reads proceed while a background sync is writing
+    c.execute("PRAGMA journal_mode=WAL")
     
     # Table for user personality/survey data
     c.execute('''
@@ -35,9 +41,207 @@ def init_db():
         )
     ''')
     
+    # Local copy of Plaid transactions, kept current by /transactions/sync deltas
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS plaid_transactions (
+            transaction_id TEXT PRIMARY KEY,
+            item_id TEXT NOT NULL,
+            account_id TEXT,
+            name TEXT,
+            amount REAL,
+            date TEXT, -- YYYY-MM-DD
+            category TEXT, -- JSON list
+            pending INTEGER,
+            merchant_name TEXT,
+            payment_channel TEXT,
+            iso_currency_code TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Denormalized filter columns: first category entry and merchant (falls back to name)
+    _add_column_if_missing(c, "plaid_transactions", "category_primary", "TEXT COLLATE NOCASE")
+    _add_column_if_missing(c, "plaid_transactions", "merchant", "TEXT COLLATE NOCASE")
+    # ISO timestamp, when the institution reports one (Plaid's datetime/authorized_datetime)
+    _add_column_if_missing(c, "plaid_transactions", "datetime", "TEXT")
+    # Who produced a regret score: "llm", or "local" for the on-server classifier
+    _add_column_if_missing(c, "transaction_metadata", "source", "TEXT NOT NULL DEFAULT 'llm'")
+    # Order in which scores were saved, across every process; the regret stream's watermark
+    _add_column_if_missing(c, "transaction_metadata", "scored_seq", "INTEGER")
+    # transaction_id DESC matches the newest-first tie-break, so date-sorted pages need no sort step.
+    # Older databases have this index with transaction_id ascending: rebuild it.
+    c.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'idx_plaid_transactions_item_date'")
+    row = c.fetchone()
+    if row and "transaction_id DESC" not in row["sql"]:
+        c.execute("DROP INDEX idx_plaid_transactions_item_date")
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_plaid_transactions_item_date
+        ON plaid_transactions (item_id, date DESC, transaction_id DESC)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_plaid_transactions_item_amount
+        ON plaid_transactions (item_id, amount, transaction_id)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_plaid_transactions_item_category
+        ON plaid_transactions (item_id, category_primary, date, transaction_id)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_plaid_transactions_item_merchant
+        ON plaid_transactions (item_id, merchant, date, transaction_id)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transaction_metadata_score
+        ON transaction_metadata (regret_score)
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transaction_metadata_seq
+        ON transaction_metadata (scored_seq)
+    ''')
+
+    # Sync cursor per Plaid item, persisted with the deltas it produced
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS plaid_sync_state (
+            item_id TEXT PRIMARY KEY,
+            cursor TEXT,
+            last_synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Materialized spend per (granularity, bucket, dimension, key), maintained
+    # incrementally by apply_transaction_sync and save_transaction_regret
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS spending_rollups (
+            item_id TEXT NOT NULL,
+            granularity TEXT NOT NULL, -- day | week | month
+            bucket TEXT NOT NULL, -- YYYY-MM-DD start of bucket
+            dimension TEXT NOT NULL, -- category | merchant
+            key TEXT COLLATE NOCASE NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            regret_weighted REAL NOT NULL DEFAULT 0, -- sum(amount * regret_score / 100)
+            PRIMARY KEY (item_id, granularity, dimension, bucket, key)
+        )
+    ''')
+
+    # Connection/session state shared by every server process (see session_store.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS session_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Persistent regret-scoring queue, one row per transaction (dedupes re-enqueues)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS regret_jobs (
+            transaction_id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL, -- JSON transaction dict
+            status TEXT NOT NULL DEFAULT 'pending', -- pending | running | failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0, -- unix time
+            last_error TEXT,
+            updated_at REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_regret_jobs_due
+        ON regret_jobs (status, next_attempt_at)
+    ''')
+
+    # Local mirror of Capital One Nessie data (see nessie_mirror.py). Rows keep the
+    # raw Nessie object plus a hash of it, so re-syncs only write what changed.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS nessie_customers (
+            customer_id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL, -- JSON Nessie customer
+            payload_hash TEXT NOT NULL,
+            mirrored_at REAL -- unix time of the last complete sync
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS nessie_accounts (
+            account_id TEXT PRIMARY KEY,
+            customer_id TEXT NOT NULL,
+            position INTEGER, -- order in the Nessie account list
+            type TEXT,
+            balance REAL,
+            payload TEXT NOT NULL, -- JSON Nessie account
+            payload_hash TEXT NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_nessie_accounts_customer
+        ON nessie_accounts (customer_id)
+    ''')
+    # A transfer between two of a customer's accounts is listed under both with the
+    # same _id, so items are keyed per account. Tables from before that are rebuilt.
+    c.execute("PRAGMA table_info(nessie_account_items)")
+    if [row["name"] for row in c.fetchall() if row["pk"]] == ["item_id"]:
+        c.execute("DROP TABLE nessie_account_items")
+        c.execute("UPDATE nessie_customers SET mirrored_at = NULL")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS nessie_account_items (
+            item_id TEXT NOT NULL, -- Nessie _id
+            account_id TEXT NOT NULL,
+            kind TEXT NOT NULL, -- bills | deposits | loans | purchases | transfers | withdrawals
+            date TEXT, -- YYYY-MM-DD (purchase/transaction/payment/creation date)
+            amount REAL,
+            status TEXT,
+            payload TEXT NOT NULL, -- JSON Nessie object
+            payload_hash TEXT NOT NULL,
+            PRIMARY KEY (account_id, kind, item_id)
+        )
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_nessie_account_items_account
+        ON nessie_account_items (account_id, kind, date)
+    ''')
+
+    # Background tasks that must run in one server process at a time hold a lease
+    # row here (e.g. the Nessie mirror loop) and renew it while they run
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS background_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL, -- process-unique holder id
+            expires_at REAL NOT NULL -- unix time
+        )
+    ''')
+
+    # Content-addressed cache of deterministic LLM analyses (see llm_cache.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            cache_key TEXT PRIMARY KEY, -- sha256 of prompt version, model, messages and params
+            prompt_version TEXT NOT NULL,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            prompt_tokens INTEGER DEFAULT 0,
+            completion_tokens INTEGER DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER DEFAULT 0
+        )
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used
+        ON llm_response_cache (last_used_at)
+    ''')
+
+    # Backfill rollups for transactions stored before the table existed
+    c.execute("SELECT 1 FROM spending_rollups LIMIT 1")
+    if c.fetchone() is None:
+        c.execute("SELECT DISTINCT item_id FROM plaid_transactions")
+        for row in c.fetchall():
+            _rebuild_spending_rollups(c, row["item_id"])
+
     conn.commit()
     conn.close()
 
+def _add_column_if_missing(c, table, column, decl):
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in {row["name"] for row in c.fetchall()}:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
 def save_user_profile(spending_regret, user_goals, top_categories):
     conn = get_db_connection()
     c = conn.cursor()
@@ -98,17 +302,781 @@ def get_transaction_metadata(transaction_ids):
         }
     return results
 
-def save_transaction_regret(transaction_id, score, reason):
+def save_transaction_regret(transaction_id, score, reason, source="llm"):
     conn = get_db_connection()
     c = conn.cursor()
-    
+
+    # Re-weight the rollups this transaction contributes to by the score change
+    c.execute('''
+        SELECT t.item_id, t.amount, t.date, t.category_primary, t.merchant, m.regret_score
+        FROM plaid_transactions t
+        LEFT JOIN transaction_metadata m ON m.transaction_id = t.transaction_id
+        WHERE t.transaction_id = ?
+    ''', (transaction_id,))
+    txn = c.fetchone()
+    if txn:
+        score_delta = (score or 0) - (txn["regret_score"] or 0)
+        _apply_rollup(c, txn["item_id"], txn, 0, score_delta)
+
+    # analyzed_at only has second resolution, so a sequence number (assigned under the
+    # write lock, hence unique and in commit order) tells readers what is new
     c.execute('''
-        INSERT OR REPLACE INTO transaction_metadata (transaction_id, regret_score, regret_reason, analyzed_at)
-        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-    ''', (transaction_id, score, reason))
+        INSERT OR REPLACE INTO transaction_metadata (transaction_id, regret_score, regret_reason, source, analyzed_at, scored_seq)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, (SELECT COALESCE(MAX(scored_seq), 0) + 1 FROM transaction_metadata))
+    ''', (transaction_id, score, reason, source))
     
     conn.commit()
     conn.close()
 
+def get_regret_score_watermark():
+    """The newest scored_seq, or 0 if nothing has been scored."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT COALESCE(MAX(scored_seq), 0) AS seq FROM transaction_metadata")
+    seq = c.fetchone()["seq"]
+    conn.close()
+    return seq
+
+def get_regret_scores_since(seq, limit=500):
+    """Scores saved (by any process) after `seq`, oldest first."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        SELECT transaction_id, regret_score, regret_reason, source, scored_seq FROM transaction_metadata
+        WHERE scored_seq > ? ORDER BY scored_seq LIMIT ?
+    ''', (seq, limit))
+    rows = [dict(row) for row in c.fetchall()]
+    conn.close()
+    return rows
+
+def get_regret_training_rows():
+    """Stored transactions with an LLM-assigned regret score, for training the local classifier."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        SELECT t.*, m.regret_score
+        FROM transaction_metadata m
+        JOIN plaid_transactions t ON t.transaction_id = m.transaction_id
+        WHERE m.source = 'llm' AND m.regret_score IS NOT NULL
+    ''')
+    rows = c.fetchall()
+    conn.close()
+    return [{**_row_to_transaction(row), "regret_score": row["regret_score"]} for row in rows]
+
+def enqueue_regret_jobs(transactions):
+    """
+    Queue transactions for regret scoring. Pending or running transaction ids are
+    skipped; jobs that failed permanently are re-armed with fresh attempts.
+    Returns rows added or re-armed.
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    now = time.time()
+    c.executemany('''
+        INSERT INTO regret_jobs (transaction_id, payload, next_attempt_at, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (transaction_id) DO UPDATE SET
+            status = 'pending', attempts = 0, payload = excluded.payload,
+            next_attempt_at = excluded.next_attempt_at, updated_at = excluded.updated_at
+        WHERE regret_jobs.status = 'failed'
+    ''', [(t["transaction_id"], json.dumps(t), now, now) for t in transactions])
+    added = conn.total_changes
+    conn.commit()
+    conn.close()
+    return added
+
+def claim_regret_jobs(limit=1):
+    """Atomically move up to `limit` due pending jobs to running and return them."""
+    conn = get_db_connection()
+    conn.isolation_level = None
+    c = conn.cursor()
+    now = time.time()
+    # IMMEDIATE takes the write lock up front so two workers never claim the same job
+    c.execute("BEGIN IMMEDIATE")
+    c.execute('''
+        SELECT transaction_id, payload, attempts FROM regret_jobs
+        WHERE status = 'pending' AND next_attempt_at <= ?
+        ORDER BY next_attempt_at LIMIT ?
+    ''', (now, limit))
+    rows = c.fetchall()
+    c.executemany(
+        "UPDATE regret_jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE transaction_id = ?",
+        [(now, row["transaction_id"]) for row in rows],
+    )
+    c.execute("COMMIT")
+    conn.close()
+    return [
+        {"transaction_id": row["transaction_id"], "transaction": json.loads(row["payload"]), "attempts": row["attempts"] + 1}
+        for row in rows
+    ]
+
+def complete_regret_job(transaction_id):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("DELETE FROM regret_jobs WHERE transaction_id = ?", (transaction_id,))
+    conn.commit()
+    conn.close()
+
+def fail_regret_job(transaction_id, error, retry_at=None):
+    """Record a failed attempt; retried at `retry_at` (unix time), or parked as failed if None."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        UPDATE regret_jobs
+        SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+        WHERE transaction_id = ?
+    ''', ("pending" if retry_at is not None else "failed", retry_at or 0, str(error), time.time(), transaction_id))
+    conn.commit()
+    conn.close()
+
+def requeue_stale_regret_jobs(older_than_seconds):
+    """Return jobs left running by a crashed worker to the queue. Returns the count."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        UPDATE regret_jobs SET status = 'pending'
+        WHERE status = 'running' AND updated_at < ?
+    ''', (time.time() - older_than_seconds,))
+    count = c.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+def get_regret_job_counts():
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT status, COUNT(*) AS n FROM regret_jobs GROUP BY status")
+    counts = {row["status"]: row["n"] for row in c.fetchall()}
+    conn.close()
+    return counts
+
+def get_session_value(key):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT value FROM session_state WHERE key = ?", (key,))
+    row = c.fetchone()
+    conn.close()
+    return row["value"] if row else None
+
+def set_session_value(key, value):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR REPLACE INTO session_state (key, value, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+    ''', (key, value))
+    conn.commit()
+    conn.close()
+
+def delete_session_value(key):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("DELETE FROM session_state WHERE key = ?", (key,))
+    conn.commit()
+    conn.close()
+
+def acquire_lease(name, owner, ttl):
+    """
+    Take or renew the named lease for `ttl` seconds. Succeeds if nobody holds it,
+    `owner` already does, or the holder's lease has expired; returns whether it did.
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    now = time.time()
+    # One statement, so two processes can't both see the lease free and take it
+    c.execute('''
+        INSERT INTO background_leases (name, owner, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE background_leases.owner = excluded.owner OR background_leases.expires_at < ?
+    ''', (name, owner, now + ttl, now))
+    acquired = c.rowcount == 1
+    conn.commit()
+    conn.close()
+    return acquired
+
+def release_lease(name, owner):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("DELETE FROM background_leases WHERE name = ? AND owner = ?", (name, owner))
+    conn.commit()
+    conn.close()
+
+def get_lease(name):
+    """The unexpired holder of the named lease as {"owner", "expires_at"}, or None."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT owner, expires_at FROM background_leases WHERE name = ? AND expires_at >= ?", (name, time.time()))
+    row = c.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_sync_cursor(item_id):
+    """Return the stored /transactions/sync cursor for an item, or None if never synced."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT cursor FROM plaid_sync_state WHERE item_id = ?", (item_id,))
+    row = c.fetchone()
+    conn.close()
+    return row["cursor"] if row else None
+
+def apply_transaction_sync(item_id, added, modified, removed, next_cursor):
+    """
+    Apply one batch of sync deltas and advance the cursor atomically.
+
+    `added` and `modified` are transaction dicts (same shape as the API response),
+    `removed` is a list of transaction ids.
+    """
+    conn = get_db_connection()
+    conn.isolation_level = None
+    c = conn.cursor()
+    # Take the write lock before reading the old rollup inputs, so two syncs of the
+    # same item can't both subtract and re-add them (double-counting the rollups)
+    c.execute("BEGIN IMMEDIATE")
+
+    # Take the old versions of touched transactions out of the rollups first
+    changed = list(added) + list(modified)
+    touched_ids = [t["transaction_id"] for t in changed] + list(removed)
+    for txn in _fetch_rollup_inputs(c, touched_ids):
+        _apply_rollup(c, item_id, txn, -1, -(txn["regret_score"] or 0))
+
+    rows = [
+        (
+            t["transaction_id"], item_id, t.get("account_id"), t.get("name"), t.get("amount"),
+            t.get("date"), json.dumps(t.get("category") or []), int(bool(t.get("pending"))),
+            t.get("merchant_name"), t.get("payment_channel"), t.get("iso_currency_code"),
+            (t.get("category") or [None])[0], t.get("merchant_name") or t.get("name"), t.get("datetime"),
+        )
+        for t in changed
+    ]
+    c.executemany('''
+        INSERT OR REPLACE INTO plaid_transactions (
+            transaction_id, item_id, account_id, name, amount, date, category, pending,
+            merchant_name, payment_channel, iso_currency_code, category_primary, merchant,
+            datetime, updated_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', rows)
+
+    if removed:
+        c.executemany(
+            "DELETE FROM plaid_transactions WHERE transaction_id = ?",
+            [(tid,) for tid in removed],
+        )
+
+    # ...then add the new versions back in
+    for txn in _fetch_rollup_inputs(c, [t["transaction_id"] for t in changed]):
+        _apply_rollup(c, item_id, txn, 1, txn["regret_score"] or 0)
+    if touched_ids:
+        c.execute("DELETE FROM spending_rollups WHERE item_id = ? AND count <= 0", (item_id,))
+
+    c.execute('''
+        INSERT OR REPLACE INTO plaid_sync_state (item_id, cursor, last_synced_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+    ''', (item_id, next_cursor))
+
+    c.execute("COMMIT")
+    conn.close()
+
+ROLLUP_GRANULARITIES = ("day", "week", "month")
+ROLLUP_DIMENSIONS = ("category", "merchant")
+
+def _bucket_start(date_str, granularity):
+    d = datetime.strptime(date_str, "%Y-%m-%d").date()
+    if granularity == "week":
+        d -= timedelta(days=d.weekday())
+    elif granularity == "month":
+        d = d.replace(day=1)
+    return d.isoformat()
+
+def _fetch_rollup_inputs(c, transaction_ids):
+    rows = []
+    for i in range(0, len(transaction_ids), 500):
+        chunk = transaction_ids[i:i + 500]
+        placeholders = ','.join('?' for _ in chunk)
+        c.execute(f'''
+            SELECT t.amount, t.date, t.category_primary, t.merchant, m.regret_score
+            FROM plaid_transactions t
+            LEFT JOIN transaction_metadata m ON m.transaction_id = t.transaction_id
+            WHERE t.transaction_id IN ({placeholders})
+        ''', chunk)
+        rows.extend(c.fetchall())
+    return rows
+
+def _apply_rollup(c, item_id, txn, count_sign, regret_delta):
+    """
+    Add one transaction's contribution to every rollup bucket it falls in.
+    count_sign is +1/-1 to add/remove the spend itself (0 to leave it), regret_delta
+    is the regret score (0-100) to add to its regret-weighted spend.
+    Only outflows (positive Plaid amounts) count as spend.
+    """
+    amount = txn["amount"] or 0
+    if amount <= 0 or not txn["date"]:
+        return
+    keys = {
+        "category": txn["category_primary"] or "Uncategorized",
+        "merchant": txn["merchant"] or "Unknown",
+    }
+    rows = [
+        (item_id, granularity, _bucket_start(txn["date"], granularity), dimension, key,
+         count_sign * amount, count_sign, amount * regret_delta / 100.0)
+        for granularity in ROLLUP_GRANULARITIES
+        for dimension, key in keys.items()
+    ]
+    c.executemany('''
+        INSERT INTO spending_rollups (item_id, granularity, bucket, dimension, key, total, count, regret_weighted)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (item_id, granularity, dimension, bucket, key) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + excluded.count,
+            regret_weighted = regret_weighted + excluded.regret_weighted
+    ''', rows)
+
+def _rebuild_spending_rollups(c, item_id):
+    c.execute("DELETE FROM spending_rollups WHERE item_id = ?", (item_id,))
+    c.execute('''
+        SELECT t.amount, t.date, t.category_primary, t.merchant, m.regret_score
+        FROM plaid_transactions t
+        LEFT JOIN transaction_metadata m ON m.transaction_id = t.transaction_id
+        WHERE t.item_id = ?
+    ''', (item_id,))
+    for txn in c.fetchall():
+        _apply_rollup(c, item_id, txn, 1, txn["regret_score"] or 0)
+
+def get_spending_rollups(item_id, granularity="month", dimension="category",
+                         start_date=None, end_date=None, key=None):
+    """
+    Read materialized spend for buckets starting within [start_date, end_date].
+
+    Returns {"buckets": [...], "totals": [...]} where totals sums the selected
+    buckets per key. Cost scales with the number of buckets, not transactions.
+    Raises ValueError for an unknown granularity or dimension.
+    """
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}', expected one of {list(ROLLUP_GRANULARITIES)}")
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}', expected one of {list(ROLLUP_DIMENSIONS)}")
+
+    where = "WHERE item_id = ? AND granularity = ? AND dimension = ?"
+    params = [item_id, granularity, dimension]
+    if start_date:
+        where += " AND bucket >= ?"
+        params.append(_bucket_start(str(start_date), granularity))
+    if end_date:
+        where += " AND bucket <= ?"
+        params.append(str(end_date))
+    if key:
+        where += " AND key = ?"
+        params.append(key)
+
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute(f"SELECT bucket, key, total, count, regret_weighted FROM spending_rollups {where} ORDER BY bucket, key", params)
+    buckets = [
+        {
+            "bucket": row["bucket"],
+            "key": row["key"],
+            "total": round(row["total"], 2),
+            "count": row["count"],
+            "regret_weighted": round(row["regret_weighted"], 2),
+        }
+        for row in c.fetchall()
+    ]
+    c.execute(f'''
+        SELECT key, SUM(total) AS total, SUM(count) AS count, SUM(regret_weighted) AS regret_weighted
+        FROM spending_rollups {where}
+        GROUP BY key ORDER BY total DESC
+    ''', params)
+    totals = [
+        {
+            "key": row["key"],
+            "total": round(row["total"], 2),
+            "count": row["count"],
+            "regret_weighted": round(row["regret_weighted"], 2),
+        }
+        for row in c.fetchall()
+    ]
+    conn.close()
+    return {"buckets": buckets, "totals": totals}
+
+def _row_to_transaction(row):
+    return {
+        "transaction_id": row["transaction_id"],
+        "account_id": row["account_id"],
+        "name": row["name"],
+        "amount": row["amount"],
+        "date": row["date"],
+        "category": json.loads(row["category"]) if row["category"] else [],
+        "pending": bool(row["pending"]),
+        "merchant_name": row["merchant_name"],
+        "payment_channel": row["payment_channel"],
+        "iso_currency_code": row["iso_currency_code"],
+        "datetime": row["datetime"],
+    }
+
+def get_stored_transactions(item_id, start_date=None, end_date=None):
+    """Read transactions for an item from the local store, newest first."""
+    conn = get_db_connection()
+    c = conn.cursor()
+
+    query = "SELECT * FROM plaid_transactions WHERE item_id = ?"
+    params = [item_id]
+    if start_date:
+        query += " AND date >= ?"
+        params.append(str(start_date))
+    if end_date:
+        query += " AND date <= ?"
+        params.append(str(end_date))
+    query += " ORDER BY date DESC, transaction_id DESC"
+
+    c.execute(query, params)
+    rows = c.fetchall()
+    conn.close()
+    return [_row_to_transaction(row) for row in rows]
+
+# Sort options for query_transactions: name -> (column, direction)
+TRANSACTION_SORTS = {
+    "date_desc": ("t.date", "DESC"),
+    "date_asc": ("t.date", "ASC"),
+    "amount_desc": ("t.amount", "DESC"),
+    "amount_asc": ("t.amount", "ASC"),
+}
+
+MAX_QUERY_LIMIT = 200
+
+def encode_cursor(sort, value, transaction_id):
+    raw = json.dumps([sort, value, transaction_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, transaction_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError("Cursor was issued for a different sort order")
+    return value, transaction_id
+
+def query_transactions(item_id, start_date=None, end_date=None, category=None, merchant=None,
+                       min_amount=None, max_amount=None, min_regret=None,
+                       sort="date_desc", limit=50, cursor=None):
+    """
+    Keyset-paginated transaction query over the local store.
+
+    Returns (transactions, next_cursor). Each page costs one index range scan no
+    matter how deep into the history it is; `next_cursor` is None on the last page.
+    Raises ValueError for an unknown sort or a malformed cursor.
+    """
+    if sort not in TRANSACTION_SORTS:
+        raise ValueError(f"Unknown sort '{sort}', expected one of {sorted(TRANSACTION_SORTS)}")
+    column, direction = TRANSACTION_SORTS[sort]
+    limit = max(1, min(int(limit), MAX_QUERY_LIMIT))
+
+    query = '''
+        SELECT t.*, m.regret_score, m.regret_reason
+        FROM plaid_transactions t
+        LEFT JOIN transaction_metadata m ON m.transaction_id = t.transaction_id
+        WHERE t.item_id = ?
+    '''
+    params = [item_id]
+
+    if start_date:
+        query += " AND t.date >= ?"
+        params.append(str(start_date))
+    if end_date:
+        query += " AND t.date <= ?"
+        params.append(str(end_date))
+    if category:
+        query += " AND t.category_primary = ?"
+        params.append(category)
+    if merchant:
+        query += " AND t.merchant = ?"
+        params.append(merchant)
+    if min_amount is not None:
+        query += " AND t.amount >= ?"
+        params.append(min_amount)
+    if max_amount is not None:
+        query += " AND t.amount <= ?"
+        params.append(max_amount)
+    if min_regret is not None:
+        query += " AND m.regret_score >= ?"
+        params.append(min_regret)
+    if cursor:
+        value, transaction_id = decode_cursor(cursor, sort)
+        op = "<" if direction == "DESC" else ">"
+        query += f" AND ({column}, t.transaction_id) {op} (?, ?)"
+        params.extend([value, transaction_id])
+
+    query += f" ORDER BY {column} {direction}, t.transaction_id {direction} LIMIT ?"
+    params.append(limit + 1)
+
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute(query, params)
+    rows = c.fetchall()
+    conn.close()
+
+    transactions = []
+    for row in rows[:limit]:
+        t = _row_to_transaction(row)
+        t["regretScore"] = row["regret_score"]
+        t["regretReason"] = row["regret_reason"]
+        transactions.append(t)
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(sort, last[column.split(".")[1]], last["transaction_id"])
+    return transactions, next_cursor
+
+def clear_item_transactions(item_id):
+    """Forget everything synced for an item (used on disconnect)."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("DELETE FROM plaid_transactions WHERE item_id = ?", (item_id,))
+    c.execute("DELETE FROM spending_rollups WHERE item_id = ?", (item_id,))
+    c.execute("DELETE FROM plaid_sync_state WHERE item_id = ?", (item_id,))
+    conn.commit()
+    conn.close()
+
+NESSIE_ITEM_KINDS = ("bills", "deposits", "loans", "purchases", "transfers", "withdrawals")
+
+def _payload_hash(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def _nessie_item_row(item, account_id, kind):
+    date = (item.get("purchase_date") or item.get("transaction_date") or item.get("payment_date")
+            or item.get("creation_date"))
+    amount = item.get("amount", item.get("payment_amount"))
+    payload = json.dumps(item)
+    return (item["_id"], account_id, kind, date, amount, item.get("status"), payload, _payload_hash(item))
+
+def apply_nessie_mirror(customer_id, customer, accounts, items):
+    """
+    Diff one customer's freshly fetched Nessie data against the mirror by _id (per
+    account and kind for items) and content hash, writing only new/changed rows and deleting vanished ones, in one
+    transaction.
+
+    `items` maps (account_id, kind) to the fetched list. Pairs that are missing
+    (e.g. the fetch failed) are left untouched rather than treated as empty.
+    Returns {"inserted", "updated", "deleted", "unchanged"}.
+    """
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    conn = get_db_connection()
+    c = conn.cursor()
+
+    def upsert(key, new_hash, existing, sql, params):
+        if key not in existing:
+            counts["inserted"] += 1
+        elif existing[key] != new_hash:
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+            return
+        c.execute(sql, params)
+
+    c.execute("SELECT payload_hash FROM nessie_customers WHERE customer_id = ?", (customer_id,))
+    row = c.fetchone()
+    customer = customer or {"_id": customer_id}
+    upsert(customer_id, _payload_hash(customer),
+           {customer_id: row["payload_hash"]} if row else {},
+           "INSERT OR REPLACE INTO nessie_customers (customer_id, payload, payload_hash) VALUES (?, ?, ?)",
+           (customer_id, json.dumps(customer), _payload_hash(customer)))
+
+    c.execute("SELECT account_id, payload_hash, position FROM nessie_accounts WHERE customer_id = ?", (customer_id,))
+    existing_accounts = {r["account_id"]: (r["payload_hash"], r["position"]) for r in c.fetchall()}
+    for position, a in enumerate(accounts):
+        payload_hash = _payload_hash(a)
+        upsert(a["_id"], (payload_hash, position), existing_accounts, '''
+            INSERT OR REPLACE INTO nessie_accounts
+                (account_id, customer_id, position, type, balance, payload, payload_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (a["_id"], customer_id, position, a.get("type"), a.get("balance"), json.dumps(a), payload_hash))
+    gone = set(existing_accounts) - {a["_id"] for a in accounts}
+    for account_id in gone:
+        c.execute("DELETE FROM nessie_accounts WHERE account_id = ?", (account_id,))
+        c.execute("DELETE FROM nessie_account_items WHERE account_id = ?", (account_id,))
+    counts["deleted"] += len(gone)
+
+    for (account_id, kind), fetched in items.items():
+        c.execute(
+            "SELECT item_id, payload_hash FROM nessie_account_items WHERE account_id = ? AND kind = ?",
+            (account_id, kind),
+        )
+        existing_items = {r["item_id"]: r["payload_hash"] for r in c.fetchall()}
+        for item in fetched:
+            row = _nessie_item_row(item, account_id, kind)
+            upsert(item["_id"], row[-1], existing_items, '''
+                INSERT OR REPLACE INTO nessie_account_items
+                    (item_id, account_id, kind, date, amount, status, payload, payload_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', row)
+        gone = set(existing_items) - {item["_id"] for item in fetched}
+        c.executemany(
+            "DELETE FROM nessie_account_items WHERE account_id = ? AND kind = ? AND item_id = ?",
+            [(account_id, kind, i) for i in gone],
+        )
+        counts["deleted"] += len(gone)
+
+    c.execute("UPDATE nessie_customers SET mirrored_at = ? WHERE customer_id = ?", (time.time(), customer_id))
+    conn.commit()
+    conn.close()
+    return counts
+
+def get_nessie_snapshot(customer_id, include):
+    """
+    Customer snapshot from the mirror in the same shape as the live endpoint, or
+    None if the customer hasn't been mirrored. `include` lists the sub-resources.
+    """
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT payload, mirrored_at FROM nessie_customers WHERE customer_id = ?", (customer_id,))
+    customer_row = c.fetchone()
+    if customer_row is None or customer_row["mirrored_at"] is None:
+        conn.close()
+        return None
+
+    c.execute("SELECT account_id, payload FROM nessie_accounts WHERE customer_id = ? ORDER BY position", (customer_id,))
+    account_rows = c.fetchall()
+    kinds = [k for k in include if k in NESSIE_ITEM_KINDS]
+    items = {}
+    if kinds and account_rows:
+        account_ids = [r["account_id"] for r in account_rows]
+        c.execute(f'''
+            SELECT account_id, kind, payload FROM nessie_account_items
+            WHERE account_id IN ({",".join("?" for _ in account_ids)})
+              AND kind IN ({",".join("?" for _ in kinds)})
+            ORDER BY date DESC
+        ''', account_ids + kinds)
+        for r in c.fetchall():
+            items.setdefault((r["account_id"], r["kind"]), []).append(json.loads(r["payload"]))
+    conn.close()
+
+    customer = json.loads(customer_row["payload"])
+    accounts = []
+    for r in account_rows:
+        hydrated = {"account": json.loads(r["payload"])}
+        if "customer" in include:
+            hydrated["customer"] = customer
+        for kind in kinds:
+            hydrated[kind] = items.get((r["account_id"], kind), [])
+        accounts.append(hydrated)
+    return {"customer_id": customer_id, "accounts": accounts, "mirrored_at": customer_row["mirrored_at"]}
+
+def query_nessie_activity(customer_id, kind=None, start_date=None, end_date=None, limit=200):
+    """Mirrored account items for a customer, newest first, filtered by kind and date range."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    query = '''
+        SELECT i.* FROM nessie_account_items i
+        JOIN nessie_accounts a ON a.account_id = i.account_id
+        WHERE a.customer_id = ?
+    '''
+    params = [customer_id]
+    if kind:
+        query += " AND i.kind = ?"
+        params.append(kind)
+    if start_date:
+        query += " AND i.date >= ?"
+        params.append(str(start_date))
+    if end_date:
+        query += " AND i.date <= ?"
+        params.append(str(end_date))
+    query += " ORDER BY i.date DESC, i.item_id, i.account_id LIMIT ?"
+    params.append(max(1, min(int(limit), MAX_QUERY_LIMIT)))
+    c.execute(query, params)
+    rows = c.fetchall()
+    conn.close()
+    return [
+        {"_id": r["item_id"], "account_id": r["account_id"], "kind": r["kind"], "date": r["date"],
+         "amount": r["amount"], "status": r["status"], "raw": json.loads(r["payload"])}
+        for r in rows
+    ]
+
+def get_nessie_mirror_state():
+    """Mirrored customers with their account/item counts and last sync time."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        SELECT cu.customer_id, cu.mirrored_at,
+               (SELECT COUNT(*) FROM nessie_accounts a WHERE a.customer_id = cu.customer_id) AS accounts,
+               (SELECT COUNT(*) FROM nessie_account_items i
+                JOIN nessie_accounts a ON a.account_id = i.account_id
+                WHERE a.customer_id = cu.customer_id) AS items
+        FROM nessie_customers cu
+    ''')
+    rows = [dict(r) for r in c.fetchall()]
+    conn.close()
+    return rows
+
+def get_llm_cache_entry(cache_key, max_age_seconds):
+    """Cached response for `cache_key` if younger than `max_age_seconds`, marking it used; else None."""
+    now = time.time()
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        UPDATE llm_response_cache SET last_used_at = ?, hits = hits + 1
+        WHERE cache_key = ? AND created_at >= ?
+    ''', (now, cache_key, now - max_age_seconds))
+    row = None
+    if c.rowcount:
+        c.execute(
+            "SELECT response, prompt_tokens, completion_tokens FROM llm_response_cache WHERE cache_key = ?",
+            (cache_key,),
+        )
+        row = dict(c.fetchone())
+    conn.commit()
+    conn.close()
+    return row
+
+def put_llm_cache_entry(cache_key, prompt_version, model, response, prompt_tokens, completion_tokens,
+                        max_entries, max_age_seconds):
+    """Store a response, then evict expired entries and the least recently used beyond `max_entries`."""
+    now = time.time()
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR REPLACE INTO llm_response_cache
+            (cache_key, prompt_version, model, response, prompt_tokens, completion_tokens, created_at, last_used_at, hits)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+    ''', (cache_key, prompt_version, model, response, prompt_tokens or 0, completion_tokens or 0, now, now))
+    c.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (now - max_age_seconds,))
+    evicted = c.rowcount
+    c.execute('''
+        DELETE FROM llm_response_cache WHERE cache_key IN (
+            SELECT cache_key FROM llm_response_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+        )
+    ''', (max_entries,))
+    evicted += c.rowcount
+    conn.commit()
+    conn.close()
+    return evicted
+
+def delete_llm_cache_entries(prompt_version=None):
+    """Drop cached responses (all, or one prompt version); returns how many were removed."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    if prompt_version:
+        c.execute("DELETE FROM llm_response_cache WHERE prompt_version = ?", (prompt_version,))
+    else:
+        c.execute("DELETE FROM llm_response_cache")
+    deleted = c.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+def get_llm_cache_summary():
+    """Entries, lifetime hits and tokens saved per prompt version."""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute('''
+        SELECT prompt_version, COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS hits,
+               COALESCE(SUM(hits * (prompt_tokens + completion_tokens)), 0) AS tokens_saved
+        FROM llm_response_cache GROUP BY prompt_version
+    ''')
+    rows = {r["prompt_version"]: {k: r[k] for k in ("entries", "hits", "tokens_saved")} for r in c.fetchall()}
+    conn.close()
+    return rows
+
 # Initialize on module load
 init_db()
@@ -0,0 +1,92 @@
+"""
+LLM Response Cache
+
+Content-addressed cache for deterministic (non-streaming) LLM analyses, stored
+in the llm_response_cache table so it is shared by every server process and
+survives restarts.
+
+- The key is a sha256 over the prompt version, model, messages and request
+  params. Message text is whitespace-normalized first, so re-indented prompt
+  templates don't miss.
+- Each call site passes a prompt version (e.g. "survey-v1"); bump it whenever
+  the template changes so old answers stop matching.
+- Entries expire after `ttl` seconds; beyond `max_entries` the least recently
+  used are evicted.
+- Hits, misses and the tokens a hit avoided spending are counted per process;
+  the table keeps lifetime totals per prompt version.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import database
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "2000"))
+
+
+def _normalize_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    content = message.get("content")
+    if isinstance(content, str):
+        content = " ".join(content.split())
+    return {**message, "content": content}
+
+
+def cache_key(prompt_version: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    normalized = {
+        "prompt_version": prompt_version,
+        "model": model,
+        "messages": [_normalize_message(m) for m in messages],
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "tokens_saved": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            entry = database.get_llm_cache_entry(key, self.ttl)
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            entry = None
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        self._stats["tokens_saved"] += entry["prompt_tokens"] + entry["completion_tokens"]
+        return entry["response"]
+
+    def put(self, key: str, prompt_version: str, model: str, response: str, usage: Any = None) -> None:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        try:
+            self._stats["evictions"] += database.put_llm_cache_entry(
+                key, prompt_version, model, response, prompt_tokens, completion_tokens,
+                self.max_entries, self.ttl,
+            )
+            self._stats["stores"] += 1
+        except Exception as e:
+            logger.warning(f"LLM cache store failed: {e}")
+
+    def clear(self, prompt_version: Optional[str] = None) -> int:
+        return database.delete_llm_cache_entries(prompt_version)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+            "by_prompt_version": database.get_llm_cache_summary(),
+        }
@@ -12,8 +12,18 @@ from datetime import date, timedelta
 
 
 
-from nessie_client import NessieClient
+from nessie_client import NESSIE_API_KEY, NESSIE_CACHE_MAX_STALE, NESSIE_CACHE_TTLS, NessieClient
+from nessie_mirror import NessieMirror
 from chat import ChatService
+from sse import sse_events
+from plaid_service import PlaidService, map_account
+from response_cache import ResponseCache
+from session_store import PlaidConnection, create_session_store
+from plaid_webhooks import PlaidWebhookProcessor, PlaidWebhookVerifier, WebhookVerificationError
+from transaction_sync import TransactionSyncService, fetch_transaction_pages
+from transaction_columns import TransactionColumns
+from regret_queue import RegretJobQueue
+from regret_model import RegretClassifier
 from fastapi import FastAPI, Request, Response
 
 
@@ -29,8 +39,6 @@ from starlette.middleware.base import BaseHTTPMiddleware
 
 import plaid
 
-from plaid.api import plaid_api
-
 from plaid.model.link_token_create_request import LinkTokenCreateRequest
 
 from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
@@ -41,16 +49,12 @@ from plaid.model.accounts_get_request import AccountsGetRequest
 
 from plaid.model.accounts_balance_get_request import AccountsBalanceGetRequest
 
-from plaid.model.transactions_get_request import TransactionsGetRequest
-
-from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+from plaid.model.webhook_verification_key_get_request import WebhookVerificationKeyGetRequest
 
 from plaid.model.products import Products
 
 from plaid.model.country_code import CountryCode
 
-import requests # Added for debugging
-
 
 app = FastAPI()
 
@@ -154,7 +158,9 @@ def generate_demo_transactions():
 
     return transactions
 
-demo_transactions_data = generate_demo_transactions()
+demo_transactions_data = TransactionColumns.from_dicts(generate_demo_transactions())
+
+DEMO_ITEM_ID = "demo-item-id"
 
 # --- END DEMO MODE CONFIGURATION ---
 
@@ -166,29 +172,77 @@ PLAID_SECRET = os.environ.get("PLAID_SECRET", "")
 
 
 
-configuration = plaid.Configuration(
+plaid_service = PlaidService(PLAID_CLIENT_ID, PLAID_SECRET)
 
-    host=plaid.Environment.Sandbox,
+transaction_sync = TransactionSyncService(plaid_service)
 
-    api_key={
+# Accounts/balances per Plaid item, served stale-while-revalidate
+plaid_cache = ResponseCache(
+    ttl=float(os.environ.get("PLAID_CACHE_TTL", "60")),
+    max_stale=float(os.environ.get("PLAID_CACHE_MAX_STALE", "600")),
+    name="plaid",
+)
 
-        "clientId": PLAID_CLIENT_ID,
 
-        "secret": PLAID_SECRET,
 
-    },
+# Plaid connection state is shared across worker processes via the session store
+plaid_connection = PlaidConnection(create_session_store())
 
-)
+# Set to a public URL for this server's /api/plaid/webhook to have Plaid push updates
+PLAID_WEBHOOK_URL = os.environ.get("PLAID_WEBHOOK_URL", "")
+
+
+async def load_accounts(access_token: str):
+    response = await plaid_service.accounts_get(AccountsGetRequest(access_token=access_token))
+    return [map_account(acc) for acc in response.accounts]
+
+
+async def load_balances(access_token: str):
+    response = await plaid_service.accounts_balance_get(AccountsBalanceGetRequest(access_token=access_token))
+    return [map_account(acc) for acc in response.accounts]
+
+
+# Newly synced transactions from this many days back are queued for regret scoring
+REGRET_BACKFILL_DAYS = int(os.environ.get("REGRET_BACKFILL_DAYS", "30"))
+
+
+def enqueue_unscored(transactions, metadata=None):
+    """Queue transactions without a regret score for background analysis (needs a survey profile)."""
+    if metadata is None:
+        metadata = database.get_transaction_metadata([t["transaction_id"] for t in transactions])
+    missing = [t for t in transactions if t["transaction_id"] not in metadata]
+    if missing and database.get_user_profile():
+        regret_queue.enqueue(missing)
+
+
+async def refresh_item(item_id: str):
+    """Background refresh after a webhook: sync transactions (rollups follow), then re-warm account caches."""
+    access_token, connected_item_id = plaid_connection.get()
+    if not access_token or connected_item_id != item_id:
+        print(f"Ignoring webhook refresh for unknown item {item_id}")
+        return
+    await transaction_sync.sync(access_token, item_id)
+    start_date = (datetime.now() - timedelta(days=REGRET_BACKFILL_DAYS)).date()
+    enqueue_unscored(database.get_stored_transactions(item_id, start_date=start_date))
+    plaid_cache.invalidate(f"{item_id}:")
+    await asyncio.gather(
+        plaid_cache.get(f"{item_id}:accounts", lambda: load_accounts(access_token)),
+        plaid_cache.get(f"{item_id}:balance", lambda: load_balances(access_token)),
+    )
 
-api_client = plaid.ApiClient(configuration)
 
-plaid_client = plaid_api.PlaidApi(api_client)
+webhook_processor = PlaidWebhookProcessor(
+    refresh=refresh_item,
+    on_item_event=lambda item_id, code: plaid_cache.invalidate(f"{item_id}:"),
+)
 
 
+async def fetch_webhook_key(key_id: str):
+    response = await plaid_service.webhook_verification_key_get(WebhookVerificationKeyGetRequest(key_id=key_id))
+    return response.key.to_dict()
 
 
-stored_access_token: str | None = None
-stored_item_id: str | None = None
+webhook_verifier = PlaidWebhookVerifier(fetch_key=fetch_webhook_key)
 
 
 class CORSMiddlewareCustom(BaseHTTPMiddleware):
@@ -266,25 +320,17 @@ def health():
 async def create_link_token():
     if DEMO_MODE:
         return {"link_token": "demo-link-token"}
-    
-    print(f"Plaid Configuration: {configuration}")
+
     try:
-        # Test basic requests connectivity
-        try:
-            print("Attempting requests.get to sandbox.plaid.com...")
-            requests_response = requests.get("https://sandbox.plaid.com")
-            print(f"requests.get to sandbox.plaid.com successful. Status: {requests_response.status_code}")
-        except Exception as req_e:
-            print(f"requests.get to sandbox.plaid.com failed: {req_e}")
-            
         request = LinkTokenCreateRequest(
             user=LinkTokenCreateRequestUser(client_user_id="user-1"),
             client_name="Origin Finance",
             products=[Products("transactions"), Products("auth")],
             country_codes=[CountryCode("US")],
             language="en",
+            **({"webhook": PLAID_WEBHOOK_URL} if PLAID_WEBHOOK_URL else {}),
         )
-        response = plaid_client.link_token_create(request)
+        response = await plaid_service.link_token_create(request)
         return {"link_token": response.link_token}
     except plaid.ApiException as e:
         error_body = json.loads(e.body) if e.body else {}
@@ -297,19 +343,17 @@ async def create_link_token():
 
 @app.post("/api/plaid/exchange-token")
 async def exchange_token(request: Request):
-    global stored_access_token, stored_item_id
     if DEMO_MODE:
-        stored_access_token = "demo-access-token"
-        stored_item_id = "demo-item-id"
+        plaid_connection.set("demo-access-token", DEMO_ITEM_ID)
         return {"success": True}
 
     try:
         body = await request.json()
         public_token = body.get("public_token")
         exchange_request = ItemPublicTokenExchangeRequest(public_token=public_token)
-        response = plaid_client.item_public_token_exchange(exchange_request)
-        stored_access_token = response.access_token
-        stored_item_id = response.item_id
+        response = await plaid_service.item_public_token_exchange(exchange_request)
+        plaid_cache.invalidate()
+        plaid_connection.set(response.access_token, response.item_id)
         return {"success": True}
     except plaid.ApiException as e:
         error_body = json.loads(e.body) if e.body else {}
@@ -326,26 +370,10 @@ async def get_accounts():
         return {"accounts": demo_accounts_data}
     
     try:
-        if not stored_access_token:
+        access_token, item_id = plaid_connection.get()
+        if not access_token:
             return JSONResponse({"error": "No bank account connected"}, status_code=400)
-        accounts_request = AccountsGetRequest(access_token=stored_access_token)
-        response = plaid_client.accounts_get(accounts_request)
-        accounts = []
-        for acc in response.accounts:
-            accounts.append({
-                "account_id": acc.account_id,
-                "name": acc.name,
-                "official_name": acc.official_name,
-                "type": str(acc.type),
-                "subtype": str(acc.subtype) if acc.subtype else None,
-                "mask": acc.mask,
-                "balances": {
-                    "available": acc.balances.available,
-                    "current": acc.balances.current,
-                    "limit": acc.balances.limit,
-                    "iso_currency_code": acc.balances.iso_currency_code,
-                },
-            })
+        accounts = await plaid_cache.get(f"{item_id}:accounts", lambda: load_accounts(access_token))
         return {"accounts": accounts}
     except plaid.ApiException as e:
         error_body = json.loads(e.body) if e.body else {}
@@ -357,93 +385,36 @@ async def get_accounts():
 
 
 @app.get("/api/plaid/transactions")
-async def get_transactions():
+async def get_transactions(days: int = 7):
     if DEMO_MODE:
         return {
-            "transactions": demo_transactions_data,
+            "transactions": demo_transactions_data.to_dicts(),
             "total": len(demo_transactions_data),
         }
     
     try:
-        if not stored_access_token:
+        access_token, item_id = plaid_connection.get()
+        if not access_token:
             return JSONResponse({"error": "No bank account connected"}, status_code=400)
 
-        now = datetime.now()
-        seven_days_ago = now - timedelta(days=7)
-        start_date = seven_days_ago.date()
-        end_date = now.date()
+        # First request for an item does a blocking full sync; afterwards reads are
+        # served from the local store and Plaid deltas are pulled in the background.
+        if not transaction_sync.has_synced(item_id):
+            await transaction_sync.sync(access_token, item_id)
+        else:
+            transaction_sync.refresh_in_background(access_token, item_id)
 
-        txn_request = TransactionsGetRequest(
-            access_token=stored_access_token,
-            start_date=start_date,
-            end_date=end_date,
-            options=TransactionsGetRequestOptions(count=100, offset=0),
-        )
-        response = plaid_client.transactions_get(txn_request)
+        start_date = (datetime.now() - timedelta(days=days)).date()
+        temp_transactions = database.get_stored_transactions(item_id, start_date=start_date)
         transactions = []
-        
+
         # Collect IDs to fetch existing scores
-        txn_ids = [txn.transaction_id for txn in response.transactions]
+        txn_ids = [t["transaction_id"] for t in temp_transactions]
         existing_metadata = database.get_transaction_metadata(txn_ids)
-        
-        user_profile = database.get_user_profile()
-        
-        # Background task for analysis (conceptually - simplistic async execution here)
-        # In a real production app, use BackgroundTasks or Celery
-        
-        # Helper to process transaction if metadata missing
-        async def process_missing_metadata(txn_obj, txn_dict):
-            if txn_dict["transaction_id"] not in existing_metadata:
-                # Analyze and save
-                analysis = await chat_service.analyze_transaction_regret(txn_dict, user_profile)
-                database.save_transaction_regret(
-                    txn_dict["transaction_id"], 
-                    analysis.get("score", 0), 
-                    analysis.get("reason", "")
-                )
-                # Update the in-memory dictionary to return it immediately if possible
-                # (Though usually we'd return what we have and let UI update on next fetch,
-                # here we'll try to await it if it's fast enough, or just trigger it)
-
-        # We will process analysis in parallel for this batch to ensure user gets data
-        # Note: This might slow down the response time for the list. 
-        # Optimization: Only analyze top 5 recent ones, or queue the rest.
-        # For this demo, we'll try to do it for the current page content.
-
-        temp_transactions = []
-
-        for txn in response.transactions:
-            t_dict = {
-                "transaction_id": txn.transaction_id,
-                "account_id": txn.account_id,
-                "name": txn.name,
-                "amount": txn.amount,
-                "date": str(txn.date),
-                "category": list(txn.category) if txn.category else [],
-                "pending": txn.pending,
-                "merchant_name": txn.merchant_name,
-                "payment_channel": str(txn.payment_channel),
-                "iso_currency_code": txn.iso_currency_code,
-            }
-            temp_transactions.append(t_dict)
 
-        # Identify missing analysis
-        missing_analysis_txns = [t for t in temp_transactions if t["transaction_id"] not in existing_metadata]
-        
-        if missing_analysis_txns and user_profile:
-            # We limit to analyzing 5 concurrently to avoid timeout constraints for this MVP
-            to_analyze = missing_analysis_txns[:5] 
-            
-            async def analyze_and_save(t):
-                 analysis = await chat_service.analyze_transaction_regret(t, user_profile)
-                 database.save_transaction_regret(t["transaction_id"], analysis["score"], analysis["reason"])
-                 return t["transaction_id"], analysis
-
-            results = await asyncio.gather(*(analyze_and_save(t) for t in to_analyze))
-            
-            # Update metadata dict
-            for tid, result in results:
-                existing_metadata[tid] = {"regret_score": result["score"], "regret_reason": result["reason"]}
+        # Unscored transactions are analyzed in the background and come back with
+        # regretScore None; scores arrive on /api/plaid/transactions/regret-stream.
+        enqueue_unscored(temp_transactions, existing_metadata)
 
         # Build final response
         for t in temp_transactions:
@@ -454,7 +425,7 @@ async def get_transactions():
 
         return {
             "transactions": transactions,
-            "total": response.total_transactions,
+            "total": len(transactions),
         }
     except plaid.ApiException as e:
         error_body = json.loads(e.body) if e.body else {}
@@ -465,32 +436,178 @@ async def get_transactions():
         return JSONResponse({"error": "Failed to get transactions"}, status_code=500)
 
 
+@app.get("/api/plaid/transactions/stream")
+async def stream_transactions(days: int = 30, format: str = "ndjson"):
+    """
+    Stream the full transaction history for the last `days` days as pages arrive
+    from Plaid. Each message is {"page", "transactions", "total"}; the stream ends
+    with {"done": true, "total"}. `format` is "ndjson" or "sse".
+    """
+    if format not in ("ndjson", "sse"):
+        return JSONResponse({"error": "format must be 'ndjson' or 'sse'"}, status_code=400)
+    access_token, _ = plaid_connection.get()
+    if not DEMO_MODE and not access_token:
+        return JSONResponse({"error": "No bank account connected"}, status_code=400)
+
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+
+    async def pages():
+        if DEMO_MODE:
+            rows = demo_transactions_data.filter(start_date=start_date).to_dicts()
+            yield 0, rows, len(rows)
+            return
+        async for page in fetch_transaction_pages(plaid_service, access_token, start_date, end_date):
+            yield page
+
+    def frame(payload):
+        data = json.dumps(payload)
+        return f"data: {data}\n\n" if format == "sse" else f"{data}\n"
+
+    async def event_generator():
+        total = 0
+        try:
+            async for index, transactions, total in pages():
+                metadata = database.get_transaction_metadata([t["transaction_id"] for t in transactions])
+                for t in transactions:
+                    meta = metadata.get(t["transaction_id"], {})
+                    # Demo rows carry the keys with None; keep only scores they actually have
+                    if t.get("regretScore") is None:
+                        t["regretScore"] = meta.get("regret_score")
+                        t["regretReason"] = meta.get("regret_reason")
+                yield frame({"page": index, "transactions": transactions, "total": total})
+            yield frame({"done": True, "total": total})
+        except plaid.ApiException as e:
+            error_body = json.loads(e.body) if e.body else {}
+            print(f"Stream transactions error: {error_body}")
+            yield frame({"error": "Failed to get transactions"})
+        except Exception as e:
+            print(f"Stream transactions error: {e}")
+            yield frame({"error": "Failed to get transactions"})
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_generator(), media_type=media_type)
+
+
+@app.get("/api/plaid/transactions/regret-stream")
+async def stream_regret_scores(request: Request):
+    """
+    Server-sent events with regret scores as they are saved, by this server process
+    or any other: {"transaction_id", "regretScore", "regretReason", "regretSource"}
+    per scored transaction.
+    """
+    subscription = regret_queue.subscribe()
+
+    async def event_generator():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            regret_queue.unsubscribe(subscription)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@app.get("/api/plaid/transactions/regret-queue")
+async def get_regret_queue_stats():
+    """Background regret scoring progress: job counts by status and worker totals."""
+    return regret_queue.stats()
+
+
+@app.get("/api/plaid/transactions/query")
+async def query_transactions(
+    start_date: str | None = None,
+    end_date: str | None = None,
+    category: str | None = None,
+    merchant: str | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    min_regret: int | None = None,
+    sort: str = "date_desc",
+    limit: int = 50,
+    cursor: str | None = None,
+):
+    """
+    Filtered, keyset-paginated view over the local transaction store.
+
+    Pass the returned `next_cursor` back as `cursor` to get the next page;
+    it is null on the last page. `limit` is capped at 200.
+    """
+    item_id = DEMO_ITEM_ID if DEMO_MODE else plaid_connection.get()[1]
+    if not item_id:
+        return JSONResponse({"error": "No bank account connected"}, status_code=400)
+
+    try:
+        transactions, next_cursor = database.query_transactions(
+            item_id,
+            start_date=start_date,
+            end_date=end_date,
+            category=category,
+            merchant=merchant,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            min_regret=min_regret,
+            sort=sort,
+            limit=limit,
+            cursor=cursor,
+        )
+        return {"transactions": transactions, "next_cursor": next_cursor}
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        print(f"Query transactions error: {e}")
+        return JSONResponse({"error": "Failed to query transactions"}, status_code=500)
+
+
+@app.get("/api/plaid/spending-rollups")
+async def spending_rollups(
+    granularity: str = "month",
+    dimension: str = "category",
+    start_date: str | None = None,
+    end_date: str | None = None,
+    key: str | None = None,
+):
+    """
+    Pre-aggregated spend (sum, count, regret-weighted sum) per day/week/month
+    bucket by category or merchant, plus per-key totals over the range.
+    """
+    item_id = DEMO_ITEM_ID if DEMO_MODE else plaid_connection.get()[1]
+    if not item_id:
+        return JSONResponse({"error": "No bank account connected"}, status_code=400)
+
+    try:
+        result = database.get_spending_rollups(
+            item_id,
+            granularity=granularity,
+            dimension=dimension,
+            start_date=start_date,
+            end_date=end_date,
+            key=key,
+        )
+        return {"granularity": granularity, "dimension": dimension, **result}
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        print(f"Spending rollups error: {e}")
+        return JSONResponse({"error": "Failed to get spending rollups"}, status_code=500)
+
+
 @app.get("/api/plaid/balance")
 async def get_balance():
     if DEMO_MODE:
         return {"accounts": demo_accounts_data} # Same as get_accounts for simplicity
     
     try:
-        if not stored_access_token:
+        access_token, item_id = plaid_connection.get()
+        if not access_token:
             return JSONResponse({"error": "No bank account connected"}, status_code=400)
-        balance_request = AccountsBalanceGetRequest(access_token=stored_access_token)
-        response = plaid_client.accounts_balance_get(balance_request)
-        accounts = []
-        for acc in response.accounts:
-            accounts.append({
-                "account_id": acc.account_id,
-                "name": acc.name,
-                "official_name": acc.official_name,
-                "type": str(acc.type),
-                "subtype": str(acc.subtype) if acc.subtype else None,
-                "mask": acc.mask,
-                "balances": {
-                    "available": acc.balances.available,
-                    "current": acc.balances.current,
-                    "limit": acc.balances.limit,
-                    "iso_currency_code": acc.balances.iso_currency_code,
-                },
-            })
+        accounts = await plaid_cache.get(f"{item_id}:balance", lambda: load_balances(access_token))
         return {"accounts": accounts}
     except plaid.ApiException as e:
         error_body = json.loads(e.body) if e.body else {}
@@ -501,23 +618,56 @@ async def get_balance():
         return JSONResponse({"error": "Failed to get balance"}, status_code=500)
 
 
+@app.post("/api/plaid/webhook")
+async def plaid_webhook(request: Request):
+    """
+    Receive Plaid webhooks. Transaction updates schedule a debounced background
+    sync; ITEM events drop cached account data. Always acknowledges quickly.
+    Deliveries without a valid, fresh Plaid-Verification signature get a 401.
+    """
+    body = await request.body()
+    try:
+        await webhook_verifier.verify(body, request.headers.get("plaid-verification"))
+    except WebhookVerificationError as e:
+        print(f"Rejected Plaid webhook: {e}")
+        return JSONResponse({"error": "Invalid webhook signature"}, status_code=401)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return JSONResponse({"error": "Invalid JSON"}, status_code=400)
+    result = webhook_processor.handle(payload)
+    return {"received": True, "action": result}
+
+
+@app.get("/api/plaid/webhook/stats")
+async def plaid_webhook_stats():
+    return {**webhook_processor.stats(), "verification": webhook_verifier.stats()}
+
+
+@app.get("/api/plaid/cache-stats")
+async def plaid_cache_stats():
+    return plaid_cache.stats()
+
+
 @app.get("/api/plaid/status")
 async def plaid_status():
     if DEMO_MODE:
         return {"connected": True} # Always connected in demo mode
-    return {"connected": stored_access_token is not None}
+    access_token, _ = plaid_connection.get()
+    return {"connected": access_token is not None}
 
 
 @app.post("/api/plaid/disconnect")
 async def plaid_disconnect():
-    global stored_access_token, stored_item_id
     if DEMO_MODE:
-        stored_access_token = None
-        stored_item_id = None
+        plaid_connection.clear()
         return {"success": True}
 
-    stored_access_token = None
-    stored_item_id = None
+    _, item_id = plaid_connection.get()
+    if item_id:
+        transaction_sync.forget(item_id)
+        plaid_cache.invalidate(f"{item_id}:")
+    plaid_connection.clear()
     return {"success": True}
 
 
@@ -534,69 +684,191 @@ if assets_path.exists():
 
 # --- CAPITIAL ONE NESSIE INTEGRATION ---
 
-nessie_client = NessieClient()
+nessie_cache = ResponseCache(ttl=60, max_stale=NESSIE_CACHE_MAX_STALE, name="nessie")
+nessie_client = NessieClient(cache=nessie_cache)
+nessie_mirror = NessieMirror(nessie_client)
 
 @app.get("/api/capitalone/customers")
-async def get_customers():
+async def get_customers(refresh: bool = False):
     try:
-        customers = await nessie_client.get_customers()
+        customers = await nessie_client.get_customers(refresh=refresh)
         return {"customers": customers}
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=502)
 
+# Per-account Nessie sub-resources a snapshot can include, and the NessieClient method for each
+SNAPSHOT_RESOURCES = {
+    "account": "get_account",
+    "customer": "get_account_customer",
+    "bills": "get_account_bills",
+    "deposits": "get_account_deposits",
+    "loans": "get_account_loans",
+    "purchases": "get_account_purchases",
+    "transfers": "get_account_transfers",
+    "withdrawals": "get_account_withdrawals",
+}
+
+async def hydrate_account(a, include, refresh=False):
+    """Fetch the included sub-resources for one account from Nessie in parallel."""
+    aid = a.get("_id") or a.get("id") or a.get("account_id")
+    if not aid:
+        return {"raw": a, "error": "missing_account_id"}
+
+    results = await asyncio.gather(
+        *(getattr(nessie_client, SNAPSHOT_RESOURCES[name])(aid, refresh=refresh) for name in include),
+        return_exceptions=True # Continue even if some sub-requests fail
+    )
+
+    # Without the detailed account, fall back to the list entry (it already carries the balance)
+    hydrated = {"account": a}
+    for name, res in zip(include, results):
+        hydrated[name] = res if not isinstance(res, Exception) else {"error": str(res)}
+    return hydrated
+
+
 @app.get("/api/capitalone/customer/{customer_id}/snapshot")
-async def customer_snapshot(customer_id: str):
+async def customer_snapshot(customer_id: str, refresh: bool = False, include: str | None = None,
+                            format: str = "json", source: str = "auto"):
+    """
+    Customer accounts hydrated with Nessie sub-resources.
+
+    `source=auto` (default) reads the local Nessie mirror when the customer's mirror
+    is fresh (see NessieMirror.is_fresh) and falls back to the API (through the Nessie
+    cache) otherwise; `source=live` always uses the API and `source=mirror` never does
+    (404 if not mirrored). `refresh=true` implies live and bypasses the cache. Mirrored
+    snapshots carry `mirrored_at` (unix time), in the header frame when streamed.
+
+    `include` is a comma-separated subset of SNAPSHOT_RESOURCES (default: all); other
+    sub-resources are never fetched. `format=ndjson` or `format=sse` streams
+    {"index", "account": HydratedAccount} as each account finishes, preceded by
+    {"customer_id", "account_count"} and followed by {"done": true, "total"}.
+    """
+    if include is None:
+        selected = list(SNAPSHOT_RESOURCES)
+    else:
+        selected = [name.strip() for name in include.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in SNAPSHOT_RESOURCES]
+        if unknown:
+            return JSONResponse(
+                {"error": f"Unknown include {unknown}; choose from {list(SNAPSHOT_RESOURCES)}"}, status_code=400
+            )
+    if format not in ("json", "ndjson", "sse"):
+        return JSONResponse({"error": "format must be 'json', 'ndjson' or 'sse'"}, status_code=400)
+    if source not in ("auto", "live", "mirror"):
+        return JSONResponse({"error": "source must be 'auto', 'live' or 'mirror'"}, status_code=400)
+
+    def frame(payload):
+        data = json.dumps(payload)
+        return f"data: {data}\n\n" if format == "sse" else f"{data}\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+
+    if source == "mirror" or (source == "auto" and not refresh):
+        mirrored = await asyncio.to_thread(database.get_nessie_snapshot, customer_id, selected)
+        if (mirrored is not None and source == "auto"
+                and not await asyncio.to_thread(nessie_mirror.is_fresh, mirrored["mirrored_at"], selected)):
+            mirrored = None  # Too old, or no mirror loop keeps it current: read live instead
+        if mirrored is not None:
+            if format == "json":
+                return {**mirrored, "source": "mirror"}
+
+            def mirrored_events():
+                yield frame({"customer_id": customer_id, "account_count": len(mirrored["accounts"]),
+                             "mirrored_at": mirrored["mirrored_at"]})
+                for index, hydrated in enumerate(mirrored["accounts"]):
+                    yield frame({"index": index, "account": hydrated})
+                yield frame({"done": True, "total": len(mirrored["accounts"])})
+
+            return StreamingResponse(mirrored_events(), media_type=media_type)
+        if source == "mirror":
+            return JSONResponse({"error": f"Customer {customer_id} has not been mirrored"}, status_code=404)
+
     try:
         # 1. Get all accounts for the customer
-        accounts = await nessie_client.get_customer_accounts(customer_id)
+        accounts = await nessie_client.get_customer_accounts(customer_id, refresh=refresh)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({"error": f"Nessie error: {str(e)}"}, status_code=502)
 
+    if format == "json":
         # 2. Hydrate each account with details in parallel
-        async def hydrate_account(a):
-            aid = a.get("_id") or a.get("id") or a.get("account_id")
-            if not aid:
-                return {"raw": a, "error": "missing_account_id"}
-
-            # Gather all related data for this account
-            account, customer, bills, deposits, loans, purchases, transfers, withdrawals = await asyncio.gather(
-                nessie_client.get_account(aid),
-                nessie_client.get_account_customer(aid),
-                nessie_client.get_account_bills(aid),
-                nessie_client.get_account_deposits(aid),
-                nessie_client.get_account_loans(aid),
-                nessie_client.get_account_purchases(aid),
-                nessie_client.get_account_transfers(aid),
-                nessie_client.get_account_withdrawals(aid),
-                return_exceptions=True # Continue even if some sub-requests fail
-            )
+        hydrated_accounts = await asyncio.gather(*(hydrate_account(a, selected, refresh) for a in accounts))
+        return {"customer_id": customer_id, "accounts": hydrated_accounts, "source": "live"}
 
-            # Helper to handle exceptions in gather results
-            def clean_result(res):
-                return res if not isinstance(res, Exception) else {"error": str(res)}
-
-            return {
-                "account": clean_result(account),
-                "customer": clean_result(customer),
-                "bills": clean_result(bills),
-                "deposits": clean_result(deposits),
-                "loans": clean_result(loans),
-                "purchases": clean_result(purchases),
-                "transfers": clean_result(transfers),
-                "withdrawals": clean_result(withdrawals),
-            }
-
-        hydrated_accounts = await asyncio.gather(*(hydrate_account(a) for a in accounts))
+    async def event_generator():
+        yield frame({"customer_id": customer_id, "account_count": len(accounts)})
 
-        return {"customer_id": customer_id, "accounts": hydrated_accounts}
+        async def indexed(index, a):
+            return index, await hydrate_account(a, selected, refresh)
 
+        tasks = [asyncio.create_task(indexed(i, a)) for i, a in enumerate(accounts)]
+        try:
+            # 2. Emit each account as soon as its hydration completes
+            for next_done in asyncio.as_completed(tasks):
+                index, hydrated = await next_done
+                yield frame({"index": index, "account": hydrated})
+            yield frame({"done": True, "total": len(accounts)})
+        finally:
+            # Client went away: stop hydrating the remaining accounts
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(event_generator(), media_type=media_type)
+
+
+@app.get("/api/capitalone/customer/{customer_id}/activity")
+async def customer_activity(customer_id: str, kind: str | None = None, start_date: str | None = None,
+                            end_date: str | None = None, limit: int = 100):
+    """Mirrored purchases/deposits/withdrawals/... across a customer's accounts, newest first."""
+    if kind is not None and kind not in database.NESSIE_ITEM_KINDS:
+        return JSONResponse({"error": f"kind must be one of {list(database.NESSIE_ITEM_KINDS)}"}, status_code=400)
+    items = await asyncio.to_thread(database.query_nessie_activity, customer_id, kind, start_date, end_date, limit)
+    return {"customer_id": customer_id, "items": items, "count": len(items)}
+
+
+@app.post("/api/capitalone/mirror/sync")
+async def sync_nessie_mirror(customer_id: str | None = None):
+    """Sync one customer (or every customer) into the local mirror now."""
+    try:
+        if customer_id:
+            return await nessie_mirror.sync_customer(customer_id)
+        return {"results": await nessie_mirror.sync_all()}
     except Exception as e:
-        import traceback
-        traceback.print_exc()
         return JSONResponse({"error": f"Nessie error: {str(e)}"}, status_code=502)
 
+
+@app.get("/api/capitalone/mirror/stats")
+async def nessie_mirror_stats():
+    return nessie_mirror.stats()
+
+
+@app.get("/api/capitalone/cache-stats")
+async def nessie_cache_stats():
+    return {**nessie_cache.stats(), "ttl_seconds": NESSIE_CACHE_TTLS}
+
+
+@app.get("/api/capitalone/upstream-stats")
+async def nessie_upstream_stats():
+    """Nessie request counters plus the current adaptive concurrency limit per host."""
+    return nessie_client.stats()
+
 # --- END CAPITAL ONE NESSIE INTEGRATION ---
 
 # --- CHAT INTEGRATION ---
 chat_service = ChatService()
+regret_queue = RegretJobQueue(chat_service, local_model=RegretClassifier())
+
+def advisor_cache_scope(request: Request, body: dict):
+    """
+    Who the chat cache may share answers between: an explicit user id (X-User-Id
+    header or `userId`), else the connected Plaid item. None disables the cache.
+    """
+    user_id = request.headers.get("x-user-id") or body.get("userId")
+    if user_id:
+        return f"user:{user_id}"
+    item_id = DEMO_ITEM_ID if DEMO_MODE else plaid_connection.get()[1]
+    return f"item:{item_id}" if item_id else None
 
 @app.post("/api/advisor/chat")
 async def advisor_chat(request: Request):
@@ -605,19 +877,11 @@ async def advisor_chat(request: Request):
         messages = body.get("messages", [])
         financial_context = body.get("financialContext", "")
         survey_context = body.get("surveyContext", "")
+        cache_scope = advisor_cache_scope(request, body)
         
-        async def event_generator():
-            try:
-                # Pass survey_context to the stream method
-                async for chunk in chat_service.get_response_stream(messages, financial_context, survey_context):
-                    yield f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n"
-                yield "data: [DONE]\n\n"
-            except Exception as e:
-                print(f"Stream error: {e}")
-                error_msg = json.dumps({"error": str(e)})
-                yield f"data: {error_msg}\n\n"
-
-        return StreamingResponse(event_generator(), media_type="text/event-stream")
+        # Pass survey_context to the stream method; framing, coalescing and disconnects are handled in sse.py
+        reply = chat_service.get_response_stream(messages, financial_context, survey_context, cache_scope=cache_scope)
+        return StreamingResponse(sse_events(request, reply), media_type="text/event-stream")
     except Exception as e:
         print(f"Chat endpoint error: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
@@ -652,7 +916,11 @@ async def survey_analysis(request: Request):
 async def advisor_insights(request: Request):
     try:
         body = await request.json()
-        transactions = body.get("transactions", [])
+        transactions = body.get("transactions", []) if isinstance(body, dict) else None
+        if not isinstance(transactions, list):
+            return JSONResponse({"error": "transactions must be a list"}, status_code=400)
+        # Client-posted rows may lack ids or carry malformed dates; from_dicts coerces them
+        transactions = TransactionColumns.from_dicts(transactions)
         
         # Get profile from DB (or could pass from frontend, but DB is safer/persistent)
         user_profile = database.get_user_profile()
@@ -664,9 +932,85 @@ async def advisor_insights(request: Request):
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+@app.get("/api/advisor/llm-cache-stats")
+async def llm_cache_stats():
+    """Hit rate and tokens saved by the survey-analysis / behavioral-summary response cache."""
+    return chat_service.llm_cache.stats()
+
+
+@app.get("/api/advisor/model-stats")
+async def model_stats():
+    """Per-model TTFT, output rate, error rate and circuit breaker state behind advisor routing, plus hedging counters."""
+    return {
+        **chat_service.router.stats(),
+        "hedging": {"deadline_seconds": chat_service.hedge_deadline, **chat_service.hedge_stats},
+    }
+
+
+@app.get("/api/advisor/chat-cache-stats")
+async def chat_cache_stats():
+    """Near-duplicate question cache counters for /api/advisor/chat."""
+    return chat_service.chat_cache.stats()
+
+
+@app.delete("/api/advisor/llm-cache")
+async def clear_llm_cache(prompt_version: str | None = None):
+    return {"deleted": chat_service.llm_cache.clear(prompt_version)}
+
+
 # --- PURCHASE PREDICTOR INTEGRATION ---
 from predictor_service import predictor_service
 
+@app.on_event("shutdown")
+async def close_plaid_service():
+    plaid_service.close()
+
+
+@app.on_event("startup")
+async def start_nessie_client():
+    nessie_client.start()
+
+
+@app.on_event("startup")
+async def start_nessie_mirror():
+    # Background syncs need real Nessie credentials; the endpoints still work on demand
+    if NESSIE_API_KEY:
+        nessie_mirror.start()
+
+
+@app.on_event("shutdown")
+async def stop_nessie_mirror():
+    await nessie_mirror.stop()
+
+
+@app.on_event("shutdown")
+async def close_nessie_client():
+    await nessie_client.close()
+
+
+@app.on_event("startup")
+async def start_regret_queue():
+    regret_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_regret_queue():
+    await regret_queue.stop()
+
+
+@app.on_event("startup")
+async def seed_demo_transactions():
+    """In demo mode, load the generated demo transactions into the local store so store-backed endpoints work."""
+    if not DEMO_MODE:
+        return
+    demo_rows = demo_transactions_data.to_dicts()
+    database.clear_item_transactions(DEMO_ITEM_ID)
+    database.apply_transaction_sync(DEMO_ITEM_ID, demo_rows, [], [], "demo")
+    for t in demo_rows:
+        if t.get("regretScore") is not None:
+            database.save_transaction_regret(t["transaction_id"], t["regretScore"], t.get("regretReason", ""))
+
+
 @app.on_event("startup")
 async def load_predictor():
     """Pre-load the purchase prediction model at server startup."""
@@ -782,4 +1126,9 @@ async def batch_predict(request: Request):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", "5000"))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Workers re-import the app; connection state is shared via the session store
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
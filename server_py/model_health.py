@@ -0,0 +1,169 @@
+"""
+Model Health
+
+Rolling per-model performance for the advisor chat router, fed by every
+streamed completion (ChatService._stream_completion):
+
+- Time to first token, output rate (content chunks per second, ~tokens/sec)
+  and errors over the last ROUTER_STATS_WINDOW requests per model.
+- A circuit breaker per model. It opens after ROUTER_BREAKER_FAILURES
+  consecutive failures, or an error rate over 50% across at least 5 recent
+  requests. After ROUTER_BREAKER_COOLDOWN seconds one trial request goes
+  through (half-open); success closes the breaker, failure re-opens it.
+- A stream cancelled before its first token (e.g. it lost a hedging race) is
+  a censored sample: its TTFT is at least the time it ran. It counts towards
+  the TTFT estimate, but not towards errors or the breaker.
+
+pick() chooses among interchangeable models: the fastest healthy one by
+expected reply time (TTFT + a typical reply at the measured rate). The
+earlier-listed (preferred) model is kept unless another is clearly faster.
+A small share of requests explores models without recent measurements.
+"""
+
+import os
+import random
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+ROUTER_STATS_WINDOW = int(os.environ.get("ROUTER_STATS_WINDOW", "50"))
+ROUTER_BREAKER_FAILURES = int(os.environ.get("ROUTER_BREAKER_FAILURES", "3"))
+ROUTER_BREAKER_COOLDOWN = float(os.environ.get("ROUTER_BREAKER_COOLDOWN", "30"))
+# Another model replaces the preferred one only if its expected reply time is below this fraction
+ROUTER_SWITCH_MARGIN = float(os.environ.get("ROUTER_SWITCH_MARGIN", "0.8"))
+ROUTER_EXPLORE_RATE = float(os.environ.get("ROUTER_EXPLORE_RATE", "0.05"))
+# Reply length used to weigh output rate against time to first token
+TYPICAL_REPLY_TOKENS = 200
+MIN_SAMPLES = 3
+
+
+@dataclass
+class _Sample:
+    at: float
+    ok: bool
+    ttft: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    censored: bool = False  # ttft is a lower bound and the request had no verdict
+
+
+@dataclass
+class _ModelState:
+    samples: Deque[_Sample] = field(default_factory=lambda: deque(maxlen=ROUTER_STATS_WINDOW))
+    consecutive_failures: int = 0
+    breaker: str = "closed"  # closed | open | half_open
+    opened_at: float = 0.0
+    trial_inflight: bool = False
+    requests: int = 0
+    errors: int = 0
+
+
+class ModelHealth:
+    def __init__(
+        self,
+        breaker_failures: int = ROUTER_BREAKER_FAILURES,
+        breaker_cooldown: float = ROUTER_BREAKER_COOLDOWN,
+        switch_margin: float = ROUTER_SWITCH_MARGIN,
+        explore_rate: float = ROUTER_EXPLORE_RATE,
+    ):
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.switch_margin = switch_margin
+        self.explore_rate = explore_rate
+        self._models: Dict[str, _ModelState] = {}
+
+    def _state(self, model: str) -> _ModelState:
+        if model not in self._models:
+            self._models[model] = _ModelState()
+        return self._models[model]
+
+    def record(self, model: str, ok: bool, ttft: Optional[float] = None, tokens: int = 0,
+               stream_seconds: Optional[float] = None) -> None:
+        """Feed back one request. `stream_seconds` is the time from first to last token."""
+        state = self._state(model)
+        tps = tokens / stream_seconds if tokens > 1 and stream_seconds else None
+        state.samples.append(_Sample(time.monotonic(), ok, ttft, tps))
+        state.requests += 1
+        state.trial_inflight = False
+        if ok:
+            state.consecutive_failures = 0
+            state.breaker = "closed"
+            return
+        state.errors += 1
+        state.consecutive_failures += 1
+        recent = [s for s in state.samples if not s.censored][-10:]
+        error_rate = sum(not s.ok for s in recent) / len(recent)
+        if (state.breaker == "half_open" or state.consecutive_failures >= self.breaker_failures
+                or (len(recent) >= 5 and error_rate > 0.5)):
+            state.breaker = "open"
+            state.opened_at = time.monotonic()
+
+    def record_censored(self, model: str, ttft_at_least: float) -> None:
+        """A stream given up on before its first token: a TTFT lower bound, with no verdict on health."""
+        state = self._state(model)
+        state.samples.append(_Sample(time.monotonic(), True, ttft_at_least, censored=True))
+        state.trial_inflight = False
+
+    def release(self, model: str) -> None:
+        """A request ended without a verdict (e.g. the client left); free a half-open trial slot."""
+        self._state(model).trial_inflight = False
+
+    def available(self, model: str) -> bool:
+        state = self._state(model)
+        if state.breaker == "open" and time.monotonic() - state.opened_at >= self.breaker_cooldown:
+            state.breaker = "half_open"
+        if state.breaker == "half_open":
+            return not state.trial_inflight
+        return state.breaker == "closed"
+
+    def expected_seconds(self, model: str) -> Optional[float]:
+        """Median TTFT plus a typical reply at the median output rate, or None without enough data."""
+        samples = [s for s in self._state(model).samples if s.ok and s.ttft is not None]
+        if len(samples) < MIN_SAMPLES:
+            return None
+        ttft = statistics.median(s.ttft for s in samples)
+        rates = [s.tokens_per_second for s in samples if s.tokens_per_second]
+        return ttft + (TYPICAL_REPLY_TOKENS / statistics.median(rates) if rates else 0.0)
+
+    def pick(self, models: List[str]) -> str:
+        """Fastest healthy model from `models` (listed in order of preference)."""
+        healthy = [m for m in models if self.available(m)]
+        if not healthy:
+            # Everything is failing: try whichever breaker opened longest ago
+            chosen = min(models, key=lambda m: self._state(m).opened_at)
+        else:
+            unmeasured = [m for m in healthy if self.expected_seconds(m) is None]
+            measured = [m for m in healthy if m not in unmeasured]
+            if unmeasured and (not measured or random.random() < self.explore_rate or unmeasured[0] == healthy[0]):
+                chosen = unmeasured[0]
+            else:
+                chosen = healthy[0]
+                best = min(measured, key=self.expected_seconds)
+                if self.expected_seconds(best) < self.expected_seconds(chosen) * self.switch_margin:
+                    chosen = best
+        state = self._state(chosen)
+        if state.breaker == "half_open":
+            state.trial_inflight = True
+        return chosen
+
+    def stats(self) -> Dict[str, Any]:
+        result = {}
+        for model, state in self._models.items():
+            ok = [s for s in state.samples if s.ok]
+            judged = [s for s in state.samples if not s.censored]
+            ttfts = sorted(s.ttft for s in ok if s.ttft is not None)
+            rates = [s.tokens_per_second for s in ok if s.tokens_per_second]
+            expected = self.expected_seconds(model)
+            result[model] = {
+                "breaker": state.breaker,
+                "requests": state.requests,
+                "errors": state.errors,
+                "window": len(state.samples),
+                "error_rate": round(sum(not s.ok for s in judged) / len(judged), 3) if judged else None,
+                "ttft_p50_ms": round(statistics.median(ttfts) * 1000) if ttfts else None,
+                "ttft_p95_ms": round(ttfts[int(0.95 * (len(ttfts) - 1))] * 1000) if ttfts else None,
+                "tokens_per_second": round(statistics.median(rates), 1) if rates else None,
+                "expected_reply_ms": round(expected * 1000) if expected is not None else None,
+            }
+        return result
@@ -1,15 +1,149 @@
 import os
 import httpx
 import asyncio
+import logging
+import json
+import random
+import time
 from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from adaptive_limiter import UpstreamGovernor
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
 
 NESSIE_BASE_URL = os.getenv("NESSIE_BASE_URL", "https://api.reimaginebanking.com")
 NESSIE_API_KEY = os.getenv("NESSIE_API_KEY", "")
 
+# Connection pool shared by all Nessie requests; a snapshot fans out 8 requests per account
+NESSIE_MAX_CONNECTIONS = int(os.getenv("NESSIE_MAX_CONNECTIONS", "100"))
+NESSIE_MAX_KEEPALIVE = int(os.getenv("NESSIE_MAX_KEEPALIVE", "100"))
+NESSIE_KEEPALIVE_EXPIRY = float(os.getenv("NESSIE_KEEPALIVE_EXPIRY", "30"))
+NESSIE_TIMEOUT = float(os.getenv("NESSIE_TIMEOUT", "20"))
+NESSIE_HTTP2 = os.getenv("NESSIE_HTTP2", "1") == "1"
+
+# Cache lifetime (seconds) per Nessie resource: identity data rarely changes,
+# money movements do. Override individual entries with NESSIE_CACHE_TTLS='{"purchases": 10}'.
+NESSIE_CACHE_TTLS = {
+    "customers": 3600,
+    "customer": 3600,
+    "accounts": 300,
+    "account": 60,
+    "bills": 300,
+    "loans": 600,
+    "deposits": 60,
+    "purchases": 30,
+    "transfers": 60,
+    "withdrawals": 60,
+    **json.loads(os.getenv("NESSIE_CACHE_TTLS", "{}")),
+}
+# How long past its TTL a cached resource may be served while it refreshes in the background
+NESSIE_CACHE_MAX_STALE = float(os.getenv("NESSIE_CACHE_MAX_STALE", "60"))
+
+# Concurrency governor: total in-flight Nessie requests, and the adaptive per-host
+# limit's starting point and ceiling (it shrinks on 429/5xx/slow responses)
+NESSIE_GLOBAL_CONCURRENCY = int(os.getenv("NESSIE_GLOBAL_CONCURRENCY", "64"))
+NESSIE_HOST_CONCURRENCY = int(os.getenv("NESSIE_HOST_CONCURRENCY", "16"))
+NESSIE_HOST_MAX_CONCURRENCY = int(os.getenv("NESSIE_HOST_MAX_CONCURRENCY", "64"))
+
+# Retries for throttled/failed requests: attempts, jittered backoff, and a total
+# deadline per request including waiting for a slot
+NESSIE_MAX_ATTEMPTS = int(os.getenv("NESSIE_MAX_ATTEMPTS", "4"))
+NESSIE_RETRY_BASE_DELAY = float(os.getenv("NESSIE_RETRY_BASE_DELAY", "0.1"))
+NESSIE_RETRY_MAX_DELAY = float(os.getenv("NESSIE_RETRY_MAX_DELAY", "2"))
+NESSIE_REQUEST_DEADLINE = float(os.getenv("NESSIE_REQUEST_DEADLINE", "30"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx's optional HTTP/2 dependency)
+        return True
+    except ImportError:
+        return False
+
+
 class NessieClient:
-    def __init__(self, base_url: str = NESSIE_BASE_URL, api_key: str = NESSIE_API_KEY):
+    """
+    Async Nessie API wrapper. Owns one long-lived httpx.AsyncClient so requests
+    reuse pooled keep-alive connections (and HTTP/2 multiplexing when the `h2`
+    package is installed) instead of paying TCP/TLS setup per call.
+    Call start()/close() from app startup/shutdown; the client is also created
+    lazily on first use.
+
+    With a `cache`, each resource is cached for its NESSIE_CACHE_TTLS lifetime and
+    concurrent identical requests share one upstream call; `refresh=True` on any
+    getter bypasses the cached value.
+
+    Every request goes through the `governor` (global + adaptive per-host
+    concurrency limits) and 429/5xx/transport errors are retried with jittered
+    exponential backoff within NESSIE_REQUEST_DEADLINE. Unless one is passed in,
+    start() creates the governor for the running event loop (its semaphore and
+    waiters can't be shared across loops) and replaces it if the loop changes.
+    """
+
+    def __init__(
+        self,
+        base_url: str = NESSIE_BASE_URL,
+        api_key: str = NESSIE_API_KEY,
+        max_connections: int = NESSIE_MAX_CONNECTIONS,
+        max_keepalive_connections: int = NESSIE_MAX_KEEPALIVE,
+        timeout: float = NESSIE_TIMEOUT,
+        http2: bool = NESSIE_HTTP2,
+        cache: Optional[ResponseCache] = None,
+        governor: Optional[UpstreamGovernor] = None,
+        max_attempts: int = NESSIE_MAX_ATTEMPTS,
+        deadline: float = NESSIE_REQUEST_DEADLINE,
+    ):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=NESSIE_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = timeout
+        self.http2 = http2 and _http2_available()
+        if http2 and not self.http2:
+            logger.warning("h2 not installed — Nessie client using HTTP/1.1 keep-alive only")
+        self._client: Optional[httpx.AsyncClient] = None
+        self.cache = cache
+        self.governor = governor
+        self._owns_governor = governor is None
+        self._governor_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.host = urlparse(self.base_url).netloc
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self._stats = {"requests": 0, "retries": 0, "gave_up": 0}
+
+    def start(self) -> httpx.AsyncClient:
+        if self._owns_governor:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if self.governor is None or loop is not self._governor_loop:
+                self.governor = UpstreamGovernor(
+                    global_limit=NESSIE_GLOBAL_CONCURRENCY,
+                    initial_limit=NESSIE_HOST_CONCURRENCY,
+                    max_limit=NESSIE_HOST_MAX_CONCURRENCY,
+                )
+                self._governor_loop = loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
         if params is None:
@@ -20,38 +154,87 @@ class NessieClient:
         if self.api_key:
             params_with_key["key"] = self.api_key
 
-        url = f"{self.base_url}{path}"
-        async with httpx.AsyncClient(timeout=20) as client:
-            r = await client.get(url, params=params_with_key)
-            r.raise_for_status()
-            return r.json()
+        self._stats["requests"] += 1
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                r = await self._send(path, params_with_key, deadline)
+                r.raise_for_status()
+                return r.json()
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                response = e.response if isinstance(e, httpx.HTTPStatusError) else None
+                if response is not None and response.status_code not in RETRYABLE_STATUS:
+                    raise
+                delay = self._retry_delay(attempt, response)
+                if attempt == self.max_attempts or time.monotonic() + delay >= deadline:
+                    self._stats["gave_up"] += 1
+                    raise
+                self._stats["retries"] += 1
+                logger.info(f"Nessie {path} failed ({e!r}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _send(self, path: str, params: Dict[str, Any], deadline: float) -> httpx.Response:
+        """One attempt, holding a governor slot and feeding its latency/outcome back."""
+        client = self.start()
+        async with self.governor.slot(self.host):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise httpx.TimeoutException(f"Nessie request deadline exceeded for {path}")
+            start = time.monotonic()
+            try:
+                r = await client.get(path, params=params, timeout=min(self.timeout, remaining))
+            except httpx.TransportError:
+                self.governor.record(self.host, time.monotonic() - start, overloaded=True)
+                raise
+            self.governor.record(self.host, time.monotonic() - start, overloaded=r.status_code in RETRYABLE_STATUS)
+            return r
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # "Full jitter" exponential backoff so retries from a burst spread out
+        return random.uniform(0, min(NESSIE_RETRY_MAX_DELAY, NESSIE_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, **(self.governor.stats() if self.governor is not None else {})}
+
+    async def _get_resource(self, resource: str, path: str, refresh: bool = False) -> Any:
+        if self.cache is None:
+            return await self._get(path)
+        return await self.cache.get(
+            path, lambda: self._get(path), ttl=NESSIE_CACHE_TTLS[resource], refresh=refresh
+        )
+
+    async def get_customers(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._get_resource("customers", "/customers", refresh)
 
-    async def get_customers(self) -> List[Dict[str, Any]]:
-        return await self._get("/customers")
+    async def get_customer(self, customer_id: str, refresh: bool = False) -> Dict[str, Any]:
+        return await self._get_resource("customer", f"/customers/{customer_id}", refresh)
 
-    async def get_customer_accounts(self, customer_id: str) -> List[Dict[str, Any]]:
-        return await self._get(f"/customers/{customer_id}/accounts")
+    async def get_customer_accounts(self, customer_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._get_resource("accounts", f"/customers/{customer_id}/accounts", refresh)
 
-    async def get_account(self, account_id: str) -> Dict[str, Any]:
-        return await self._get(f"/accounts/{account_id}")
+    async def get_account(self, account_id: str, refresh: bool = False) -> Dict[str, Any]:
+        return await self._get_resource("account", f"/accounts/{account_id}", refresh)
 
-    async def get_account_customer(self, account_id: str) -> Dict[str, Any]:
-        return await self._get(f"/accounts/{account_id}/customer")
+    async def get_account_customer(self, account_id: str, refresh: bool = False) -> Dict[str, Any]:
+        return await self._get_resource("customer", f"/accounts/{account_id}/customer", refresh)
 
-    async def get_account_bills(self, account_id: str) -> List[Dict[str, Any]]:
-        return await self._get(f"/accounts/{account_id}/bills")
+    async def get_account_bills(self, account_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._get_resource("bills", f"/accounts/{account_id}/bills", refresh)
 
-    async def get_account_deposits(self, account_id: str) -> List[Dict[str, Any]]:
-        return await self._get(f"/accounts/{account_id}/deposits")
+    async def get_account_deposits(self, account_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._get_resource("deposits", f"/accounts/{account_id}/deposits", refresh)
 
-    async def get_account_loans(self, account_id: str) -> List[Dict[str, Any]]:
-        return await self._get(f"/accounts/{account_id}/loans")
+    async def get_account_loans(self, account_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._get_resource("loans", f"/accounts/{account_id}/loans", refresh)
 
-    async def get_account_purchases(self, account_id: str) -> List[Dict[str, Any]]:
-        return await self._get(f"/accounts/{account_id}/purchases")
+    async def get_account_purchases(self, account_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._get_resource("purchases", f"/accounts/{account_id}/purchases", refresh)
 
-    async def get_account_transfers(self, account_id: str) -> List[Dict[str, Any]]:
-        return await self._get(f"/accounts/{account_id}/transfers")
+    async def get_account_transfers(self, account_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._get_resource("transfers", f"/accounts/{account_id}/transfers", refresh)
 
-    async def get_account_withdrawals(self, account_id: str) -> List[Dict[str, Any]]:
-        return await self._get(f"/accounts/{account_id}/withdrawals")
+    async def get_account_withdrawals(self, account_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._get_resource("withdrawals", f"/accounts/{account_id}/withdrawals", refresh)
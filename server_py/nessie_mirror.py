@@ -0,0 +1,160 @@
+"""
+Nessie Mirror
+
+Keeps a local SQLite copy (nessie_customers / nessie_accounts /
+nessie_account_items) of each customer's Capital One Nessie data, so snapshots
+and activity queries read indexed local tables instead of fanning out to the
+API on every request.
+
+Nessie has no "changed since" query, so each sync fetches the customer's
+accounts and their sub-resources and database.apply_nessie_mirror diffs them
+against the mirror by _id and content hash: only new or changed rows are
+written and rows that disappeared upstream are deleted. A background task
+re-syncs every mirrored customer every NESSIE_MIRROR_INTERVAL seconds. Every
+server process starts the task, but only the one holding the database lease
+(background_leases) syncs; the others take over if it stops renewing.
+
+Snapshots with source=auto use the mirror only while it is fresh: synced
+within NESSIE_MIRROR_MAX_AGE seconds and kept current by a running loop.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+import database
+from nessie_client import NESSIE_CACHE_TTLS
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background syncs of every customer; 0 disables the background task
+NESSIE_MIRROR_INTERVAL = float(os.environ.get("NESSIE_MIRROR_INTERVAL", "300"))
+# Oldest mirrored snapshot source=auto serves. Unset, it's the shortest NESSIE_CACHE_TTLS
+# entry among the included resources, so the mirror is never staler than the cache.
+NESSIE_MIRROR_MAX_AGE = float(os.environ["NESSIE_MIRROR_MAX_AGE"]) if os.environ.get("NESSIE_MIRROR_MAX_AGE") else None
+NESSIE_MIRROR_LEASE = "nessie_mirror"
+
+# NessieClient method per mirrored sub-resource (database.NESSIE_ITEM_KINDS)
+MIRROR_RESOURCES = {
+    "bills": "get_account_bills",
+    "deposits": "get_account_deposits",
+    "loans": "get_account_loans",
+    "purchases": "get_account_purchases",
+    "transfers": "get_account_transfers",
+    "withdrawals": "get_account_withdrawals",
+}
+
+
+class NessieMirror:
+    def __init__(self, client, interval: float = NESSIE_MIRROR_INTERVAL, max_age: Optional[float] = NESSIE_MIRROR_MAX_AGE):
+        self.client = client
+        self.interval = interval
+        self.max_age = max_age
+        # Outlives a missed renewal or a slow sync_all(); a dead holder's lease lapses after this
+        self.lease_seconds = interval * 2 + 60
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stats = {"syncs": 0, "failed_syncs": 0, "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0,
+                       "background_runs": 0}
+        self._last_sync: Optional[Dict[str, Any]] = None
+
+    async def sync_customer(self, customer_id: str, customer: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Fetch one customer from Nessie (bypassing and refreshing the response cache)
+        and apply the differences to the mirror. Sub-resources that fail to load keep
+        their previously mirrored rows. Returns the row counts and per-resource errors.
+        """
+        lock = self._locks.setdefault(customer_id, asyncio.Lock())
+        async with lock:
+            start = time.perf_counter()
+            if customer is None:
+                customer = await self.client.get_customer(customer_id, refresh=True)
+            accounts = await self.client.get_customer_accounts(customer_id, refresh=True)
+
+            pairs = [(a["_id"], kind) for a in accounts for kind in MIRROR_RESOURCES]
+            results = await asyncio.gather(
+                *(getattr(self.client, MIRROR_RESOURCES[kind])(account_id, refresh=True) for account_id, kind in pairs),
+                return_exceptions=True,
+            )
+            items, errors = {}, []
+            for (account_id, kind), res in zip(pairs, results):
+                if isinstance(res, Exception):
+                    errors.append({"account_id": account_id, "kind": kind, "error": str(res)})
+                elif isinstance(res, list):
+                    items[(account_id, kind)] = res
+
+            counts = await asyncio.to_thread(database.apply_nessie_mirror, customer_id, customer, accounts, items)
+            for key, value in counts.items():
+                self._stats[key] += value
+            self._stats["syncs"] += 1
+            result = {
+                "customer_id": customer_id, **counts, "accounts": len(accounts), "errors": errors,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+            self._last_sync = {k: v for k, v in result.items() if k != "errors"}
+            return result
+
+    async def sync_all(self) -> List[Dict[str, Any]]:
+        """Sync every customer visible to the API key, one customer at a time."""
+        customers = await self.client.get_customers(refresh=True)
+        results = []
+        for customer in customers:
+            try:
+                results.append(await self.sync_customer(customer["_id"], customer))
+            except Exception as e:
+                self._stats["failed_syncs"] += 1
+                logger.warning(f"Nessie mirror sync failed for {customer.get('_id')}: {e}")
+                results.append({"customer_id": customer.get("_id"), "error": str(e)})
+        return results
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await asyncio.to_thread(database.release_lease, NESSIE_MIRROR_LEASE, self.owner)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Only the lease holder syncs, so N server processes don't make N times the upstream calls
+                if await asyncio.to_thread(database.acquire_lease, NESSIE_MIRROR_LEASE, self.owner, self.lease_seconds):
+                    self._stats["background_runs"] += 1
+                    await self.sync_all()
+            except Exception as e:
+                logger.warning(f"Nessie mirror sync failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def is_fresh(self, mirrored_at: float, include: Iterable[str]) -> bool:
+        """
+        Whether a snapshot mirrored at `mirrored_at` may stand in for a live one:
+        no older than the max age, and a background loop (in any process) keeps it current.
+        """
+        max_age = self.max_age
+        if max_age is None:
+            # The account list is part of every snapshot
+            max_age = min(NESSIE_CACHE_TTLS[name] for name in ["accounts", *include] if name in NESSIE_CACHE_TTLS)
+        if time.time() - mirrored_at > max_age:
+            return False
+        return database.get_lease(NESSIE_MIRROR_LEASE) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "interval_seconds": self.interval,
+            "running": self._task is not None,
+            "max_age_seconds": self.max_age,
+            "lease": database.get_lease(NESSIE_MIRROR_LEASE),
+            "lease_owner": self.owner,
+            "last_sync": self._last_sync,
+            "customers": database.get_nessie_mirror_state(),
+        }
@@ -0,0 +1,109 @@
+"""
+Plaid Service
+
+Async wrapper around the synchronous plaid-python SDK. Every Plaid call runs on
+a bounded thread pool so a slow Plaid round-trip never blocks the event loop
+(and with it every in-flight chat stream). The underlying ApiClient is created
+once and reused, so its urllib3 pool keeps connections to Plaid alive between
+requests.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+import plaid
+from plaid.api import plaid_api
+from urllib3.connection import HTTPConnection
+
+logger = logging.getLogger(__name__)
+
+PLAID_MAX_WORKERS = int(os.environ.get("PLAID_MAX_WORKERS", "8"))
+PLAID_CONNECT_TIMEOUT = float(os.environ.get("PLAID_CONNECT_TIMEOUT", "5"))
+PLAID_READ_TIMEOUT = float(os.environ.get("PLAID_READ_TIMEOUT", "30"))
+
+
+def map_account(acc) -> Dict[str, Any]:
+    """Convert a Plaid AccountBase model into the dict shape served by the API."""
+    return {
+        "account_id": acc.account_id,
+        "name": acc.name,
+        "official_name": acc.official_name,
+        "type": str(acc.type),
+        "subtype": str(acc.subtype) if acc.subtype else None,
+        "mask": acc.mask,
+        "balances": {
+            "available": acc.balances.available,
+            "current": acc.balances.current,
+            "limit": acc.balances.limit,
+            "iso_currency_code": acc.balances.iso_currency_code,
+        },
+    }
+
+
+class PlaidService:
+    """
+    Shared Plaid client. Methods mirror the PlaidApi calls used by the server
+    but are awaitable and carry a (connect, read) timeout on every request.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        secret: str,
+        host: str = plaid.Environment.Sandbox,
+        max_workers: int = PLAID_MAX_WORKERS,
+        timeout: Tuple[float, float] = (PLAID_CONNECT_TIMEOUT, PLAID_READ_TIMEOUT),
+    ):
+        configuration = plaid.Configuration(
+            host=host,
+            api_key={
+                "clientId": client_id,
+                "secret": secret,
+            },
+        )
+        # One pooled connection per worker thread, with TCP keep-alive so idle
+        # connections survive between app polls
+        configuration.connection_pool_maxsize = max_workers
+        configuration.socket_options = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+
+        self.api_client = plaid.ApiClient(configuration)
+        self.client = plaid_api.PlaidApi(self.api_client)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plaid")
+
+    async def _call(self, method: str, request) -> Any:
+        loop = asyncio.get_running_loop()
+        fn = functools.partial(getattr(self.client, method), request, _request_timeout=self.timeout)
+        return await loop.run_in_executor(self._executor, fn)
+
+    async def link_token_create(self, request):
+        return await self._call("link_token_create", request)
+
+    async def item_public_token_exchange(self, request):
+        return await self._call("item_public_token_exchange", request)
+
+    async def accounts_get(self, request):
+        return await self._call("accounts_get", request)
+
+    async def accounts_balance_get(self, request):
+        return await self._call("accounts_balance_get", request)
+
+    async def transactions_get(self, request):
+        return await self._call("transactions_get", request)
+
+    async def transactions_sync(self, request):
+        return await self._call("transactions_sync", request)
+
+    async def webhook_verification_key_get(self, request):
+        return await self._call("webhook_verification_key_get", request)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.api_client.close()
@@ -0,0 +1,203 @@
+"""
+Plaid Webhooks
+
+Turns Plaid webhook deliveries into debounced background refreshes, so new
+transactions are synced (and everything derived from them refreshed) before
+the app asks for them.
+
+Webhooks for an item are debounced: each delivery restarts a short quiet
+period, and the refresh runs once the item has been quiet for
+`debounce_seconds` (or `max_delay_seconds` after the first delivery, whichever
+comes first). A burst of webhooks for one item therefore causes one refresh.
+
+Deliveries are only processed once PlaidWebhookVerifier has checked their
+Plaid-Verification header: an ES256 JWT signed with a key from
+/webhook_verification_key/get, issued at most `max_age_seconds` ago, whose
+request_body_sha256 claim matches the body.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_DEBOUNCE_SECONDS = float(os.environ.get("PLAID_WEBHOOK_DEBOUNCE", "2"))
+WEBHOOK_MAX_DELAY_SECONDS = float(os.environ.get("PLAID_WEBHOOK_MAX_DELAY", "30"))
+# Plaid recommends rejecting webhooks signed more than 5 minutes ago
+WEBHOOK_MAX_AGE_SECONDS = float(os.environ.get("PLAID_WEBHOOK_MAX_AGE", "300"))
+# Verification keys are re-fetched after this long, so a rotated-out key stops being trusted
+WEBHOOK_KEY_CACHE_SECONDS = float(os.environ.get("PLAID_WEBHOOK_KEY_CACHE", "3600"))
+
+# TRANSACTIONS webhook codes that mean new data is available via /transactions/sync
+SYNC_WEBHOOK_CODES = {
+    "SYNC_UPDATES_AVAILABLE",
+    "INITIAL_UPDATE",
+    "HISTORICAL_UPDATE",
+    "DEFAULT_UPDATE",
+    "TRANSACTIONS_REMOVED",
+}
+
+
+class PlaidWebhookProcessor:
+    """
+    Debounces webhook deliveries per item and runs `refresh(item_id)` in the background.
+    `on_item_event(item_id, webhook_code)` is called immediately for ITEM webhooks.
+    """
+
+    def __init__(
+        self,
+        refresh: Callable[[str], Awaitable[None]],
+        on_item_event: Callable[[str, str], None] = lambda item_id, code: None,
+        debounce_seconds: float = WEBHOOK_DEBOUNCE_SECONDS,
+        max_delay_seconds: float = WEBHOOK_MAX_DELAY_SECONDS,
+    ):
+        self.refresh = refresh
+        self.on_item_event = on_item_event
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._timers: Dict[str, asyncio.Task] = {}
+        self._first_seen: Dict[str, float] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._stats = {"received": 0, "ignored": 0, "debounced": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def handle(self, payload: Dict[str, Any]) -> str:
+        """Process one webhook body. Returns what was done: "scheduled", "item_event" or "ignored"."""
+        self._stats["received"] += 1
+        webhook_type = payload.get("webhook_type")
+        webhook_code = payload.get("webhook_code")
+        item_id = payload.get("item_id")
+
+        if not item_id:
+            self._stats["ignored"] += 1
+            return "ignored"
+
+        if webhook_type == "TRANSACTIONS" and webhook_code in SYNC_WEBHOOK_CODES:
+            self.schedule(item_id)
+            return "scheduled"
+
+        if webhook_type == "ITEM":
+            logger.info(f"Plaid ITEM webhook {webhook_code} for {item_id}: {payload.get('error')}")
+            self.on_item_event(item_id, webhook_code)
+            return "item_event"
+
+        self._stats["ignored"] += 1
+        return "ignored"
+
+    def schedule(self, item_id: str) -> None:
+        now = time.monotonic()
+        self._last_seen[item_id] = now
+        if item_id in self._timers:
+            # A refresh is already waiting for this item; it will pick this delivery up
+            self._stats["debounced"] += 1
+            return
+        self._first_seen[item_id] = now
+        self._timers[item_id] = asyncio.create_task(self._wait_and_refresh(item_id))
+
+    async def _wait_and_refresh(self, item_id: str) -> None:
+        try:
+            while True:
+                now = time.monotonic()
+                quiet_until = self._last_seen[item_id] + self.debounce_seconds
+                deadline = self._first_seen[item_id] + self.max_delay_seconds
+                wake_at = min(quiet_until, deadline)
+                if now >= wake_at:
+                    break
+                await asyncio.sleep(wake_at - now)
+        finally:
+            # Deliveries from here on schedule a fresh refresh
+            self._timers.pop(item_id, None)
+            self._first_seen.pop(item_id, None)
+
+        self._stats["refreshes"] += 1
+        try:
+            await self.refresh(item_id)
+        except Exception as e:
+            self._stats["refresh_errors"] += 1
+            logger.error(f"Webhook refresh for {item_id} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "pending": len(self._timers)}
+
+
+class WebhookVerificationError(Exception):
+    """A webhook delivery that is unsigned, wrongly signed, stale or altered."""
+
+
+class PlaidWebhookVerifier:
+    """
+    Checks the Plaid-Verification JWT of webhook deliveries.
+    `fetch_key(key_id)` returns the JWK for a key id (from /webhook_verification_key/get);
+    keys are cached per key id, and concurrent lookups of one key share a fetch.
+    """
+
+    def __init__(
+        self,
+        fetch_key: Callable[[str], Awaitable[Dict[str, Any]]],
+        max_age_seconds: float = WEBHOOK_MAX_AGE_SECONDS,
+        key_cache_seconds: float = WEBHOOK_KEY_CACHE_SECONDS,
+    ):
+        self.fetch_key = fetch_key
+        self.max_age_seconds = max_age_seconds
+        self.key_cache_seconds = key_cache_seconds
+        self._keys: Dict[str, Tuple[asyncio.Task, float]] = {}
+        self._stats = {"verified": 0, "rejected": 0, "key_fetches": 0}
+
+    async def verify(self, body: bytes, token: Optional[str]) -> None:
+        """Raise WebhookVerificationError unless `token` is a valid, fresh signature of `body`."""
+        try:
+            self._check_claims(body, await self._decode(token))
+        except WebhookVerificationError:
+            self._stats["rejected"] += 1
+            raise
+        self._stats["verified"] += 1
+
+    async def _decode(self, token: Optional[str]) -> Dict[str, Any]:
+        if not token:
+            raise WebhookVerificationError("missing Plaid-Verification header")
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError as e:
+            raise WebhookVerificationError(f"malformed token: {e}")
+        if header.get("alg") != "ES256" or not header.get("kid"):
+            raise WebhookVerificationError(f"unexpected token header {header}")
+
+        jwk = await self._key(header["kid"])
+        if jwk.get("expired_at") is not None:
+            raise WebhookVerificationError(f"key {header['kid']} has expired")
+        try:
+            key = jwt.PyJWK(jwk, algorithm="ES256").key
+            return jwt.decode(token, key, algorithms=["ES256"], options={"require": ["iat", "request_body_sha256"]})
+        except jwt.PyJWTError as e:
+            raise WebhookVerificationError(f"invalid token: {e}")
+
+    def _check_claims(self, body: bytes, claims: Dict[str, Any]) -> None:
+        age = time.time() - claims["iat"]
+        if age > self.max_age_seconds:
+            raise WebhookVerificationError(f"token issued {age:.0f}s ago")
+        body_sha256 = hashlib.sha256(body).hexdigest()
+        if not hmac.compare_digest(body_sha256, str(claims["request_body_sha256"])):
+            raise WebhookVerificationError("body does not match request_body_sha256")
+
+    async def _key(self, key_id: str) -> Dict[str, Any]:
+        entry = self._keys.get(key_id)
+        if entry is None or time.monotonic() - entry[1] > self.key_cache_seconds:
+            self._stats["key_fetches"] += 1
+            entry = (asyncio.create_task(self.fetch_key(key_id)), time.monotonic())
+            self._keys[key_id] = entry
+        try:
+            return await asyncio.shield(entry[0])
+        except Exception as e:
+            # Don't cache failed lookups (e.g. an unknown key id, or Plaid unreachable)
+            if self._keys.get(key_id) is entry:
+                del self._keys[key_id]
+            raise WebhookVerificationError(f"could not fetch key {key_id}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
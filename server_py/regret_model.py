@@ -0,0 +1,152 @@
+"""
+Local Regret Classifier
+
+A logistic-regression model trained from the LLM-scored rows in
+transaction_metadata (see purchase_predictor/src/train_regret.py). It scores a
+transaction with a handful of dict lookups, so confident cases skip the LLM
+entirely; only transactions whose regret probability falls inside the
+confidence band are escalated.
+
+Features: merchant, primary category, payment channel, time of day and amount.
+"""
+
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+MODEL_PATH = PROJECT_ROOT / "purchase_predictor" / "models" / "regret_classifier.json"
+
+# Probabilities inside (LOW, HIGH) are too uncertain to use and go to the LLM
+REGRET_MODEL_LOW = float(os.environ.get("REGRET_MODEL_LOW", "0.2"))
+REGRET_MODEL_HIGH = float(os.environ.get("REGRET_MODEL_HIGH", "0.8"))
+
+# LLM scores at or above this count as "regretted" when training
+REGRET_LABEL_THRESHOLD = 50
+
+
+def _hour_bucket(timestamp: Optional[str]) -> str:
+    if not timestamp:
+        return "unknown"
+    try:
+        hour = datetime.fromisoformat(timestamp).hour
+    except ValueError:
+        return "unknown"
+    if hour < 5:
+        return "overnight"
+    if hour < 12:
+        return "morning"
+    if hour < 17:
+        return "afternoon"
+    if hour < 21:
+        return "evening"
+    return "late_night"
+
+
+def regret_features(transaction: Dict[str, Any]) -> Dict[str, float]:
+    """Sparse feature dict for one transaction; shared by training and inference."""
+    amount = float(transaction.get("amount") or 0)
+    merchant = (transaction.get("merchant_name") or transaction.get("name") or "unknown").lower()
+    category = (transaction.get("category") or ["Misc"])[0]
+    return {
+        f"merchant={merchant}": 1.0,
+        f"category={category}": 1.0,
+        f"channel={transaction.get('payment_channel') or 'unknown'}": 1.0,
+        f"hour={_hour_bucket(transaction.get('datetime'))}": 1.0,
+        "log_amount": math.log1p(abs(amount)),
+        "is_outflow": 1.0 if amount > 0 else 0.0,
+    }
+
+
+class RegretClassifier:
+    """
+    Loads the exported model weights and scores transactions locally.
+    The model file is re-read when it changes, so retraining needs no restart.
+    """
+
+    def __init__(self, path: Path = MODEL_PATH, low: float = REGRET_MODEL_LOW, high: float = REGRET_MODEL_HIGH):
+        self.path = Path(path)
+        self.low = low
+        self.high = high
+        self.intercept = 0.0
+        self.weights: Dict[str, float] = {}
+        self.metadata: Dict[str, Any] = {}
+        self._mtime: Optional[float] = None
+        self._stats = {"confident": 0, "uncertain": 0}
+
+    @property
+    def available(self) -> bool:
+        return self._mtime is not None
+
+    def load(self) -> bool:
+        """(Re)load the model if the file changed. Returns whether a model is available."""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return self.available
+        if mtime == self._mtime:
+            return True
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.intercept = float(data["intercept"])
+            self.weights = data["weights"]
+            self.metadata = {k: v for k, v in data.items() if k not in ("intercept", "weights")}
+            self._mtime = mtime
+            logger.info(f"Loaded regret classifier ({len(self.weights)} weights, {data.get('trained_rows')} training rows)")
+        except Exception as e:
+            logger.warning(f"Failed to load regret classifier from {self.path}: {e}")
+        return self.available
+
+    def predict_proba(self, transaction: Dict[str, Any]) -> Optional[float]:
+        """Probability that the user regrets this transaction, or None without a model."""
+        if not self.available:
+            return None
+        z = self.intercept
+        for name, value in regret_features(transaction).items():
+            z += self.weights.get(name, 0.0) * value
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def score(self, transaction: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Regret score and reason when the model is confident, else None (escalate to the LLM)."""
+        probability = self.predict_proba(transaction)
+        if probability is None:
+            return None
+        if self.low < probability < self.high:
+            self._stats["uncertain"] += 1
+            return None
+        self._stats["confident"] += 1
+
+        category = (transaction.get("category") or ["Misc"])[0]
+        merchant = transaction.get("merchant_name") or transaction.get("name") or "this merchant"
+        if probability >= self.high:
+            reason = f"Similar {category} purchases at {merchant} were usually regretted."
+        else:
+            reason = f"Similar {category} purchases at {merchant} were usually worth it."
+        return {"score": round(probability * 100), "reason": reason, "probability": round(probability, 4)}
+
+    def partition(self, transactions: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict], List[Dict[str, Any]]]:
+        """Split transactions into locally scored ({transaction_id: result}) and ones that need the LLM."""
+        scored, uncertain = {}, []
+        for t in transactions:
+            result = self.score(t)
+            if result is None:
+                uncertain.append(t)
+            else:
+                scored[t["transaction_id"]] = result
+        return scored, uncertain
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "available": self.available,
+            "band": [self.low, self.high],
+            "trained_rows": self.metadata.get("trained_rows"),
+            "trained_at": self.metadata.get("trained_at"),
+        }
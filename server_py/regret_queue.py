@@ -0,0 +1,220 @@
+"""
+Regret Job Queue
+
+Background regret scoring backed by the regret_jobs table in SQLite, so queued
+work survives restarts and is shared by every server process.
+
+- Jobs are keyed by transaction_id, so enqueueing a queued transaction again is a
+  no-op. Enqueueing one whose job failed permanently re-arms it.
+- `concurrency` worker tasks per process claim up to `batch_size` due jobs at a
+  time. Jobs the local classifier (regret_model.py) is confident about are
+  scored on the spot; the rest go to the LLM in one batched request.
+- Failed attempts are retried with jittered exponential backoff up to `max_attempts`.
+- Workers survive database errors (e.g. a locked or unavailable database): the
+  error is logged and the worker backs off before trying again.
+- Subscribers (the SSE endpoint) are fed from the shared store, not from this
+  process's workers: a feed task reads scores saved since its watermark
+  (transaction_metadata.scored_seq) and hands them to every subscriber, so each
+  process delivers every score, whichever process produced it.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import database
+from chat import REGRET_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+REGRET_QUEUE_CONCURRENCY = int(os.environ.get("REGRET_QUEUE_CONCURRENCY", "2"))
+REGRET_MAX_ATTEMPTS = int(os.environ.get("REGRET_MAX_ATTEMPTS", "5"))
+REGRET_RETRY_BASE_SECONDS = float(os.environ.get("REGRET_RETRY_BASE_SECONDS", "2"))
+
+# Idle workers re-check the table this often (picks up work queued by other processes)
+POLL_INTERVAL_SECONDS = 5.0
+# Jobs stuck in "running" longer than this are assumed orphaned by a crashed worker
+STALE_RUNNING_SECONDS = 300
+# How often the subscriber feed checks the store for scores saved by other processes
+REGRET_STREAM_POLL_SECONDS = float(os.environ.get("REGRET_STREAM_POLL_SECONDS", "1"))
+REGRET_STREAM_BATCH = 500
+# First and longest pause after a worker hits an unexpected error
+WORKER_ERROR_BACKOFF_SECONDS = 0.5
+WORKER_ERROR_BACKOFF_MAX_SECONDS = 30.0
+
+
+class RegretJobQueue:
+    def __init__(
+        self,
+        chat_service,
+        concurrency: int = REGRET_QUEUE_CONCURRENCY,
+        max_attempts: int = REGRET_MAX_ATTEMPTS,
+        retry_base_seconds: float = REGRET_RETRY_BASE_SECONDS,
+        batch_size: int = REGRET_BATCH_SIZE,
+        local_model=None,
+    ):
+        self.chat_service = chat_service
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.batch_size = batch_size
+        self.local_model = local_model
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._feed: Optional[asyncio.Task] = None
+        self._scored = asyncio.Event()
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._stats = {"scored": 0, "scored_locally": 0, "retried": 0, "failed": 0, "worker_errors": 0,
+                       "published": 0, "feed_errors": 0}
+
+    def enqueue(self, transactions: List[Dict[str, Any]]) -> int:
+        """Queue transactions for scoring; returns how many were newly added."""
+        if not transactions:
+            return 0
+        added = database.enqueue_regret_jobs(transactions)
+        if added:
+            self._wakeup.set()
+        return added
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        requeued = database.requeue_stale_regret_jobs(STALE_RUNNING_SECONDS)
+        if requeued:
+            logger.info(f"Requeued {requeued} orphaned regret jobs")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._feed = asyncio.create_task(self._run_feed(database.get_regret_score_watermark()))
+
+    async def stop(self) -> None:
+        tasks = self._workers + ([self._feed] if self._feed else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._feed = None
+
+    async def _worker(self) -> None:
+        backoff = WORKER_ERROR_BACKOFF_SECONDS
+        while True:
+            try:
+                jobs = database.claim_regret_jobs(limit=self.batch_size)
+                if jobs:
+                    await self._run(jobs)
+            except Exception as e:
+                self._stats["worker_errors"] += 1
+                logger.exception(f"Regret worker error, retrying in {backoff:.1f}s: {e}")
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, WORKER_ERROR_BACKOFF_MAX_SECONDS)
+                continue
+            backoff = WORKER_ERROR_BACKOFF_SECONDS
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run(self, jobs: List[Dict[str, Any]]) -> None:
+        if self.local_model is not None and self.local_model.load():
+            local_results, _ = self.local_model.partition([job["transaction"] for job in jobs])
+            for job in jobs:
+                if job["transaction_id"] in local_results:
+                    self._complete(job, local_results[job["transaction_id"]], source="local")
+            jobs = [job for job in jobs if job["transaction_id"] not in local_results]
+            if not jobs:
+                return
+
+        try:
+            user_profile = database.get_user_profile()
+            results = await self.chat_service.analyze_transactions_regret(
+                [job["transaction"] for job in jobs], user_profile
+            )
+        except Exception as e:
+            for job in jobs:
+                self._retry_or_fail(job, e)
+            return
+
+        for job in jobs:
+            transaction_id = job["transaction_id"]
+            analysis = results.get(transaction_id)
+            if analysis is None:
+                self._retry_or_fail(job, "no score in model response")
+                continue
+            self._complete(job, analysis, source="llm")
+
+    def _complete(self, job: Dict[str, Any], analysis: Dict[str, Any], source: str) -> None:
+        transaction_id = job["transaction_id"]
+        database.save_transaction_regret(transaction_id, analysis["score"], analysis["reason"], source=source)
+        database.complete_regret_job(transaction_id)
+        self._stats["scored"] += 1
+        if source == "local":
+            self._stats["scored_locally"] += 1
+        # Deliver our own scores without waiting for the next poll
+        self._scored.set()
+
+    def _retry_or_fail(self, job: Dict[str, Any], error) -> None:
+        transaction_id = job["transaction_id"]
+        if job["attempts"] >= self.max_attempts:
+            self._stats["failed"] += 1
+            logger.error(f"Regret scoring for {transaction_id} failed permanently: {error}")
+            database.fail_regret_job(transaction_id, error)
+            return
+        self._stats["retried"] += 1
+        delay = self.retry_base_seconds * 2 ** (job["attempts"] - 1) * random.uniform(0.5, 1.5)
+        logger.warning(f"Regret scoring for {transaction_id} failed (attempt {job['attempts']}), retrying in {delay:.1f}s: {error}")
+        database.fail_regret_job(transaction_id, error, retry_at=time.time() + delay)
+        asyncio.get_running_loop().call_later(delay, self._wakeup.set)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    async def _run_feed(self, watermark: int) -> None:
+        """Publish every score saved after `watermark`, by this process or any other."""
+        while True:
+            try:
+                await asyncio.wait_for(self._scored.wait(), timeout=REGRET_STREAM_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._scored.clear()
+            try:
+                rows = await asyncio.to_thread(database.get_regret_scores_since, watermark, REGRET_STREAM_BATCH)
+            except Exception as e:
+                self._stats["feed_errors"] += 1
+                logger.warning(f"Regret score feed failed to read the store: {e}")
+                continue
+            for row in rows:
+                watermark = row["scored_seq"]
+                self._publish({
+                    "transaction_id": row["transaction_id"],
+                    "regretScore": row["regret_score"],
+                    "regretReason": row["regret_reason"],
+                    "regretSource": row["source"],
+                })
+            self._stats["published"] += len(rows)
+            if len(rows) == REGRET_STREAM_BATCH:
+                # A full page means more are waiting
+                self._scored.set()
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A subscriber that stopped reading just misses updates; it can refetch
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "queued": database.get_regret_job_counts(),
+            "subscribers": len(self._subscribers),
+            "local_model": self.local_model.stats() if self.local_model is not None else None,
+        }
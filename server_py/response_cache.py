@@ -0,0 +1,118 @@
+"""
+Response Cache
+
+In-process TTL cache with stale-while-revalidate for upstream API responses.
+
+- Fresh entries (younger than `ttl`) are returned directly.
+- Stale entries (up to `ttl + max_stale`) are returned immediately while a
+  single background refresh reloads them.
+- Concurrent misses for the same key share one upstream call.
+- get(..., refresh=True) skips the cache but still joins a load already in flight.
+- invalidate() drops entries and discards any refresh already in flight for
+  them, so a response fetched before an invalidation is never stored after it.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    def __init__(self, ttl: float, max_stale: float = 0.0, name: str = "cache"):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.name = name
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._generations: Dict[str, int] = {}
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "upstream_calls": 0,
+            "coalesced": 0,
+            "forced_refreshes": 0,
+            "refresh_errors": 0,
+        }
+
+    async def get(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        refresh: bool = False,
+    ) -> Any:
+        """
+        Return the cached value for `key`, calling `loader` on a miss or when stale.
+        `refresh=True` waits for a fresh load even if a cached value exists.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if refresh:
+            self._stats["forced_refreshes"] += 1
+            return await asyncio.shield(self._refresh(key, loader))
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < ttl:
+                self._stats["hits"] += 1
+                return value
+            if age < ttl + self.max_stale:
+                self._stats["stale_hits"] += 1
+                self._refresh(key, loader)
+                return value
+
+        self._stats["misses"] += 1
+        return await asyncio.shield(self._refresh(key, loader))
+
+    def _refresh(self, key: str, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            self._stats["coalesced"] += 1
+            return task
+
+        task = asyncio.create_task(self._load(key, loader, self._generations.get(key, 0)))
+        # Background refresh failures are logged in _load; mark them retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        self._stats["upstream_calls"] += 1
+        try:
+            value = await loader()
+        except Exception as e:
+            self._stats["refresh_errors"] += 1
+            logger.warning(f"{self.name}: refresh of {key} failed: {e}")
+            raise
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+        if self._generations.get(key, 0) == generation:
+            self._entries[key] = (value, time.monotonic())
+        return value
+
+    def invalidate(self, prefix: str = "") -> int:
+        """Drop every entry whose key starts with `prefix` (all entries by default). Returns the count."""
+        keys = {k for k in list(self._entries) + list(self._inflight) if k.startswith(prefix)}
+        for key in keys:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+        hit_rate = (self._stats["hits"] + self._stats["stale_hits"]) / lookups if lookups else 0.0
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "hit_rate": round(hit_rate, 3),
+            "ttl_seconds": self.ttl,
+            "max_stale_seconds": self.max_stale,
+        }
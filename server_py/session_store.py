@@ -0,0 +1,110 @@
+"""
+Session Store
+
+Connection state (the Plaid access token and item id) lives in a store shared
+by every server process instead of module globals, so the API can run under
+several uvicorn/gunicorn workers or hosts.
+
+SessionStore is the interface: string keys to JSON-serializable values. The
+default SQLiteSessionStore keeps state in finance.db; anything with get/set/
+delete semantics (e.g. Redis) can implement it. CachedSessionStore wraps any
+backend with a short per-process read cache.
+"""
+
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import database
+
+# How long a worker may serve a cached read before re-reading the shared store.
+# Writes from the same worker are visible immediately; other workers see them
+# within this window.
+SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", "1.0"))
+
+PLAID_CONNECTION_KEY = "plaid_connection"
+
+
+class SessionStore(ABC):
+    """Interface for shared session state."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session state in the session_state table of the local SQLite database."""
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = database.get_session_value(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        database.set_session_value(key, json.dumps(value))
+
+    def delete(self, key: str) -> None:
+        database.delete_session_value(key)
+
+
+class CachedSessionStore(SessionStore):
+    """Per-process read-through cache in front of a shared backend."""
+
+    def __init__(self, backend: SessionStore, ttl: float = SESSION_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._cache: Dict[str, Tuple[Any, float]] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        value = self.backend.get(key)
+        self._cache[key] = (value, time.monotonic())
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.backend.set(key, value)
+        self._cache[key] = (value, time.monotonic())
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+        self._cache[key] = (None, time.monotonic())
+
+
+def create_session_store() -> SessionStore:
+    """Build the configured store (SESSION_STORE, default "sqlite") with read caching."""
+    backend_name = os.environ.get("SESSION_STORE", "sqlite")
+    if backend_name == "sqlite":
+        backend = SQLiteSessionStore()
+    else:
+        raise ValueError(f"Unknown SESSION_STORE '{backend_name}'")
+    return CachedSessionStore(backend)
+
+
+class PlaidConnection:
+    """Typed access to the Plaid connection held in a SessionStore."""
+
+    def __init__(self, store: SessionStore):
+        self.store = store
+
+    def get(self) -> Tuple[Optional[str], Optional[str]]:
+        """Return (access_token, item_id), both None when no bank is connected."""
+        data = self.store.get(PLAID_CONNECTION_KEY) or {}
+        return data.get("access_token"), data.get("item_id")
+
+    def set(self, access_token: str, item_id: str) -> None:
+        self.store.set(PLAID_CONNECTION_KEY, {"access_token": access_token, "item_id": item_id})
+
+    def clear(self) -> None:
+        self.store.delete(PLAID_CONNECTION_KEY)
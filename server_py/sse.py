@@ -0,0 +1,185 @@
+"""
+SSE Framing
+
+Turns an advisor reply (an async generator of text chunks) into the
+OpenAI-style SSE frames /api/advisor/chat sends:
+
+    data: {"choices":[{"delta":{"content":"..."}}]}
+
+- Coalescing: chunks are buffered and flushed as one frame on the next tick of
+  a shared SSE_FLUSH_INTERVAL_MS timer (one per event loop, not one per stream
+  or frame), or as soon as SSE_FLUSH_BYTES (counted in characters) have built
+  up. With an interval of 0, every chunk gets its own frame unless more are
+  already waiting.
+- Frames are a precomputed prefix and suffix around the JSON-encoded content.
+  Content is encoded with orjson when installed, otherwise json.
+- A ": ping" comment goes out after SSE_HEARTBEAT_INTERVAL seconds without a
+  frame, so proxies keep idle streams (e.g. a slow workflow step) open.
+- The chunks are produced in their own task, which is cancelled as soon as the
+  client disconnects, so the model streams and workflow steps behind them stop
+  at once rather than at the next failed write (which, depending on the ASGI
+  server, may never fail).
+- The stream ends with "data: [DONE]"; an error ends it with
+  data: {"error": "..."} after whatever content was already buffered.
+"""
+
+import asyncio
+import json
+import os
+import weakref
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+from starlette.requests import Request
+
+SSE_FLUSH_INTERVAL_MS = float(os.environ.get("SSE_FLUSH_INTERVAL_MS", "25"))
+SSE_FLUSH_BYTES = int(os.environ.get("SSE_FLUSH_BYTES", "1024"))
+SSE_HEARTBEAT_INTERVAL = float(os.environ.get("SSE_HEARTBEAT_INTERVAL", "15"))
+
+try:
+    import orjson
+
+    def _json(text: str) -> bytes:
+        try:
+            return orjson.dumps(text)
+        except TypeError:  # orjson.JSONEncodeError, e.g. a lone surrogate
+            return json.dumps(text).encode()
+except ImportError:  # optional dependency
+    def _json(text: str) -> bytes:
+        return json.dumps(text).encode()
+
+CONTENT_PREFIX = b'data: {"choices":[{"delta":{"content":'
+CONTENT_SUFFIX = b'}}]}\n\n'
+DONE_FRAME = b"data: [DONE]\n\n"
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+def content_frame(text: str) -> bytes:
+    return CONTENT_PREFIX + _json(text) + CONTENT_SUFFIX
+
+
+def error_frame(message: str) -> bytes:
+    return b'data: {"error":' + _json(message) + b"}\n\n"
+
+
+class _FlushTicker:
+    """Every `interval` seconds, wakes each stream that has buffered chunks."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float):
+        self.loop = loop
+        self.interval = interval
+        self.due = set()
+        self.handle = None
+
+    def add(self, ready: asyncio.Event) -> None:
+        self.due.add(ready)
+        if self.handle is None:
+            self.handle = self.loop.call_later(self.interval, self._tick)
+
+    def discard(self, ready: asyncio.Event) -> None:
+        self.due.discard(ready)
+
+    def _tick(self) -> None:
+        due, self.due = self.due, set()
+        self.handle = None
+        for ready in due:
+            ready.set()
+
+
+_tickers = weakref.WeakKeyDictionary()  # event loop -> {interval: _FlushTicker}
+
+
+def _ticker(loop: asyncio.AbstractEventLoop, interval: float) -> _FlushTicker:
+    by_interval = _tickers.setdefault(loop, {})
+    if interval not in by_interval:
+        by_interval[interval] = _FlushTicker(loop, interval)
+    return by_interval[interval]
+
+
+async def sse_events(
+    request: Optional[Request],
+    chunks: AsyncGenerator[str, None],
+    flush_interval_ms: float = SSE_FLUSH_INTERVAL_MS,
+    flush_bytes: int = SSE_FLUSH_BYTES,
+    heartbeat_interval: float = SSE_HEARTBEAT_INTERVAL,
+) -> AsyncIterator[bytes]:
+    """SSE frames for `chunks`, stopping the chunks when `request`'s client disconnects."""
+    loop = asyncio.get_running_loop()
+    # The producer task buffers chunks and sets `ready` only when a frame is due,
+    # so the response task wakes once per frame rather than once per chunk.
+    ready = asyncio.Event()
+    ticker = _ticker(loop, flush_interval_ms / 1000) if flush_interval_ms > 0 else None
+    buffer = []
+    state = {"size": 0, "ended": False, "error": None, "gone": False, "heartbeat": False}
+
+    async def produce():
+        try:
+            async for chunk in chunks:
+                if not buffer and ticker is not None:
+                    ticker.add(ready)
+                buffer.append(chunk)
+                state["size"] += len(chunk)
+                if ticker is None or state["size"] >= flush_bytes:
+                    ready.set()
+            state["ended"] = True
+        except Exception as e:
+            state["error"] = e
+        ready.set()
+
+    async def watch():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        producer.cancel()
+        state["gone"] = True
+        ready.set()
+
+    last_write = loop.time()
+    heartbeat = None
+
+    def beat():
+        nonlocal heartbeat
+        idle = loop.time() - last_write
+        if idle >= heartbeat_interval:
+            state["heartbeat"] = True
+            ready.set()
+            idle = 0.0
+        heartbeat = loop.call_later(heartbeat_interval - idle, beat)
+
+    producer = asyncio.create_task(produce())
+    watcher = asyncio.create_task(watch()) if request is not None else None
+    if heartbeat_interval > 0:
+        heartbeat = loop.call_later(heartbeat_interval, beat)
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            if state["gone"]:
+                print("Client disconnected, cancelled its stream")
+                return
+            if buffer:
+                text = buffer[0] if len(buffer) == 1 else "".join(buffer)
+                buffer.clear()
+                state["size"] = 0
+                state["heartbeat"] = False
+                last_write = loop.time()
+                yield content_frame(text)
+            elif state["heartbeat"]:
+                state["heartbeat"] = False
+                last_write = loop.time()
+                yield HEARTBEAT_FRAME
+            if state["ended"]:
+                yield DONE_FRAME
+                return
+            if state["error"] is not None:
+                print(f"Stream error: {state['error']}")
+                yield error_frame(str(state["error"]))
+                return
+    finally:
+        if ticker is not None:
+            ticker.discard(ready)
+        if heartbeat is not None:
+            heartbeat.cancel()
+        tasks = [t for t in (producer, watcher) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await chunks.aclose()
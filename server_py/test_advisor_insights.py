@@ -0,0 +1,68 @@
+"""
+Advisor insights check (/api/advisor/insights, TransactionColumns.from_dicts).
+
+Posts client-shaped transactions to the insights endpoint with a fake model
+that records the prompt, and checks that:
+- rows without a transaction_id, with malformed dates or non-numeric amounts
+  still produce a summary instead of a 500;
+- a category sent as a single string counts as that category, not as its
+  characters, in "Top Spending Categories";
+- a body whose transactions aren't a list is rejected with 400.
+"""
+
+import asyncio
+import os
+import tempfile
+from types import SimpleNamespace
+
+import httpx
+
+
+class RecordingDedalus:
+    def __init__(self):
+        self.prompts = []
+
+    async def chat_completion(self, model, messages, stream=False, **kwargs):
+        self.prompts.append(messages[-1]["content"])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"Summary {len(self.prompts)}."))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20),
+        )
+
+
+async def test_advisor_insights():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "advisor_insights.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    import main
+
+    fake = RecordingDedalus()
+    main.chat_service.dedalus_client = fake
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+        print("\n--- Malformed rows ---")
+        transactions = [
+            {"name": "Corner Cafe", "amount": 4.5, "date": "2026-10-01", "category": ["Food and Drink", "Coffee"]},
+            {"transaction_id": "t2", "name": "Bookshop", "amount": "18.25", "date": "10/02/2026", "category": ["Shops"]},
+            {"transaction_id": "t3", "name": "Taxi", "amount": "n/a", "date": None, "category": "Travel"},
+            {"transaction_id": "t4", "name": "Diner", "amount": 12, "date": "2026-10-03", "category": "Food and Drink"},
+        ]
+        r = await api.post("/api/advisor/insights", json={"transactions": transactions})
+        ok = r.status_code == 200 and r.json().get("behavioral_summary", "").startswith("Summary")
+        print(f"{'✅' if ok else '❌'} Rows without an id, with a bad date or amount: {r.status_code} {r.json()}")
+
+        prompt = fake.prompts[-1] if fake.prompts else ""
+        categories = prompt.split("Top Spending Categories:", 1)[-1].split("User Profile:", 1)[0]
+        ok = ("- Food and Drink: $16.50 across 2 transactions" in categories
+              and "- Shops: $18.25 across 1 transactions" in categories and "- T:" not in categories)
+        listed = "; ".join(line.strip() for line in categories.strip().splitlines())
+        print(f"{'✅' if ok else '❌'} String categories count whole: {listed}")
+        ok = "- N/A: Bookshop $18.25 (Shops)" in prompt and "- 2026-10-01: Corner Cafe $4.5 (Food and Drink)" in prompt
+        print(f"{'✅' if ok else '❌'} Unparseable dates are listed as N/A")
+
+        print("\n--- Invalid body ---")
+        r = await api.post("/api/advisor/insights", json={"transactions": "not a list"})
+        print(f"{'✅' if r.status_code == 400 else '❌'} Non-list transactions rejected: {r.status_code} {r.json()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_advisor_insights())
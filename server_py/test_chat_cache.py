@@ -0,0 +1,126 @@
+"""
+Advisor chat cache check.
+
+Runs /api/advisor/chat in-process against a fake streaming model (150ms to the
+first token, then 20ms per token). It checks four things:
+- A near-duplicate of an earlier question is replayed immediately with the
+  same text.
+- A different question, a different user or changed financial data still go
+  to the model.
+- Questions that differ only in an amount never match.
+- A failed stream is never cached, nor is a deep analysis with a failed step.
+- A replayed deep analysis leaves out the original run's step timing.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import httpx
+
+FIRST_TOKEN_LATENCY = 0.15
+TOKEN_LATENCY = 0.02
+
+
+class FakeStreamingDedalus:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def chat_completion(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("upstream unavailable")
+        question = messages[-1]["content"]
+
+        async def tokens():
+            await asyncio.sleep(FIRST_TOKEN_LATENCY)
+            for word in f"Answer {self.calls} to: {question}".split():
+                await asyncio.sleep(TOKEN_LATENCY)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+        return tokens()
+
+
+async def ask(api, question, user="alice", context="Food: $420 this month"):
+    start = time.perf_counter()
+    text = ""
+    async with api.stream("POST", "/api/advisor/chat", headers={"X-User-Id": user}, json={
+        "messages": [{"role": "user", "content": question}], "financialContext": context, "surveyContext": "",
+    }) as r:
+        async for line in r.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            text += json.loads(line[6:]).get("choices", [{}])[0].get("delta", {}).get("content", "")
+    return text, (time.perf_counter() - start) * 1000
+
+
+async def test_chat_cache():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "chat_cache.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    import main
+
+    fake = FakeStreamingDedalus()
+    main.chat_service.dedalus_client = fake
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as api:
+        print("\n--- Near-duplicate replay ---")
+        original, cold_ms = await ask(api, "How much did I spend on food?")
+        replayed, warm_ms = await ask(api, "how much did i spend on FOOD")
+        print(f"response: cold {cold_ms:.0f}ms, replay {warm_ms:.1f}ms; model calls {fake.calls}")
+        if replayed == original and fake.calls == 1 and warm_ms < 50:
+            print("✅ Near-duplicate question replayed from cache.")
+        else:
+            print("❌ Near-duplicate question was not replayed.")
+
+        await ask(api, "What's my budget?")
+        calls = fake.calls
+        await ask(api, "what is my budget")
+        print(f"{'✅' if fake.calls == calls else '❌'} Contraction variant hits the cache.")
+
+        print("\n--- Misses ---")
+        for label, kwargs in [
+            ("different question", {"question": "How much did I spend on travel?"}),
+            ("different user", {"question": "How much did I spend on food?", "user": "bob"}),
+            ("changed financial data", {"question": "How much did I spend on food?", "context": "Food: $515 this month"}),
+        ]:
+            calls = fake.calls
+            await ask(api, **kwargs)
+            print(f"{'✅' if fake.calls == calls + 1 else '❌'} {label} goes to the model.")
+
+        await ask(api, "Can I save $500 a month for a new car in two years?")
+        calls = fake.calls
+        await ask(api, "Can I save $600 a month for a new car in two years?")
+        print(f"{'✅' if fake.calls == calls + 1 else '❌'} Different amount goes to the model.")
+
+        print("\n--- Failures are not cached ---")
+        fake.fail = True
+        await ask(api, "Should I pay off my credit card first?")
+        fake.fail = False
+        calls = fake.calls
+        text, _ = await ask(api, "Should I pay off my credit card first?")
+        print(f"{'✅' if fake.calls == calls + 1 and 'Error' not in text else '❌'} Question retried after a failed stream.")
+
+        analysis = "Analyze my spending and plan my savings"
+        fake.fail = True
+        text, _ = await ask(api, analysis)
+        fake.fail = False
+        calls = fake.calls
+        text, _ = await ask(api, analysis)
+        ok = fake.calls > calls and "failed" not in text and "skipped" not in text
+        print(f"{'✅' if ok else '❌'} Deep analysis re-run after a failed step ({fake.calls - calls} model calls)")
+
+        calls = fake.calls
+        replay, _ = await ask(api, analysis)
+        ok = fake.calls == calls and "Step timing" in text and "Step timing" not in replay
+        print(f"{'✅' if ok else '❌'} Deep analysis replayed without the original run's step timing")
+
+        stats = (await api.get("/api/advisor/chat-cache-stats")).json()
+        print(f"\nStats: {stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_chat_cache())
@@ -0,0 +1,156 @@
+"""
+Client disconnect check for /api/advisor/chat.
+
+Serves the app and a mock OpenAI-compatible streaming model with uvicorn in
+one event loop. The mock streams a long reply slowly and records when each of
+its responses stops being read. The test starts advisor chats over real HTTP,
+reads a few SSE frames and then disconnects. It checks that:
+- a plain chat's upstream model stream is closed within CLOSE_BOUND seconds;
+- in a deep analysis workflow, the running step's stream is closed within
+  that bound, and later steps never start.
+
+Both checks run twice: as uvicorn serves the app (ASGI spec 2.3, where
+Starlette also watches for disconnects), and marked as ASGI 2.4, where
+Starlette relies on writes failing instead.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from openai import AsyncOpenAI
+
+CLOSE_BOUND = 1.0
+TOKEN_INTERVAL = 0.05
+REPLY_TOKENS = 200  # ~10s of output if nobody stops it
+
+
+class MockModel:
+    """Streams chat completions in the OpenAI SSE format and logs each stream's lifetime."""
+
+    def __init__(self):
+        self.app = FastAPI()
+        self.streams = []  # {"model", "opened", "closed", "tokens"}
+        self.app.post("/v1/chat/completions")(self.completions)
+
+    async def completions(self, request: Request):
+        body = await request.json()
+        record = {"model": body["model"], "opened": time.perf_counter(), "closed": None, "tokens": 0}
+        self.streams.append(record)
+
+        async def events():
+            try:
+                for i in range(REPLY_TOKENS):
+                    chunk = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                             "choices": [{"index": 0, "delta": {"content": f"tok{i} "}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    record["tokens"] += 1
+                    await asyncio.sleep(TOKEN_INTERVAL)
+                yield "data: [DONE]\n\n"
+            finally:
+                record["closed"] = time.perf_counter()
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def serve(app):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+async def chat_then_disconnect(base_url, question, frames):
+    """Read `frames` content frames of an advisor chat reply, then drop the connection."""
+    payload = {"messages": [{"role": "user", "content": question}], "financialContext": "", "surveyContext": ""}
+    received = []
+    async with httpx.AsyncClient(timeout=10) as client:
+        async with client.stream("POST", f"{base_url}/api/advisor/chat", json=payload) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data: {"):
+                    received.append(json.loads(line[6:])["choices"][0]["delta"]["content"])
+                    if len(received) >= frames:
+                        break
+    return received, time.perf_counter()
+
+
+def as_asgi_2_4(app):
+    async def wrapped(scope, receive, send):
+        if scope["type"] == "http":
+            scope = {**scope, "asgi": {**scope.get("asgi", {}), "spec_version": "2.4"}}
+        await app(scope, receive, send)
+    return wrapped
+
+
+async def wait_closed(streams, timeout):
+    deadline = time.perf_counter() + timeout
+    while any(s["closed"] is None for s in streams) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def test_chat_disconnect():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "disconnect.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    import main
+
+    mock = MockModel()
+    mock_server, mock_task, mock_url = await serve(mock.app)
+    main.chat_service.dedalus_client.client = AsyncOpenAI(base_url=f"{mock_url}/v1", api_key="test")
+    try:
+        for label, app in (("ASGI 2.3", main.app), ("ASGI 2.4", as_asgi_2_4(main.app))):
+            app_server, app_task, app_url = await serve(app)
+            try:
+                await check_disconnects(label, mock, app_url)
+            finally:
+                app_server.should_exit = True
+                await app_task
+    finally:
+        mock_server.should_exit = True
+        await mock_task
+
+
+async def check_disconnects(label, mock, app_url):
+    print(f"\n--- Plain chat ({label}) ---")
+    mock.streams.clear()
+    received, left_at = await chat_then_disconnect(app_url, "Any tips for today?", frames=4)
+    await wait_closed(mock.streams, CLOSE_BOUND * 3)
+    stream = mock.streams[-1]
+    closed_after = stream["closed"] - left_at if stream["closed"] else None
+    print(f"Read {len(received)} frames, then disconnected; upstream sent {stream['tokens']}/{REPLY_TOKENS} tokens")
+    if closed_after is not None and closed_after < CLOSE_BOUND:
+        print(f"✅ Upstream stream closed {closed_after * 1000:.0f}ms after the client left.")
+    else:
+        print(f"❌ Upstream stream still open {CLOSE_BOUND * 3:.0f}s after the client left.")
+
+    print(f"\n--- Deep analysis workflow ({label}) ---")
+    mock.streams.clear()
+    received, left_at = await chat_then_disconnect(app_url, "Analyze my spending and plan my savings", frames=5)
+    await wait_closed(mock.streams, CLOSE_BOUND * 3)
+    await asyncio.sleep(0.3)  # give a wrongly surviving workflow time to start its next step
+    models = [s["model"] for s in mock.streams]
+    latest_close = max((s["closed"] or float("inf")) for s in mock.streams)
+    print(f"Read {len(received)} frames, then disconnected; upstream requests: {models}")
+    if latest_close - left_at < CLOSE_BOUND and "openai/gpt-4o" not in models:
+        print(f"✅ Running step's stream closed {(latest_close - left_at) * 1000:.0f}ms after the client left; "
+              f"the plan step never started.")
+    else:
+        print("❌ Workflow kept running after the client left.")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_chat_disconnect())
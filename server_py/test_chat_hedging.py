@@ -0,0 +1,141 @@
+"""
+Hedged chat streaming check.
+
+Streams advisor chat replies from a fake model provider in which each model
+has its own first-token latency, and checks:
+- a model that answers within the first-token deadline is used alone;
+- a model that misses the deadline is hedged with the other model in its
+  class. The faster stream is used and the slower one is cancelled;
+- a model that fails before its first token fails over instead of surfacing
+  an error;
+- losing a race leaves the loser's breaker alone and only records a lower
+  bound on its first-token latency;
+- the SSE reply looks the same either way, and /api/advisor/model-stats
+  counts the hedges.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import httpx
+
+DEADLINE = 0.2
+FAST_QUESTION = "Any tips for today?"  # fast class: gpt-4o-mini, then gemini-2.0-flash
+
+
+class FakeProvider:
+    def __init__(self):
+        self.ttft = {"openai/gpt-4o-mini": 0.05, "google/gemini-2.0-flash": 0.05}
+        self.failing = set()
+        self.calls = []
+        self.cancelled = []
+
+    async def chat_completion(self, model, messages, stream=False, **kwargs):
+        self.calls.append(model)
+        if model in self.failing:
+            raise RuntimeError(f"{model} unavailable")
+
+        async def tokens():
+            try:
+                await asyncio.sleep(self.ttft[model])
+                for word in "Cook at home twice a week.".split():
+                    yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+                    await asyncio.sleep(0.01)
+            except (asyncio.CancelledError, GeneratorExit):
+                self.cancelled.append(model)
+                raise
+        return tokens()
+
+
+async def ask(service, question=FAST_QUESTION):
+    start = time.perf_counter()
+    reply = "".join([chunk async for chunk in service.get_response_stream([{"role": "user", "content": question}])])
+    return reply, time.perf_counter() - start
+
+
+async def test_chat_hedging():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "hedging.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    import main
+    from model_health import ModelHealth
+
+    service = main.chat_service
+    provider = FakeProvider()
+    service.dedalus_client = provider
+    service.router.health = ModelHealth(explore_rate=0.0)
+    service.hedge_deadline = DEADLINE
+
+    print("\n--- Within the deadline ---")
+    baseline, elapsed = await ask(service)
+    print(f"{'✅' if provider.calls == ['openai/gpt-4o-mini'] else '❌'} "
+          f"{elapsed:.2f}s, models called: {provider.calls}")
+
+    print("\n--- First token misses the deadline ---")
+    provider.calls.clear()
+    provider.ttft["openai/gpt-4o-mini"] = 1.5
+    reply, elapsed = await ask(service)
+    await asyncio.sleep(0)
+    ok = (provider.calls == ["openai/gpt-4o-mini", "google/gemini-2.0-flash"]
+          and provider.cancelled == ["openai/gpt-4o-mini"] and elapsed < 0.5 and reply == baseline)
+    print(f"{'✅' if ok else '❌'} Reply in {elapsed:.2f}s (slow model alone: 1.5s+); "
+          f"called {provider.calls}, cancelled {provider.cancelled}")
+
+    print("\n--- Both slow: the chosen model still wins its race ---")
+    provider.calls.clear()
+    provider.cancelled.clear()
+    service.router.health = ModelHealth(explore_rate=0.0)
+    provider.ttft.update({"openai/gpt-4o-mini": 0.3, "google/gemini-2.0-flash": 0.6})
+    reply, elapsed = await ask(service)
+    ok = provider.cancelled == ["google/gemini-2.0-flash"] and reply == baseline
+    print(f"{'✅' if ok else '❌'} Reply in {elapsed:.2f}s from the chosen model; cancelled {provider.cancelled}")
+
+    print("\n--- Losing the race is not a success ---")
+    provider.calls.clear()
+    provider.cancelled.clear()
+    health = service.router.health = ModelHealth(explore_rate=0.0)
+    provider.ttft.update({"openai/gpt-4o-mini": 1.5, "google/gemini-2.0-flash": 0.05})
+    for _ in range(2):
+        health.record("openai/gpt-4o-mini", ok=False)
+    await ask(service)
+    stats = health.stats()["openai/gpt-4o-mini"]
+    health.record("openai/gpt-4o-mini", ok=False)
+    ok = (provider.cancelled == ["openai/gpt-4o-mini"] and stats["ttft_p50_ms"] >= DEADLINE * 1000
+          and stats["error_rate"] == 1.0 and health.stats()["openai/gpt-4o-mini"]["breaker"] == "open")
+    print(f"{'✅' if ok else '❌'} Loser kept its 2 failures (a 3rd opens the breaker), "
+          f"TTFT lower bound {stats['ttft_p50_ms']}ms: {stats}")
+
+    print("\n--- Failure before the first token ---")
+    provider.calls.clear()
+    provider.ttft.update({"openai/gpt-4o-mini": 0.05, "google/gemini-2.0-flash": 0.05})
+    service.router.health = ModelHealth(explore_rate=0.0)
+    provider.failing.add("openai/gpt-4o-mini")
+    reply, elapsed = await ask(service)
+    ok = reply == baseline and "Error" not in reply
+    print(f"{'✅' if ok else '❌'} Failed over to {provider.calls[-1]} in {elapsed:.2f}s without an error reply")
+    provider.failing.clear()
+
+    print("\n--- SSE client and metrics ---")
+    service.router.health = ModelHealth(explore_rate=0.0)
+    provider.ttft["openai/gpt-4o-mini"] = 1.5
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+        body = (await api.post("/api/advisor/chat", json={
+            "messages": [{"role": "user", "content": FAST_QUESTION}], "financialContext": "", "surveyContext": "",
+        })).text
+        hedging = (await api.get("/api/advisor/model-stats")).json()["hedging"]
+    content = "".join(
+        json.loads(line[6:])["choices"][0]["delta"].get("content", "")
+        for line in body.splitlines() if line.startswith("data: {")
+    )
+    print(f"{'✅' if content == baseline else '❌'} SSE reply identical to an unhedged one: {content!r}")
+    print(f"Hedging stats: {hedging}")
+    ok = hedging["hedged"] == 4 and hedging["failovers"] == 1 and hedging["backup_wins"] == 4
+    print(f"{'✅' if ok else '❌'} /api/advisor/model-stats counts hedges, failovers and wins.")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_chat_hedging())
@@ -0,0 +1,193 @@
+"""
+Advisor context builder check (context_builder.py).
+
+Builds the financial context exactly as the app's getFinancialContext
+(lib/finance-context.tsx) writes it, and checks that:
+- every section is parsed: accounts, spending, transactions with categories
+  and locations, budgets, danger zones and the purchase prediction;
+- with a tight FINANCIAL_CONTEXT_TOKEN_BUDGET the oldest transactions are
+  dropped first, while the category totals still cover all of them;
+- build() keeps the prompt within CHAT_CONTEXT_TOKEN_BUDGET, sends the newest
+  messages verbatim and summarizes the oldest turns first, including the
+  summary message's own header and framing;
+- a long survey context is truncated to SURVEY_CONTEXT_TOKEN_BUDGET, and the
+  advisor's request stays within the budget however large both contexts are.
+"""
+
+import asyncio
+import os
+import tempfile
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+MERCHANTS = [("Starbucks", "Food and Drink, Coffee Shop"), ("Amazon", "Shops, Digital Purchase"),
+             ("Uber", "Travel, Taxi"), ("Whole Foods", "Shops, Supermarkets and Groceries"),
+             ("Netflix", "Service, Subscription")]
+
+
+def money(value):
+    """JavaScript's toLocaleString() for en-US numbers."""
+    return f"{value:,.2f}".rstrip("0").rstrip(".") if value != int(value) else f"{int(value):,}"
+
+
+def financial_context():
+    """The text getFinancialContext() sends: the newest 15 transactions, newest first."""
+    today = date(2026, 10, 19)
+    transactions = [
+        (str(today - timedelta(days=i)), *MERCHANTS[i % len(MERCHANTS)], 4.5 + 11 * i)
+        for i in range(15)
+    ]
+    context = f"Net Worth: ${money(12840.55)}\n\nAccounts:\n"
+    context += f"- Plaid Checking (depository): ${money(2110.35)}\n- Plaid Saving (depository): ${money(10730.2)}\n"
+    context += f"\nRecent Spending (7 days): ${sum(t[3] for t in transactions):.2f}\n"
+    context += f"Number of transactions: {len(transactions)}\n"
+    context += "\nRecent Transactions:\n"
+    for i, (day, name, category, amount) in enumerate(transactions):
+        location = " (San Francisco, CA)" if i % 2 else " (, )"
+        context += f"- {day}: {name} ${amount:.2f} [{category}]{location}\n"
+    context += "\nMonthly Budgets:\n- Food & Drink: $182.50 / $300 (61%)\n- Shopping: $420.00 / $400 (105%)\n"
+    context += "\nDanger Zones (locations with high regret spending):\n"
+    context += "- Starbucks: 4 regretted purchases (37.776, -122.417)\n"
+    context += "\nPurchase Prediction: 72% probability (high risk) — NUDGE ACTIVE\n"
+    return context, transactions
+
+
+def survey_context(repeat=1):
+    """The shape of getSurveyContext(); `repeat` lengthens the behavioral summary."""
+    summary = " ".join(["You order delivery late at night after long work days and regret it the next morning."] * repeat)
+    return f"""
+spending_profile:
+  regret_triggers: Late-night delivery
+  goals: Emergency fund of $5,000
+  watch_categories: Food and Drink, Shops
+
+behavioral_insights:
+  summary: "{summary}"
+  high_regret_areas: [Food and Drink (Avg Score: 71), Shops (Avg Score: 58)]
+"""
+
+
+def conversation(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question {i}: how can I spend less on takeout this month?"})
+        messages.append({"role": "assistant", "content": f"Answer {i}: " + "Cook twice a week and set a delivery cap. " * 12})
+    messages.append({"role": "user", "content": "And what should I do about my Amazon orders?"})
+    return messages
+
+
+class CapturingDedalus:
+    def __init__(self):
+        self.requests = []
+
+    async def chat_completion(self, model, messages, stream=False, **kwargs):
+        self.requests.append(messages)
+
+        async def tokens():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Noted."))])
+
+        return tokens()
+
+
+def test_parsing_and_trimming(context_builder):
+    from context_builder import ContextBuilder, count_tokens
+
+    print("\n--- Financial context parsing ---")
+    text, transactions = financial_context()
+    data = context_builder._parse_financial_context(text)
+    parsed = [(d, n, a) for d, n, a, _ in data["transactions"]]
+    ok = (data["net_worth"] == "$12,840.55" and len(data["accounts"]) == 2
+          and parsed == [(d, n, a) for d, n, _, a in transactions]
+          and {c for *_, c in data["transactions"]} == {c.split(",")[0] for _, c in MERCHANTS}
+          and len(data["budgets"]) == 2 and data["danger_zones"] == ["Starbucks: 4 regretted purchases"]
+          and data["prediction"].endswith("NUDGE ACTIVE") and not data["other"])
+    print(f"{'✅' if ok else '❌'} Parsed {len(parsed)} transactions, {len(data['accounts'])} accounts, "
+          f"{len(data['budgets'])} budgets and the prediction; unparsed lines: {data['other']}")
+
+    full = ContextBuilder(financial_budget=2000).compact_financial_context(text)
+    ok = "recent_transactions" in full and "omitted" not in full and all(n in full for _, n, _, _ in transactions)
+    print(f"{'✅' if ok else '❌'} With room to spare every transaction is kept ({count_tokens(full)} tokens)")
+
+    print("\n--- Trimming to the financial budget ---")
+    budget = 180
+    builder = ContextBuilder(financial_budget=budget)
+    compact = builder.compact_financial_context(text)
+    listed = compact.split("recent_transactions (date merchant amount category): ", 1)[1].split("\n", 1)[0].split("; ")
+    kept_days = [entry.split(" ", 1)[0] for entry in listed]
+    newest_days = [day[5:] for day, *_ in transactions[:len(listed)]]
+    omitted = f"({len(transactions) - len(listed)} older transactions omitted; included in totals)"
+    totals = compact.split("spend_by_category: ", 1)[1].split("\n", 1)[0].split("; ")
+    travel = sum(amount for _, _, category, amount in transactions if category.startswith("Travel"))
+    ok = (count_tokens(compact) <= budget and 0 < len(listed) < len(transactions) and kept_days == newest_days
+          and omitted in compact and f"Travel ${travel:.2f} (3)" in totals)
+    print(f"{'✅' if ok else '❌'} {count_tokens(compact)}/{budget} tokens: kept the newest {len(listed)} of "
+          f"{len(transactions)} transactions; totals still cover all of them")
+    print(f"{'✅' if builder.compact_financial_context(text) is compact else '❌'} Unchanged context reuses the "
+          f"memoized block ({builder.stats()['compaction_reuses']} reuse)")
+
+
+def test_build(context_builder):
+    from context_builder import ContextBuilder, message_tokens
+
+    print("\n--- Message history ---")
+    builder = ContextBuilder(token_budget=900)
+    system = "You are Origin, a professional AI financial advisor."
+    previous = 0
+    for turns in (1, 5, 15, 40):
+        messages = conversation(turns)
+        result, report = builder.build(system, messages)
+        window = result[-report["kept_messages"]:]
+        summary = result[1]["content"] if report["summarized_messages"] else ""
+        # Questions named in the summary: the oldest ones, in order (a long summary is cut at its end)
+        named = [i for i in range(turns) if f"Question {i}:" in summary]
+        ok = (report["prompt_tokens"] == message_tokens(result) <= builder.token_budget
+              and window == messages[-report["kept_messages"]:]
+              and report["summarized_messages"] + report["kept_messages"] == len(messages)
+              and report["summarized_messages"] >= previous
+              and named == list(range(len(named))) and len(named) <= report["summarized_messages"] // 2
+              and bool(named) == bool(report["summarized_messages"]))
+        previous = report["summarized_messages"]
+        print(f"{'✅' if ok else '❌'} {len(messages)} messages: {report['prompt_tokens']}/{builder.token_budget} "
+              f"tokens, newest {report['kept_messages']} verbatim, oldest {report['summarized_messages']} summarized")
+
+
+async def test_survey_context(context_builder):
+    from context_builder import ContextBuilder, count_tokens, message_tokens
+
+    print("\n--- Survey context ---")
+    builder = ContextBuilder(survey_budget=120)
+    short = builder.compact_survey_context(survey_context())
+    long = builder.compact_survey_context(survey_context(repeat=40))
+    ok = (short == "\n".join(line for line in survey_context().strip().splitlines() if line.strip())
+          and count_tokens(long) <= 120 and long.endswith(" …") and long.startswith("spending_profile:"))
+    print(f"{'✅' if ok else '❌'} Short survey kept as is ({count_tokens(short)} tokens); a "
+          f"{count_tokens(survey_context(repeat=40))}-token survey truncated to {count_tokens(long)}")
+
+    import main
+    fake = CapturingDedalus()
+    service = main.chat_service
+    service.dedalus_client = fake
+    text, _ = financial_context()
+    huge_financial = text.replace("Purchase Prediction:", "Notes: " + "spends on weekends " * 400 + "\nPurchase Prediction:")
+    messages = conversation(20)
+    reply = "".join([chunk async for chunk in service.get_response_stream(messages, huge_financial, survey_context(repeat=80))])
+    sent = fake.requests[-1]
+    budget = service.context_builder.token_budget
+    ok = ("Noted." in reply and message_tokens(sent) <= budget and sent[-1] == messages[-1]
+          and "regret_triggers: Late-night delivery" in sent[0]["content"])
+    print(f"{'✅' if ok else '❌'} Advisor request with oversized financial and survey contexts: "
+          f"{message_tokens(sent)}/{budget} tokens, system prompt {count_tokens(sent[0]['content'])}")
+
+
+async def run():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "context_builder.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    import context_builder
+
+    test_parsing_and_trimming(context_builder)
+    test_build(context_builder)
+    await test_survey_context(context_builder)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
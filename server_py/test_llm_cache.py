@@ -0,0 +1,108 @@
+"""
+LLM response cache check.
+
+Replaces the Dedalus client with a fake that takes 300ms and reports token
+usage, then checks that repeated survey analyses and behavioral summaries are
+answered from the cache in milliseconds without calling the model, that
+changed inputs or a bumped prompt version miss, that an unparseable survey
+answer or an empty behavioral summary is never cached, and that the stats report hit rate and tokens saved.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+MODEL_LATENCY = 0.3
+
+
+class FakeDedalus:
+    def __init__(self):
+        self.calls = 0
+        self.summary = "You spend most on food delivery late at night."
+        self.reply = json.dumps({"spending_regret": "Late-night delivery", "user_goals": "Emergency fund",
+                                 "top_categories": ["Food and Drink", "Shops", "Travel", "Recreation", "Service"]})
+
+    async def chat_completion(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(MODEL_LATENCY)
+        content = self.reply if model == "openai/gpt-4o" else self.summary
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=400, completion_tokens=120),
+        )
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def test_llm_cache():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    import chat
+    from chat import ChatService
+
+    service = ChatService()
+    fake = FakeDedalus()
+    service.dedalus_client = fake
+    answers = {"regret": "Takeout", "goal": "Save for a house"}
+    transactions = [
+        {"transaction_id": f"t{i}", "date": "2026-10-01", "name": "DoorDash", "amount": 20 + i, "category": ["Food and Drink"]}
+        for i in range(30)
+    ]
+    profile = {"spending_regret": "Takeout", "user_goals": "House", "top_categories": ["Food and Drink"]}
+
+    print("\n--- Survey analysis ---")
+    first, cold_ms = await timed(service.analyze_survey(answers, "Balance $2,000"))
+    # Same answers in a different key order still hit
+    second, warm_ms = await timed(service.analyze_survey(dict(reversed(list(answers.items()))), "Balance $2,000"))
+    print(f"cold {cold_ms:.0f}ms, warm {warm_ms:.1f}ms, model calls {fake.calls}")
+    if first == second and fake.calls == 1 and warm_ms < 50:
+        print("✅ Repeated survey analysis served from cache.")
+    else:
+        print("❌ Repeated survey analysis called the model again or was slow.")
+
+    await service.analyze_survey(answers, "Balance $5,000")
+    print(f"{'✅' if fake.calls == 2 else '❌'} Different financial context misses the cache.")
+
+    print("\n--- Behavioral summary ---")
+    await service.generate_behavioral_summary(transactions, profile)
+    summary, warm_ms = await timed(service.generate_behavioral_summary(transactions, profile))
+    print(f"warm {warm_ms:.1f}ms, model calls {fake.calls}")
+    print(f"{'✅' if fake.calls == 3 and warm_ms < 50 else '❌'} Repeated behavioral summary served from cache.")
+
+    chat.BEHAVIORAL_SUMMARY_PROMPT_VERSION = "behavioral-summary-v2"
+    await service.generate_behavioral_summary(transactions, profile)
+    print(f"{'✅' if fake.calls == 4 else '❌'} Bumped prompt version misses the cache.")
+
+    print("\n--- Invalid responses ---")
+    fake.reply = "not json"
+    other = {"regret": "Gadgets"}
+    await service.analyze_survey(other)
+    await service.analyze_survey(other)
+    print(f"{'✅' if fake.calls == 6 else '❌'} Unparseable survey answer was not cached ({fake.calls - 4} calls).")
+
+    for empty in (None, "", "  \n"):
+        fake.summary = empty
+        calls = fake.calls
+        first = await service.generate_behavioral_summary(transactions[:5], profile)
+        second = await service.generate_behavioral_summary(transactions[:5], profile)
+        ok = fake.calls == calls + 2 and first == second == "Unable to generate summary at this time. Please try again later."
+        print(f"{'✅' if ok else '❌'} Empty behavioral summary ({empty!r}) was not cached ({fake.calls - calls} calls).")
+
+    stats = service.llm_cache.stats()
+    print(f"\nStats: hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']} "
+          f"tokens_saved={stats['tokens_saved']}")
+    if stats["hits"] == 2 and stats["tokens_saved"] == 2 * 520:
+        print("✅ Stats report hits and tokens saved.")
+    else:
+        print("❌ Unexpected stats.")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_llm_cache())
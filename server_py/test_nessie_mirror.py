@@ -0,0 +1,212 @@
+"""
+Nessie mirror check.
+
+Serves a fake Nessie API through httpx.MockTransport, mirrors one customer into
+a throwaway database, then changes the upstream data (an edited purchase, a
+removed deposit, a new withdrawal) and checks that the re-sync writes only
+those rows. A transfer between two of the customer's accounts (listed under
+both with one _id) must be mirrored under each and stay unchanged on re-sync.
+Then compares snapshot latency from the mirror with a live
+snapshot against the same upstream with a few ms of latency per call.
+Finally checks that of two background loops sharing the database only the
+lease holder syncs, and that source=auto serves the mirror only while such a
+loop runs and the mirror is younger than its max age.
+"""
+
+import asyncio
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+ACCOUNTS = 20
+UPSTREAM_LATENCY = 0.005
+
+
+class FakeNessie:
+    def __init__(self):
+        self.calls = 0
+        self.customer = {"_id": "cust_1", "first_name": "Mirror", "last_name": "Test"}
+        self.accounts = [{"_id": f"acc_{i}", "type": "Checking", "balance": 1000 + i} for i in range(ACCOUNTS)]
+        self.items = {}
+        for a in self.accounts:
+            for kind in ("bills", "deposits", "loans", "purchases", "transfers", "withdrawals"):
+                self.items[(a["_id"], kind)] = [
+                    {"_id": f"{a['_id']}_{kind}_{i}", "amount": 10 + i, "status": "executed",
+                     "purchase_date" if kind == "purchases" else "transaction_date": f"2026-09-{10 + i:02d}"}
+                    for i in range(5)
+                ]
+
+    async def handle(self, request):
+        self.calls += 1
+        await asyncio.sleep(UPSTREAM_LATENCY)
+        parts = request.url.path.strip("/").split("/")
+        if parts == ["customers"]:
+            return httpx.Response(200, json=[self.customer])
+        if parts[0] == "customers" and len(parts) == 2:
+            return httpx.Response(200, json=self.customer)
+        if parts[0] == "customers":
+            return httpx.Response(200, json=self.accounts)
+        if len(parts) == 2:
+            return httpx.Response(200, json=next(a for a in self.accounts if a["_id"] == parts[1]))
+        if parts[2] == "customer":
+            return httpx.Response(200, json=self.customer)
+        return httpx.Response(200, json=self.items.get((parts[1], parts[2]), []))
+
+
+async def test_nessie_mirror():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "mirror.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    sys.path.insert(0, SERVER_DIR)
+    import main
+    from nessie_client import NessieClient
+    from nessie_mirror import NessieMirror
+    from response_cache import ResponseCache
+
+    upstream = FakeNessie()
+    client = NessieClient(base_url="https://nessie.test", cache=ResponseCache(ttl=60, name="test"))
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url=client.base_url)
+    mirror = NessieMirror(client, interval=0)
+    main.nessie_client, main.nessie_mirror = client, mirror
+
+    print("\n--- Initial sync ---")
+    first = await mirror.sync_customer("cust_1")
+    print({k: first[k] for k in ("inserted", "updated", "deleted", "unchanged", "duration_ms")})
+    expected = 1 + ACCOUNTS + ACCOUNTS * 6 * 5
+    if first["inserted"] == expected and not first["errors"]:
+        print(f"✅ Mirrored {expected} rows.")
+    else:
+        print(f"❌ Expected {expected} inserted rows, got {first}")
+
+    print("\n--- Incremental sync ---")
+    upstream.items[("acc_0", "purchases")][0]["amount"] = 999
+    upstream.items[("acc_1", "deposits")].pop()
+    upstream.items[("acc_2", "withdrawals")].append(
+        {"_id": "acc_2_withdrawals_new", "amount": 40, "status": "pending", "transaction_date": "2026-10-01"}
+    )
+    second = await mirror.sync_customer("cust_1")
+    counts = {k: second[k] for k in ("inserted", "updated", "deleted")}
+    print(counts)
+    if counts == {"inserted": 1, "updated": 1, "deleted": 1}:
+        print("✅ Re-sync wrote only the changed rows.")
+    else:
+        print(f"❌ Unexpected re-sync counts: {counts}")
+
+    print("\n--- A failed sub-resource keeps its mirrored rows ---")
+    saved = copy.deepcopy(upstream.items)
+    original_handle = upstream.handle
+
+    async def failing(request):
+        if request.url.path == "/accounts/acc_3/purchases":
+            return httpx.Response(404, json={"message": "gone"})
+        return await original_handle(request)
+
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(failing), base_url=client.base_url)
+    third = await mirror.sync_customer("cust_1")
+    upstream.items = saved
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url=client.base_url)
+    if third["deleted"] == 0 and len(third["errors"]) == 1:
+        print("✅ Purchases for acc_3 were kept after the failed fetch.")
+    else:
+        print(f"❌ Unexpected result: deleted={third['deleted']} errors={third['errors']}")
+
+    print("\n--- Transfer between two of the customer's accounts ---")
+    transfer = {"_id": "transfer_between", "type": "p2p", "payer_id": "acc_4", "payee_id": "acc_5",
+                "amount": 75, "status": "executed", "transaction_date": "2026-10-02"}
+    upstream.items[("acc_4", "transfers")].append(dict(transfer))
+    upstream.items[("acc_5", "transfers")].append(dict(transfer))
+    added = await mirror.sync_customer("cust_1")
+    resync = await mirror.sync_customer("cust_1")
+    import database
+    snapshot = database.get_nessie_snapshot("cust_1", ["transfers"])
+    holders = [a["account"]["_id"] for a in snapshot["accounts"]
+               if any(t["_id"] == "transfer_between" for t in a["transfers"])]
+    changes = {k: resync[k] for k in ("inserted", "updated", "deleted")}
+    print(f"first sync inserted {added['inserted']}; re-sync {changes}; listed under {holders}")
+    if added["inserted"] == 2 and changes == {"inserted": 0, "updated": 0, "deleted": 0} and holders == ["acc_4", "acc_5"]:
+        print("✅ The transfer is mirrored under both accounts and the re-sync settles.")
+    else:
+        print("❌ The shared transfer moved between accounts or kept re-syncing.")
+
+    print("\n--- Reads from the mirror ---")
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as api:
+        r = await api.get("/api/capitalone/customer/cust_1/activity", params={"kind": "withdrawals", "limit": 1})
+        newest = r.json()["items"]
+        if newest and newest[0]["_id"] == "acc_2_withdrawals_new":
+            print("✅ Activity query returns the newest mirrored withdrawal.")
+        else:
+            print(f"❌ Unexpected activity result: {r.text[:300]}")
+
+        async def timed(source):
+            samples = []
+            for _ in range(5):
+                start = time.perf_counter()
+                r = await api.get("/api/capitalone/customer/cust_1/snapshot", params={"source": source, "refresh": source == "live"})
+                samples.append(time.perf_counter() - start)
+                assert r.status_code == 200 and len(r.json()["accounts"]) == ACCOUNTS, r.text[:200]
+            return sorted(samples)[2], r.json()
+
+        calls_before = upstream.calls
+        mirror_latency, mirrored = await timed("mirror")
+        mirror_calls = upstream.calls - calls_before
+        live_latency, live = await timed("live")
+        print(f"Snapshot ({ACCOUNTS} accounts): mirror {mirror_latency * 1000:.1f}ms with {mirror_calls} upstream calls, "
+              f"live {live_latency * 1000:.1f}ms")
+        same = all(
+            sorted(p["_id"] for p in m["purchases"]) == sorted(p["_id"] for p in l["purchases"])
+            for m, l in zip(mirrored["accounts"], live["accounts"])
+        )
+        if mirror_calls == 0 and mirror_latency < live_latency and same:
+            print("✅ Mirror snapshot matches live data without calling Nessie.")
+        else:
+            print("❌ Mirror snapshot was slower, called Nessie or differs from live data.")
+
+        r = await api.get("/api/capitalone/customer/cust_unknown/snapshot", params={"source": "mirror"})
+        print(f"{'✅' if r.status_code == 404 else '❌'} Unmirrored customer with source=mirror -> {r.status_code}")
+
+        print("\n--- source=auto and the background loop ---")
+        def auto(**params):
+            return api.get("/api/capitalone/customer/cust_1/snapshot", params={"include": "purchases", **params})
+
+        r = await auto()
+        print(f"{'✅' if r.json()['source'] == 'live' else '❌'} No mirror loop running: auto read {r.json()['source']}")
+
+        # Two server processes' loops over the same database
+        loops = [NessieMirror(client, interval=0.2), NessieMirror(client, interval=0.2)]
+        main.nessie_mirror = loops[0]
+        for loop in loops:
+            loop.start()
+        await asyncio.sleep(0.9)
+        runs = sorted(loop.stats()["background_runs"] for loop in loops)
+        print(f"{'✅' if runs[0] == 0 and runs[1] >= 3 else '❌'} Only the lease holder synced: runs per loop {runs}")
+
+        r = await auto()
+        lines = (await auto(format="ndjson")).text.splitlines()
+        header = json.loads(lines[0])
+        age = time.time() - r.json().get("mirrored_at", 0)
+        ok = r.json()["source"] == "mirror" and age < 1 and header.get("mirrored_at") == r.json()["mirrored_at"]
+        print(f"{'✅' if ok else '❌'} Loop running: auto read {r.json()['source']}, mirrored {age:.2f}s ago; "
+              f"stream header {header}")
+
+        for loop in loops:
+            await loop.stop()
+        loops[0].max_age = 0.1
+        await asyncio.sleep(0.2)
+        stale = (await auto()).json()["source"]
+        loops[0].max_age = None
+        stopped = (await auto()).json()["source"]
+        ok = stale == stopped == "live" and (await auto(source="mirror")).json()["source"] == "mirror"
+        print(f"{'✅' if ok else '❌'} Past max age auto read {stale}; with the loops stopped it read {stopped}; "
+              f"source=mirror still reads the mirror")
+
+    await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_nessie_mirror())
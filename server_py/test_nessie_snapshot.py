@@ -0,0 +1,156 @@
+"""
+Customer snapshot check (/api/capitalone/customer/{id}/snapshot, live source).
+
+Serves a fake Nessie API through httpx.MockTransport and counts upstream
+requests per path. Checks that:
+- a snapshot fetches the account list plus each account's sub-resources once;
+- a repeat snapshot is answered from the Nessie cache with no upstream calls,
+  and concurrent snapshots of an uncached customer share their requests;
+- refresh=true goes upstream again;
+- include= fetches only the selected sub-resources, and rejects unknown ones;
+- format=ndjson / sse stream a header, one frame per account and a done frame;
+- a client reused across event loops (as the test harness or a second app
+  instance would) keeps serving requests past its concurrency limits, and
+  separate clients don't share a governor.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+from collections import Counter
+
+import httpx
+
+ACCOUNTS = 6
+UPSTREAM_LATENCY = 0.02
+SUB_RESOURCES = 8  # account, customer and six kinds of activity
+
+
+class FakeNessie:
+    def __init__(self):
+        self.paths = Counter()
+        self.customer = {"_id": "cust_1", "first_name": "Snapshot", "last_name": "Test"}
+        self.accounts = {
+            customer: [{"_id": f"{customer}_acc_{i}", "type": "Checking", "balance": 100 * i} for i in range(ACCOUNTS)]
+            for customer in ("cust_1", "cust_2", "cust_3")
+        }
+
+    async def handle(self, request):
+        self.paths[request.url.path] += 1
+        await asyncio.sleep(UPSTREAM_LATENCY)
+        parts = request.url.path.strip("/").split("/")
+        if parts[0] == "customers":
+            return httpx.Response(200, json=self.accounts[parts[1]])
+        if len(parts) == 2:
+            return httpx.Response(200, json={"_id": parts[1], "type": "Checking", "balance": 1})
+        if parts[2] == "customer":
+            return httpx.Response(200, json=self.customer)
+        return httpx.Response(200, json=[{"_id": f"{parts[1]}_{parts[2]}_0", "amount": 5}])
+
+    def calls(self):
+        return sum(self.paths.values())
+
+
+def parse(body, format):
+    if format == "sse":
+        return [json.loads(line[6:]) for line in body.splitlines() if line.startswith("data: ")]
+    return [json.loads(line) for line in body.splitlines() if line]
+
+
+async def test_nessie_snapshot():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "nessie_snapshot.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    # Below the per-host limit, so bursts wait on the governor's global semaphore
+    os.environ.setdefault("NESSIE_GLOBAL_CONCURRENCY", "4")
+    import main
+    from nessie_client import NessieClient
+    from response_cache import ResponseCache
+
+    upstream = FakeNessie()
+    client = NessieClient(base_url="https://nessie.test", cache=ResponseCache(ttl=60, name="test"))
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url=client.base_url)
+    main.nessie_client = client
+    per_snapshot = 1 + ACCOUNTS * SUB_RESOURCES
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as api:
+        def snapshot(customer, **params):
+            return api.get(f"/api/capitalone/customer/{customer}/snapshot", params={"source": "live", **params})
+
+        print("\n--- Cached snapshots ---")
+        first = (await snapshot("cust_1")).json()
+        cold = upstream.calls()
+        repeat = (await snapshot("cust_1")).json()
+        ok = (cold == per_snapshot and upstream.calls() == cold and repeat == first
+              and len(first["accounts"]) == ACCOUNTS and first["accounts"][0]["purchases"])
+        print(f"{'✅' if ok else '❌'} First snapshot made {cold} upstream calls (expected {per_snapshot}); "
+              f"the repeat made {upstream.calls() - cold}")
+
+        before = upstream.calls()
+        results = await asyncio.gather(*(snapshot("cust_2") for _ in range(10)))
+        calls = upstream.calls() - before
+        ok = calls == per_snapshot and all(r.json() == results[0].json() for r in results)
+        print(f"{'✅' if ok else '❌'} 10 concurrent snapshots of a new customer made {calls} upstream calls")
+
+        before = upstream.calls()
+        await snapshot("cust_1", refresh="true")
+        calls = upstream.calls() - before
+        print(f"{'✅' if calls == per_snapshot else '❌'} refresh=true went upstream again ({calls} calls)")
+
+        print("\n--- include= ---")
+        before = Counter(upstream.paths)
+        body = (await snapshot("cust_3", include="purchases,deposits")).json()
+        fetched = {path.rsplit("/", 1)[-1] for path in upstream.paths - before if path.startswith("/accounts/")}
+        keys = set(body["accounts"][0])
+        ok = fetched == {"purchases", "deposits"} and keys == {"account", "purchases", "deposits"}
+        print(f"{'✅' if ok else '❌'} Fetched only {sorted(fetched)}; account keys {sorted(keys)}")
+
+        r = await snapshot("cust_3", include="purchases,statements")
+        print(f"{'✅' if r.status_code == 400 else '❌'} Unknown include rejected: {r.status_code} {r.json()}")
+
+        print("\n--- Streaming ---")
+        for format in ("ndjson", "sse"):
+            r = await snapshot("cust_3", include="account,purchases", format=format)
+            frames = parse(r.text, format)
+            indexes = sorted(f["index"] for f in frames if "index" in f)
+            ok = (frames[0] == {"customer_id": "cust_3", "account_count": ACCOUNTS}
+                  and indexes == list(range(ACCOUNTS)) and frames[-1] == {"done": True, "total": ACCOUNTS}
+                  and all(set(f["account"]) == {"account", "purchases"} for f in frames if "index" in f))
+            print(f"{'✅' if ok else '❌'} {format}: header, {len(indexes)} account frames, done "
+                  f"({r.headers['content-type']})")
+
+
+def test_event_loops():
+    from nessie_client import NESSIE_GLOBAL_CONCURRENCY, NessieClient
+    from response_cache import ResponseCache
+
+    print("\n--- Event loops ---")
+    upstream = FakeNessie()
+    client = NessieClient(base_url="https://nessie.test", cache=ResponseCache(ttl=60, name="loops"))
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle), base_url=client.base_url)
+    burst = 8 * NESSIE_GLOBAL_CONCURRENCY
+
+    async def saturate():
+        # More requests than the governor admits at once, so some wait for a slot
+        client.start()
+        results = await asyncio.wait_for(
+            asyncio.gather(*(client.get_account(f"loop_acc_{i}", refresh=True) for i in range(burst))), 10)
+        return client.governor, len(results)
+
+    for run in (1, 2):
+        try:
+            governor, served = asyncio.run(saturate())
+            print(f"{'✅' if served == burst else '❌'} Event loop {run}: {served}/{burst} requests served "
+                  f"(governor {id(governor):#x})")
+        except Exception as e:
+            print(f"❌ Event loop {run}: {type(e).__name__}: {e}")
+
+    other = NessieClient(base_url="https://nessie.test")
+    other.start()
+    print(f"{'✅' if other.governor is not client.governor else '❌'} Separate clients get separate governors")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_nessie_snapshot())
+    test_event_loops()
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from plaid.model.country_code import CountryCode
+from plaid.model.link_token_create_request import LinkTokenCreateRequest
+from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
+from plaid.model.products import Products
+
+from plaid_service import PlaidService
+
+PLAID_DELAY_SECONDS = 1.0
+CONCURRENT_PLAID_CALLS = 4
+TOKEN_INTERVAL_SECONDS = 0.01
+MAX_ACCEPTABLE_GAP_SECONDS = 0.1
+
+
+class SlowPlaidHandler(BaseHTTPRequestHandler):
+    """Local Plaid stand-in: answers /link/token/create after a fixed delay."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(PLAID_DELAY_SECONDS)
+        body = json.dumps({
+            "link_token": "link-sandbox-test",
+            "expiration": "2030-01-01T00:00:00Z",
+            "request_id": "test",
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def link_token_request():
+    return LinkTokenCreateRequest(
+        user=LinkTokenCreateRequestUser(client_user_id="user-1"),
+        client_name="Origin Finance",
+        products=[Products("transactions")],
+        country_codes=[CountryCode("US")],
+        language="en",
+    )
+
+
+async def chat_stream(duration):
+    """Simulated SSE chat stream: emits a token every TOKEN_INTERVAL_SECONDS, returns the worst gap seen."""
+    worst_gap = 0.0
+    last = time.perf_counter()
+    deadline = last + duration
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(TOKEN_INTERVAL_SECONDS)
+        now = time.perf_counter()
+        worst_gap = max(worst_gap, now - last)
+        last = now
+    return worst_gap
+
+
+async def run(label, plaid_call):
+    stream = asyncio.create_task(chat_stream(PLAID_DELAY_SECONDS * 2))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*(plaid_call() for _ in range(CONCURRENT_PLAID_CALLS)))
+    plaid_elapsed = time.perf_counter() - start
+    worst_gap = await stream
+    print(f"{label:<32} plaid calls: {plaid_elapsed:5.2f}s   worst chat token gap: {worst_gap * 1000:7.1f} ms")
+    return worst_gap
+
+
+async def test_plaid_offload():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowPlaidHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_address[1]}"
+    service = PlaidService("client-id", "secret", host=host, max_workers=CONCURRENT_PLAID_CALLS)
+
+    print(f"\n--- {CONCURRENT_PLAID_CALLS} concurrent Plaid calls, {PLAID_DELAY_SECONDS}s each ---")
+
+    async def blocking_call():
+        # What the handlers used to do: call the sync SDK directly on the event loop
+        service.client.link_token_create(link_token_request())
+
+    async def offloaded_call():
+        await service.link_token_create(link_token_request())
+
+    try:
+        await run("inline SDK call (before)", blocking_call)
+        worst_gap = await run("PlaidService executor (after)", offloaded_call)
+    finally:
+        service.close()
+        server.shutdown()
+
+    if worst_gap < MAX_ACCEPTABLE_GAP_SECONDS:
+        print("\n✅ Chat streams kept flowing during slow Plaid responses.")
+    else:
+        print(f"\n❌ Chat stream stalled for {worst_gap * 1000:.0f} ms during Plaid calls.")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_plaid_offload())
@@ -0,0 +1,153 @@
+"""
+Local Plaid webhook simulator.
+
+Runs the app in-process against a fake Plaid that signs webhooks with its own
+ES256 key (served from a fake /webhook_verification_key/get). Checks that:
+- a storm of signed SYNC_UPDATES_AVAILABLE webhooks for one item produces a
+  single sync (and a single key fetch), and the new transactions are in the
+  local store afterwards;
+- unsigned, stale, tampered and wrongly signed deliveries get a 401 and
+  schedule nothing.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+
+STORM_SIZE = 50
+
+
+def webhook(item_id, code="SYNC_UPDATES_AVAILABLE"):
+    return {
+        "webhook_type": "TRANSACTIONS",
+        "webhook_code": code,
+        "item_id": item_id,
+        "initial_update_complete": True,
+        "historical_update_complete": True,
+        "environment": "sandbox",
+    }
+
+
+def signature(body, private_key, kid="test-key", issued_at=None):
+    claims = {"iat": int(issued_at or time.time()), "request_body_sha256": hashlib.sha256(body).hexdigest()}
+    return jwt.encode(claims, private_key, algorithm="ES256", headers={"kid": kid})
+
+
+async def post_webhook(client, payload, private_key=None, **sign_args):
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"}
+    if private_key is not None:
+        headers["Plaid-Verification"] = signature(body, private_key, **sign_args)
+    return await client.post("/api/plaid/webhook", content=body, headers=headers)
+
+
+async def fire_storm(client, item_id, private_key, count=STORM_SIZE):
+    responses = await asyncio.gather(*(
+        post_webhook(client, webhook(item_id), private_key) for _ in range(count)
+    ))
+    return [r.json()["action"] for r in responses]
+
+
+class FakePlaid:
+    """Minimal stand-in for PlaidService that counts sync calls and serves its webhook signing key."""
+
+    def __init__(self):
+        self.sync_calls = 0
+        self.key_fetches = 0
+        self.signing_key = ec.generate_private_key(ec.SECP256R1())
+        jwk = jwt.algorithms.ECAlgorithm.to_jwk(self.signing_key.public_key(), as_dict=True)
+        self.jwk = {**jwk, "alg": "ES256", "kid": "test-key", "use": "sig", "created_at": 0, "expired_at": None}
+
+    async def webhook_verification_key_get(self, request):
+        self.key_fetches += 1
+        if request.key_id != self.jwk["kid"]:
+            raise ValueError(f"unknown key {request.key_id}")
+        return SimpleNamespace(key=SimpleNamespace(to_dict=lambda: self.jwk))
+
+    async def transactions_sync(self, request):
+        self.sync_calls += 1
+        await asyncio.sleep(0.05)
+        txn = SimpleNamespace(
+            transaction_id=f"webhook_txn_{self.sync_calls}", account_id="acc", name="Coffee",
+            amount=4.5, date=date.today(), category=["Food and Drink"], pending=False,
+            merchant_name="Coffee", payment_channel="in store", iso_currency_code="USD",
+        )
+        return SimpleNamespace(added=[txn], modified=[], removed=[], next_cursor=f"c{self.sync_calls}", has_more=False)
+
+    async def accounts_get(self, request):
+        return SimpleNamespace(accounts=[])
+
+    async def accounts_balance_get(self, request):
+        return SimpleNamespace(accounts=[])
+
+
+async def test_webhook_storm():
+    tmp = tempfile.mkdtemp()
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tmp, "webhooks.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+
+    import main
+    import database
+    from transaction_sync import TransactionSyncService
+
+    fake = FakePlaid()
+    main.plaid_service = fake
+    main.transaction_sync = TransactionSyncService(fake)
+    main.webhook_processor.debounce_seconds = 0.3
+    main.plaid_connection.set("access-sandbox-test", "item-test")
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        print(f"\n--- Firing {STORM_SIZE} signed webhooks for one item ---")
+        actions = await fire_storm(client, "item-test", fake.signing_key)
+        print(f"Actions: {set(actions)}")
+
+        await asyncio.sleep(1.0)
+        stats = (await client.get("/api/plaid/webhook/stats")).json()
+        print(f"Webhook stats: {stats}")
+        print(f"Plaid /transactions/sync calls: {fake.sync_calls}, verification key fetches: {fake.key_fetches}")
+
+        stored = database.get_stored_transactions("item-test")
+        if fake.sync_calls == 1 and len(stored) == 1 and fake.key_fetches == 1:
+            print("✅ Webhook storm produced a single sync (and one key fetch) and the data is local.")
+        else:
+            print(f"❌ Expected 1 sync, 1 stored transaction and 1 key fetch, "
+                  f"got {fake.sync_calls}, {len(stored)} and {fake.key_fetches}.")
+
+        unknown = await fire_storm(client, "some-other-item", fake.signing_key, count=1)
+        await asyncio.sleep(0.5)
+        print(f"Unknown item webhook: {unknown}, sync calls still {fake.sync_calls}")
+
+        print("\n--- Rejected deliveries ---")
+        other_key = ec.generate_private_key(ec.SECP256R1())
+        body = json.dumps(webhook("item-test")).encode()
+        tampered = json.dumps(webhook("item-test", code="DEFAULT_UPDATE")).encode()
+        cases = {
+            "unsigned": await post_webhook(client, webhook("item-test")),
+            "stale (signed 10 minutes ago)": await post_webhook(
+                client, webhook("item-test"), fake.signing_key, issued_at=time.time() - 600),
+            "body changed after signing": await client.post(
+                "/api/plaid/webhook", content=tampered,
+                headers={"Plaid-Verification": signature(body, fake.signing_key)}),
+            "signed with another key": await post_webhook(client, webhook("item-test"), other_key),
+            "unknown key id": await post_webhook(client, webhook("item-test"), fake.signing_key, kid="other"),
+        }
+        await asyncio.sleep(0.5)
+        for label, response in cases.items():
+            print(f"{'✅' if response.status_code == 401 else '❌'} {label}: {response.status_code}")
+        stats = (await client.get("/api/plaid/webhook/stats")).json()
+        ok = fake.sync_calls == 1 and stats["pending"] == 0 and stats["verification"]["rejected"] == len(cases)
+        print(f"{'✅' if ok else '❌'} Nothing scheduled by rejected deliveries; stats: {stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_webhook_storm())
@@ -0,0 +1,88 @@
+"""
+Local regret classifier check.
+
+Fills a throwaway database with synthetic "LLM-scored" transactions that
+follow a clear pattern (late-night food delivery and online shopping get
+regretted, groceries and bills don't, with some label noise), runs the
+training command against it, and checks that the exported model scores new
+transactions in microseconds, handles most of them locally and escalates the
+rest.
+"""
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAIN_SCRIPT = os.path.join(SERVER_DIR, "..", "purchase_predictor", "src", "train_regret.py")
+
+REGRETTED = [("DoorDash", "Food and Drink", "online"), ("Amazon", "Shops", "online"), ("Steam", "Recreation", "online")]
+WORTH_IT = [("Whole Foods", "Food and Drink", "in store"), ("Electric Company", "Service", "other"), ("Shell", "Travel", "in store")]
+
+
+def synthetic_transaction(i):
+    regretted = random.random() < 0.5
+    merchant, category, channel = random.choice(REGRETTED if regretted else WORTH_IT)
+    hour = random.choice([22, 23, 1]) if regretted else random.choice([9, 12, 17])
+    day = date.today() - timedelta(days=i % 120)
+    txn = {
+        "transaction_id": f"clf_txn_{i}", "account_id": "acc", "name": merchant, "merchant_name": merchant,
+        "amount": round(random.uniform(5, 120), 2), "date": str(day), "category": [category],
+        "pending": False, "payment_channel": channel, "iso_currency_code": "USD",
+        "datetime": datetime.combine(day, datetime.min.time()).replace(hour=hour).isoformat(),
+    }
+    # 10% label noise, like an LLM disagreeing with the pattern
+    if random.random() < 0.1:
+        regretted = not regretted
+    return txn, (random.randint(60, 95) if regretted else random.randint(5, 40))
+
+
+def test_regret_classifier():
+    random.seed(7)
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "classifier.db")
+    model_path = os.path.join(tmp, "regret_classifier.json")
+    os.environ["FINANCE_DB_PATH"] = db_path
+    sys.path.insert(0, SERVER_DIR)
+    import database
+    from regret_model import RegretClassifier
+
+    labeled = [synthetic_transaction(i) for i in range(1000)]
+    database.apply_transaction_sync("item-test", [t for t, _ in labeled], [], [], "cursor")
+    for t, score in labeled:
+        database.save_transaction_regret(t["transaction_id"], score, "synthetic")
+
+    print("\n--- Training ---")
+    result = subprocess.run([sys.executable, TRAIN_SCRIPT, "--db", db_path, "--model", model_path],
+                            capture_output=True, text=True)
+    print(result.stdout[-800:])
+    if result.returncode != 0:
+        print(f"❌ Training failed: {result.stderr}")
+        return
+
+    classifier = RegretClassifier(model_path)
+    classifier.load()
+    fresh = [synthetic_transaction(5000 + i) for i in range(2000)]
+
+    start = time.perf_counter()
+    scored, uncertain = classifier.partition([t for t, _ in fresh])
+    per_txn_us = (time.perf_counter() - start) / len(fresh) * 1e6
+
+    truth = {t["transaction_id"]: score >= 50 for t, score in fresh}
+    correct = sum((r["score"] >= 50) == truth[tid] for tid, r in scored.items())
+    coverage = len(scored) / len(fresh)
+    print(f"Scored locally: {coverage:.1%}, escalated to LLM: {len(uncertain)}, "
+          f"local accuracy: {correct / max(1, len(scored)):.3f}, {per_txn_us:.1f} µs/txn")
+
+    if per_txn_us < 100 and coverage > 0.5 and correct / max(1, len(scored)) > 0.8:
+        print("✅ Local classifier handles most transactions quickly and accurately.")
+    else:
+        print("❌ Local classifier is too slow, too uncertain or inaccurate.")
+
+
+if __name__ == "__main__":
+    test_regret_classifier()
@@ -0,0 +1,168 @@
+"""
+Background regret queue check.
+
+Runs the app in-process with a fake ChatService whose scoring is slow and
+flaky, and checks that GET /api/plaid/transactions returns immediately with
+unscored rows, that jobs are retried with backoff, and that every score ends
+up in the database and on the subscriber stream. Then checks that workers
+survive database errors while claiming, that scores saved by another server
+process reach this process's subscribers, and that re-enqueueing a
+permanently failed job re-arms it.
+"""
+
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+import httpx
+
+TRANSACTION_COUNT = 20
+SCORE_LATENCY = 0.5
+
+
+class FlakyChat:
+    """Stand-in for ChatService: slow, and skips the first attempt of every third transaction."""
+
+    def __init__(self):
+        self.attempts = {}
+        self.requests = 0
+
+    async def analyze_transactions_regret(self, transactions, user_profile):
+        self.requests += 1
+        await asyncio.sleep(SCORE_LATENCY)
+        results = {}
+        for t in transactions:
+            tid = t["transaction_id"]
+            self.attempts[tid] = self.attempts.get(tid, 0) + 1
+            if int(tid.split("_")[-1]) % 3 == 0 and self.attempts[tid] == 1:
+                continue
+            results[tid] = {"score": 50, "reason": "test"}
+        return results
+
+
+class SyncedItem:
+    def has_synced(self, item_id):
+        return True
+
+    def refresh_in_background(self, access_token, item_id):
+        pass
+
+
+async def test_regret_queue():
+    tmp = tempfile.mkdtemp()
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tmp, "regret_queue.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+
+    import main
+    import database
+    from regret_queue import RegretJobQueue
+
+    database.save_user_profile("Impulse food orders", "Save more", ["Food and Drink"])
+    today = str(date.today())
+    database.apply_transaction_sync("item-test", [
+        {
+            "transaction_id": f"queue_txn_{i}", "account_id": "acc", "name": "Takeout",
+            "amount": 12.5, "date": today, "category": ["Food and Drink"], "pending": False,
+            "merchant_name": "Takeout", "payment_channel": "online", "iso_currency_code": "USD",
+        }
+        for i in range(TRANSACTION_COUNT)
+    ], [], [], "cursor")
+
+    chat = FlakyChat()
+    main.regret_queue = queue = RegretJobQueue(chat, concurrency=2, retry_base_seconds=0.2, batch_size=8)
+    main.transaction_sync = SyncedItem()
+    main.plaid_connection.set("access-sandbox-test", "item-test")
+    queue.start()
+    events = queue.subscribe()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        print(f"\n--- Requesting {TRANSACTION_COUNT} unscored transactions ---")
+        start = time.perf_counter()
+        data = (await client.get("/api/plaid/transactions?days=7")).json()
+        elapsed = time.perf_counter() - start
+        unscored = sum(t["regretScore"] is None for t in data["transactions"])
+        print(f"Responded in {elapsed * 1000:.0f}ms with {unscored}/{data['total']} unscored")
+        if elapsed < SCORE_LATENCY:
+            print("✅ Endpoint did not wait for scoring.")
+        else:
+            print("❌ Endpoint waited for the LLM.")
+
+        # Asking again must not queue duplicates
+        await client.get("/api/plaid/transactions?days=7")
+
+        received = []
+        try:
+            while len(received) < TRANSACTION_COUNT:
+                received.append(await asyncio.wait_for(events.get(), timeout=10))
+        except asyncio.TimeoutError:
+            pass
+
+        stats = (await client.get("/api/plaid/transactions/regret-queue")).json()
+        print(f"Queue stats: {stats}, LLM requests: {chat.requests}")
+        scored = database.get_transaction_metadata([f"queue_txn_{i}" for i in range(TRANSACTION_COUNT)])
+        if len(received) == TRANSACTION_COUNT and len(scored) == TRANSACTION_COUNT and stats["retried"] > 0:
+            print("✅ All transactions scored (with retries) and pushed to subscribers.")
+        else:
+            print(f"❌ Expected {TRANSACTION_COUNT} scores, got {len(scored)} saved and {len(received)} pushed.")
+
+    print("\n--- Database errors while claiming ---")
+    claim = database.claim_regret_jobs
+    failures = {"left": 2}
+
+    def locked_claim(limit=1):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return claim(limit)
+
+    database.claim_regret_jobs = locked_claim
+    try:
+        queue.enqueue([{"transaction_id": "queue_txn_100", "name": "Takeout", "amount": 9.0, "date": today}])
+        event = await asyncio.wait_for(events.get(), timeout=10)
+    except asyncio.TimeoutError:
+        event = None
+    finally:
+        database.claim_regret_jobs = claim
+    errors = queue.stats()["worker_errors"]
+    ok = event is not None and event["transaction_id"] == "queue_txn_100" and errors == 2
+    print(f"{'✅' if ok else '❌'} Workers outlived {errors} failed claims and scored the new job")
+
+    print("\n--- Scores from another server process ---")
+    # A separate interpreter stands in for another worker saving scores to the shared database
+    other = "import database\nfor i in range(200, 205):\n    database.save_transaction_regret(f'queue_txn_{i}', 70, 'other worker')"
+    subprocess.run([sys.executable, "-c", other], check=True, env=os.environ.copy(),
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    received = []
+    try:
+        while len(received) < 5:
+            received.append(await asyncio.wait_for(events.get(), timeout=5))
+    except asyncio.TimeoutError:
+        pass
+    ok = [e["transaction_id"] for e in received] == [f"queue_txn_{i}" for i in range(200, 205)]
+    print(f"{'✅' if ok else '❌'} {len(received)}/5 scores saved by another process reached this process's subscriber, in order")
+
+    await queue.stop()
+
+    print("\n--- Re-enqueueing a failed job ---")
+    txn = {"transaction_id": "queue_txn_101", "name": "Takeout", "amount": 9.0, "date": today}
+    database.enqueue_regret_jobs([txn])
+    database.claim_regret_jobs(limit=1)
+    database.fail_regret_job("queue_txn_101", "model unavailable")
+    parked = database.get_regret_job_counts()
+    rearmed = database.enqueue_regret_jobs([txn])
+    again = database.enqueue_regret_jobs([txn])
+    jobs = database.claim_regret_jobs(limit=1)
+    ok = (parked.get("failed") == 1 and rearmed == 1 and again == 0
+          and [(j["transaction_id"], j["attempts"]) for j in jobs] == [("queue_txn_101", 1)])
+    print(f"{'✅' if ok else '❌'} Failed job re-armed with fresh attempts ({parked} -> claimed {jobs}); "
+          f"re-enqueueing a pending job added {again}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_regret_queue())
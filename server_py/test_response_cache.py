@@ -0,0 +1,137 @@
+"""
+Response cache check (response_cache.py, /api/plaid/accounts and /balance).
+
+Drives a ResponseCache with a slow counting loader, then the accounts and
+balance endpoints against a fake Plaid, and checks that:
+- concurrent misses share one upstream call, and fresh entries make none;
+- a stale entry is served at once while one background refresh replaces it,
+  and an entry past its stale window is reloaded before answering;
+- a failed background refresh keeps serving the stale value;
+- a load that was in flight during invalidate() is not stored;
+- accounts and balances are cached per item, and disconnecting drops them.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import httpx
+
+LOAD_LATENCY = 0.1
+TTL = 0.3
+MAX_STALE = 0.5
+
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(LOAD_LATENCY)
+        if self.fail:
+            raise RuntimeError("upstream unavailable")
+        return f"v{call}"
+
+
+class FakePlaid:
+    def __init__(self):
+        self.calls = {"accounts_get": 0, "accounts_balance_get": 0}
+
+    async def _accounts(self, method):
+        self.calls[method] += 1
+        await asyncio.sleep(LOAD_LATENCY)
+        balances = SimpleNamespace(available=100.0, current=120.0 + self.calls[method], limit=None,
+                                   iso_currency_code="USD")
+        return SimpleNamespace(accounts=[SimpleNamespace(
+            account_id="acc", name="Checking", official_name=None, type="depository", subtype="checking",
+            mask="0000", balances=balances,
+        )])
+
+    async def accounts_get(self, request):
+        return await self._accounts("accounts_get")
+
+    async def accounts_balance_get(self, request):
+        return await self._accounts("accounts_balance_get")
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    value = await coro
+    return value, time.perf_counter() - start
+
+
+async def test_response_cache():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "response_cache.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    from response_cache import ResponseCache
+
+    print("\n--- Misses and hits ---")
+    cache, load = ResponseCache(ttl=TTL, max_stale=MAX_STALE, name="test"), CountingLoader()
+    values = await asyncio.gather(*(cache.get("k", load) for _ in range(20)))
+    fresh, elapsed = await timed(cache.get("k", load))
+    ok = set(values) == {"v1"} and fresh == "v1" and load.calls == 1 and elapsed < 0.01
+    print(f"{'✅' if ok else '❌'} 20 concurrent misses and a fresh hit made {load.calls} upstream call")
+
+    print("\n--- Stale while revalidate ---")
+    await asyncio.sleep(TTL)
+    stale, elapsed = await timed(cache.get("k", load))
+    again = await cache.get("k", load)
+    await asyncio.sleep(LOAD_LATENCY * 1.5)
+    refreshed = await cache.get("k", load)
+    ok = stale == again == "v1" and elapsed < 0.01 and refreshed == "v2" and load.calls == 2
+    print(f"{'✅' if ok else '❌'} Stale value served in {elapsed * 1000:.1f}ms; one background refresh, "
+          f"then {refreshed!r}")
+
+    await asyncio.sleep(TTL + MAX_STALE)
+    expired, elapsed = await timed(cache.get("k", load))
+    ok = expired == "v3" and elapsed >= LOAD_LATENCY
+    print(f"{'✅' if ok else '❌'} Past the stale window, reloaded before answering ({elapsed * 1000:.0f}ms)")
+
+    await asyncio.sleep(TTL)
+    load.fail = True
+    stale = await cache.get("k", load)
+    await asyncio.sleep(LOAD_LATENCY * 1.5)
+    still = await cache.get("k", load)
+    load.fail = False
+    ok = stale == still == "v3" and cache.stats()["refresh_errors"] == 1
+    print(f"{'✅' if ok else '❌'} Failed background refresh kept serving {still!r}")
+
+    print("\n--- Invalidation ---")
+    cache, load = ResponseCache(ttl=60, name="test"), CountingLoader()
+    pending = asyncio.create_task(cache.get("item:accounts", load))
+    await asyncio.sleep(LOAD_LATENCY / 2)
+    cache.invalidate("item:")
+    await pending
+    after = await cache.get("item:accounts", load)
+    print(f"{'✅' if after == 'v2' and load.calls == 2 else '❌'} Load in flight during invalidate() was not stored "
+          f"(next read: {after!r})")
+
+    print("\n--- Accounts and balance endpoints ---")
+    import main
+    fake = FakePlaid()
+    main.plaid_service = fake
+    main.plaid_cache = ResponseCache(ttl=60, max_stale=60, name="plaid")
+    main.plaid_connection.set("access-sandbox-test", "item-test")
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.get(path) for path in ["/api/plaid/accounts"] * 5 + ["/api/plaid/balance"] * 5))
+        first = [r.json()["accounts"][0]["balances"]["current"] for r in responses]
+        _, elapsed = await timed(client.get("/api/plaid/balance"))
+        ok = fake.calls == {"accounts_get": 1, "accounts_balance_get": 1} and elapsed < LOAD_LATENCY
+        print(f"{'✅' if ok else '❌'} 10 requests made {fake.calls}; cached balance served in {elapsed * 1000:.0f}ms")
+
+        await client.post("/api/plaid/disconnect")
+        main.plaid_connection.set("access-sandbox-test", "item-test")
+        balance = (await client.get("/api/plaid/balance")).json()["accounts"][0]["balances"]["current"]
+        ok = fake.calls["accounts_balance_get"] == 2 and balance != first[-1]
+        print(f"{'✅' if ok else '❌'} After disconnect the balance was fetched again ({first[-1]} -> {balance})")
+        print(f"Cache stats: {(await client.get('/api/plaid/cache-stats')).json()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_response_cache())
@@ -0,0 +1,81 @@
+"""
+Shared state check (session_store.py, database.apply_transaction_sync).
+
+Checks that:
+- SessionStore is abstract, so a backend missing a method fails at construction;
+- two workers' CachedSessionStores over one database see each other's
+  Plaid connection once their cache TTL has passed;
+- the same sync batch applied by several workers at once leaves the spending
+  rollups exactly as a single apply would (no double counting).
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+
+def batch(n=40):
+    return [
+        {"transaction_id": f"t{i}", "account_id": "acc", "name": "Cafe", "merchant_name": "Cafe",
+         "amount": 10.0, "date": "2024-03-05", "category": ["Food and Drink"], "pending": False}
+        for i in range(n)
+    ]
+
+
+def test_session_store():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "session_store.db")
+    import database
+    from session_store import CachedSessionStore, PlaidConnection, SessionStore, SQLiteSessionStore
+
+    database.init_db()
+
+    print("\n--- Interface ---")
+
+    class GetOnly(SessionStore):
+        def get(self, key):
+            return None
+
+    try:
+        GetOnly()
+        print("❌ A store without set/delete could be constructed")
+    except TypeError as e:
+        print(f"✅ Incomplete store rejected: {e}")
+
+    print("\n--- Two workers ---")
+    worker_a = PlaidConnection(CachedSessionStore(SQLiteSessionStore(), ttl=0.1))
+    worker_b = PlaidConnection(CachedSessionStore(SQLiteSessionStore(), ttl=0.1))
+    worker_b.get()
+    worker_a.set("access-sandbox-1", "item-1")
+    stale = worker_b.get()
+    time.sleep(0.15)
+    fresh = worker_b.get()
+    ok = stale == (None, None) and fresh == ("access-sandbox-1", "item-1")
+    print(f"{'✅' if ok else '❌'} Worker B read {stale} from its cache, then {fresh} after the TTL")
+
+    print("\n--- Concurrent syncs of one item ---")
+    rows = batch()
+    database.apply_transaction_sync("item-1", rows, [], [], "cursor-1")
+    expected = database.get_spending_rollups("item-1", "month", "category")["totals"]
+
+    database.clear_item_transactions("item-1")
+    errors = []
+
+    def apply():
+        try:
+            database.apply_transaction_sync("item-1", rows, [], [], "cursor-1")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=apply) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    totals = database.get_spending_rollups("item-1", "month", "category")["totals"]
+    ok = not errors and totals == expected
+    print(f"{'✅' if ok else '❌'} 8 overlapping applies: {totals} (single apply: {expected}, errors: {errors})")
+
+
+if __name__ == "__main__":
+    test_session_store()
@@ -0,0 +1,71 @@
+"""
+SSE framing check (sse.py).
+
+Feeds sse_events() chunk streams with controlled timing and checks:
+- chunks arriving within one flush interval go out as one frame, and the
+  reply parses back intact (including quotes and non-ASCII text);
+- a full buffer flushes before the interval is up;
+- an idle stream gets heartbeat comments;
+- an error flushes buffered content, then sends the error frame.
+"""
+
+import asyncio
+import json
+import time
+
+
+async def chunks_with_gaps(items, gap=0.0):
+    for item in items:
+        await asyncio.sleep(gap)
+        yield item
+
+
+async def collect(frames):
+    start, out = time.perf_counter(), []
+    async for frame in frames:
+        out.append((time.perf_counter() - start, frame.decode()))
+    return out
+
+
+def content_of(frames):
+    return "".join(
+        json.loads(f[6:])["choices"][0]["delta"]["content"] for _, f in frames if f.startswith("data: {\"choices\"")
+    )
+
+
+async def test_sse():
+    from sse import sse_events
+
+    print("\n--- Coalescing ---")
+    tokens = ['Spend ', 'less on "dining" ', '— about ', '€80 ', 'a month.'] * 20
+    frames = await collect(sse_events(None, chunks_with_gaps(tokens, gap=0.002), flush_interval_ms=30))
+    reply_frames = [f for _, f in frames if f.startswith("data: {")]
+    ok = (content_of(frames) == "".join(tokens) and len(reply_frames) < len(tokens) / 4
+          and frames[-1][1] == "data: [DONE]\n\n")
+    print(f"{'✅' if ok else '❌'} {len(tokens)} chunks sent as {len(reply_frames)} frames; content intact, ends with [DONE]")
+
+    frames = await collect(sse_events(None, chunks_with_gaps(["x" * 40] * 10, gap=0.01),
+                                      flush_interval_ms=1000, flush_bytes=100))
+    first_at = frames[0][0]
+    print(f"{'✅' if first_at < 0.2 else '❌'} Full buffer flushed after {first_at * 1000:.0f}ms "
+          f"(interval 1000ms, limit 100 characters)")
+
+    print("\n--- Heartbeats ---")
+    frames = await collect(sse_events(None, chunks_with_gaps(["late reply"], gap=0.35), heartbeat_interval=0.1))
+    pings = sum(f == ": ping\n\n" for _, f in frames)
+    print(f"{'✅' if pings >= 2 and content_of(frames) == 'late reply' else '❌'} "
+          f"{pings} heartbeat comments while the stream was idle")
+
+    print("\n--- Errors ---")
+
+    async def failing():
+        yield "Partial answer"
+        raise RuntimeError("upstream unavailable")
+
+    frames = await collect(sse_events(None, failing(), flush_interval_ms=1000))
+    ok = content_of(frames) == "Partial answer" and json.loads(frames[-1][1][6:]) == {"error": "upstream unavailable"}
+    print(f"{'✅' if ok else '❌'} Buffered content flushed before the error frame: {[f for _, f in frames]}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_sse())
@@ -0,0 +1,130 @@
+"""
+Transaction query check (database.query_transactions).
+
+Loads a few hundred transactions for one item, several per day so dates tie,
+and checks that:
+- every sort order, with and without filters or a cursor, is served straight
+  from an index (no "USE TEMP B-TREE" in EXPLAIN QUERY PLAN);
+- paging through with cursors returns every transaction exactly once, in the
+  same order as one unpaginated read;
+- a database with the old idx_plaid_transactions_item_date (transaction_id
+  ascending) gets the index rebuilt by init_db().
+"""
+
+import os
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+
+TRANSACTION_COUNT = 300
+PAGE_SIZE = 37
+CATEGORIES = ["Food and Drink", "Shops", "Travel"]
+
+
+def transactions():
+    start = date(2024, 1, 1)
+    return [
+        {
+            "transaction_id": f"txn_{i:04d}", "account_id": "acc", "name": f"Merchant {i % 7}",
+            "merchant_name": f"Merchant {i % 7}", "amount": float((i * 37) % 120) + 0.5,
+            "date": str(start + timedelta(days=i // 5)), "category": [CATEGORIES[i % 3]], "pending": False,
+        }
+        for i in range(TRANSACTION_COUNT)
+    ]
+
+
+def capture_queries(database):
+    """Record the (parameter-expanded) SELECTs that database functions run."""
+    statements = []
+    connect = database.get_db_connection
+
+    def traced():
+        conn = connect()
+        conn.set_trace_callback(lambda sql: statements.append(sql) if sql.lstrip().startswith("SELECT") else None)
+        return conn
+
+    database.get_db_connection = traced
+    return statements, lambda: setattr(database, "get_db_connection", connect)
+
+
+def query_plan(database, sql):
+    conn = database.get_db_connection()
+    plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    conn.close()
+    return plan
+
+
+def page_through(database, **filters):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = database.query_transactions("item-1", limit=PAGE_SIZE, cursor=cursor, **filters)
+        rows.extend(t["transaction_id"] for t in page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def test_transaction_query():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "transaction_query.db")
+    import database
+
+    # Start from the old index definition, as an existing database would have it
+    database.init_db()
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute("DROP INDEX idx_plaid_transactions_item_date")
+    conn.execute("CREATE INDEX idx_plaid_transactions_item_date ON plaid_transactions (item_id, date DESC, transaction_id)")
+    conn.close()
+    database.init_db()
+    database.apply_transaction_sync("item-1", transactions(), [], [], "cursor-1")
+
+    print("\n--- Migration ---")
+    conn = sqlite3.connect(database.DB_PATH)
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'idx_plaid_transactions_item_date'").fetchone()[0]
+    conn.close()
+    print(f"{'✅' if 'transaction_id DESC' in sql else '❌'} {' '.join(sql.split())}")
+
+    print("\n--- Query plans ---")
+    cases = {
+        "date_desc": {},
+        "date_desc, next page": {"cursor": database.query_transactions("item-1", limit=PAGE_SIZE)[1]},
+        "date_desc, date range": {"start_date": "2024-01-10", "end_date": "2024-02-10"},
+        "date_asc": {"sort": "date_asc"},
+        "amount_desc": {"sort": "amount_desc"},
+        "amount_asc": {"sort": "amount_asc"},
+        "date_desc, category": {"category": "Shops"},
+        "date_desc, merchant": {"merchant": "Merchant 3"},
+    }
+    statements, restore = capture_queries(database)
+    try:
+        for label, args in cases.items():
+            statements.clear()
+            database.query_transactions("item-1", limit=PAGE_SIZE, **args)
+            plan = query_plan(database, statements[-1])
+            sorted_in_memory = any("TEMP B-TREE" in step for step in plan)
+            print(f"{'❌' if sorted_in_memory else '✅'} {label}: {'; '.join(plan)}")
+        statements.clear()
+        database.get_stored_transactions("item-1")
+        plan = query_plan(database, statements[-1])
+        print(f"{'❌' if any('TEMP B-TREE' in step for step in plan) else '✅'} get_stored_transactions: {'; '.join(plan)}")
+    finally:
+        restore()
+
+    print("\n--- Paging ---")
+    for sort in ("date_desc", "date_asc", "amount_desc", "amount_asc"):
+        paged, pages = page_through(database, sort=sort)
+        expected = [t["transaction_id"] for t in
+                    database.query_transactions("item-1", sort=sort, limit=database.MAX_QUERY_LIMIT)[0]]
+        ok = len(paged) == len(set(paged)) == TRANSACTION_COUNT and paged[:len(expected)] == expected
+        print(f"{'✅' if ok else '❌'} {sort}: {len(paged)} transactions over {pages} pages, no repeats or gaps")
+
+    paged, pages = page_through(database, category="Travel")
+    ok = len(paged) == len(set(paged)) == TRANSACTION_COUNT // 3
+    print(f"{'✅' if ok else '❌'} date_desc, category: {len(paged)} transactions over {pages} pages")
+
+    newest_first = [t["transaction_id"] for t in database.get_stored_transactions("item-1")]
+    ok = page_through(database)[0] == newest_first
+    print(f"{'✅' if ok else '❌'} date_desc pages match get_stored_transactions order (ties broken by id)")
+
+
+if __name__ == "__main__":
+    test_transaction_query()
@@ -0,0 +1,114 @@
+"""
+Full-history transaction stream check (fetch_transaction_pages and
+/api/plaid/transactions/stream).
+
+Runs against a fake Plaid whose /transactions/get takes a fixed time per page,
+and checks that:
+- after the first page, the remaining pages are fetched concurrently (up to
+  the concurrency limit), and every transaction arrives exactly once;
+- the endpoint streams each page as NDJSON or SSE, ends with a done message,
+  and merges stored regret scores into the rows;
+- in demo mode, stored scores fill in demo rows without one, while demo rows
+  that have a score keep it.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import httpx
+
+PAGE_LATENCY = 0.05
+TOTAL = 1234
+
+
+class FakePlaid:
+    """/transactions/get over TOTAL transactions; tracks how many page requests overlap."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    async def transactions_get(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(PAGE_LATENCY)
+        finally:
+            self.in_flight -= 1
+        offset, count = request.options.offset, request.options.count
+        return SimpleNamespace(total_transactions=TOTAL, transactions=[
+            SimpleNamespace(
+                transaction_id=f"hist_{i:05d}", account_id="acc", name="Grocer", amount=20.0, date=date.today(),
+                category=["Shops"], pending=False, merchant_name="Grocer", payment_channel="in store",
+                iso_currency_code="USD",
+            )
+            for i in range(offset, min(offset + count, TOTAL))
+        ])
+
+
+def parse(body, format):
+    if format == "sse":
+        return [json.loads(line[6:]) for line in body.splitlines() if line.startswith("data: ")]
+    return [json.loads(line) for line in body.splitlines() if line]
+
+
+async def test_transaction_stream():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "transaction_stream.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    import main
+    import database
+    from transaction_sync import fetch_transaction_pages
+
+    print("\n--- Concurrent pages ---")
+    fake = FakePlaid()
+    start = time.perf_counter()
+    pages = [page async for page in fetch_transaction_pages(fake, "access", date.today(), date.today(),
+                                                           page_size=100, max_concurrency=4)]
+    elapsed = time.perf_counter() - start
+    ids = [t["transaction_id"] for _, rows, _ in pages for t in rows]
+    sequential = fake.requests * PAGE_LATENCY
+    ok = len(ids) == len(set(ids)) == TOTAL and fake.max_in_flight == 4 and elapsed < sequential / 2
+    print(f"{'✅' if ok else '❌'} {len(pages)} pages ({len(ids)} transactions) in {elapsed:.2f}s "
+          f"(one at a time: {sequential:.2f}s), at most {fake.max_in_flight} in flight")
+
+    print("\n--- Streaming endpoint ---")
+    main.plaid_service = fake
+    main.plaid_connection.set("access-sandbox-test", "item-test")
+    database.save_transaction_regret("hist_00007", 64, "Impulse buy")
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for format in ("ndjson", "sse"):
+            r = await client.get("/api/plaid/transactions/stream", params={"days": 30, "format": format})
+            messages = parse(r.text, format)
+            rows = [t for m in messages if "transactions" in m for t in m["transactions"]]
+            scored = {t["transaction_id"]: t["regretScore"] for t in rows if t["regretScore"] is not None}
+            ok = (r.headers["content-type"].startswith("text/event-stream" if format == "sse" else "application/x-ndjson")
+                  and len(rows) == TOTAL and messages[-1] == {"done": True, "total": TOTAL} and scored == {"hist_00007": 64})
+            print(f"{'✅' if ok else '❌'} {format}: {len(messages) - 1} pages, {len(rows)} transactions, "
+                  f"last message {messages[-1]}, stored scores merged: {scored}")
+
+        print("\n--- Demo mode ---")
+        demo_rows = main.demo_transactions_data.to_dicts()
+        unscored = next(t["transaction_id"] for t in demo_rows if t["regretScore"] is None)
+        database.save_transaction_regret(unscored, 42, "Scored after the demo was generated")
+        database.save_transaction_regret("demo_txn_regret_1", 10, "Should not override the demo score")
+        main.DEMO_MODE = True
+        try:
+            r = await client.get("/api/plaid/transactions/stream", params={"days": 30})
+        finally:
+            main.DEMO_MODE = False
+        rows = {t["transaction_id"]: t for m in parse(r.text, "ndjson") if "transactions" in m for t in m["transactions"]}
+        ok = rows[unscored]["regretScore"] == 42 and rows["demo_txn_regret_1"]["regretScore"] == 75
+        print(f"{'✅' if ok else '❌'} Stored score filled in {unscored}: {rows[unscored]['regretScore']}; "
+              f"demo_txn_regret_1 kept its own: {rows['demo_txn_regret_1']['regretScore']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_transaction_stream())
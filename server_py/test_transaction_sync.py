@@ -0,0 +1,187 @@
+"""
+Local transaction store and incremental sync check (transaction_sync.py,
+spending rollups in database.py).
+
+Runs the app in-process against a fake Plaid /transactions/sync that serves
+deltas in pages, and checks that:
+- the first GET /api/plaid/transactions syncs every page into the local store
+  and saves the cursor; later requests are answered from the store and only
+  refresh in the background (at most once per interval);
+- a sync resumes from the stored cursor and applies added, modified and
+  removed transactions;
+- TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION restarts pagination from the
+  original cursor rather than keeping a half-read batch, and an item that
+  keeps mutating fails the sync after a few backed-off attempts;
+- after every change (sync deltas, regret scores), the spending rollups equal
+  a from-scratch aggregation of the stored transactions.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+from collections import defaultdict
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import httpx
+import plaid
+
+PAGE_SIZE = 4
+
+
+def plaid_transaction(tid, amount, day, category="Food and Drink", merchant="Cafe"):
+    return SimpleNamespace(
+        transaction_id=tid, account_id="acc", name=merchant, amount=amount, date=day, category=[category],
+        pending=False, merchant_name=merchant, payment_channel="in store", iso_currency_code="USD",
+    )
+
+
+class FakePlaid:
+    """/transactions/sync over a list of delta batches, one batch per cursor, split into pages."""
+
+    def __init__(self, batches):
+        self.batches = batches  # cursor index -> {"added", "modified", "removed"}
+        self.requests = []
+        self.mutate_once_at = None  # page number at which to report a mutation, once
+        self.always_mutate = False  # report a mutation on every request
+
+    async def transactions_sync(self, request):
+        cursor = request.get("cursor", "")
+        self.requests.append(cursor)
+        batch_index, page = (int(x) for x in cursor.split(":")) if cursor else (0, 0)
+        if self.always_mutate or (self.mutate_once_at is not None and page == self.mutate_once_at):
+            self.mutate_once_at = None
+            error = plaid.ApiException(status=400, reason="Bad Request")
+            error.body = json.dumps({"error_code": "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"})
+            raise error
+        batch = self.batches[batch_index] if batch_index < len(self.batches) else {}
+        deltas = [("added", t) for t in batch.get("added", [])] + [("modified", t) for t in batch.get("modified", [])] \
+            + [("removed", SimpleNamespace(transaction_id=tid)) for tid in batch.get("removed", [])]
+        chunk = deltas[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        has_more = (page + 1) * PAGE_SIZE < len(deltas)
+        next_cursor = f"{batch_index}:{page + 1}" if has_more else f"{min(batch_index + 1, len(self.batches))}:0"
+        return SimpleNamespace(
+            added=[t for kind, t in chunk if kind == "added"],
+            modified=[t for kind, t in chunk if kind == "modified"],
+            removed=[t for kind, t in chunk if kind == "removed"],
+            next_cursor=next_cursor, has_more=has_more,
+        )
+
+
+def expected_rollups(database, item_id):
+    """Month x category rollups recomputed from the stored rows and their scores."""
+    rows = database.get_stored_transactions(item_id)
+    scores = database.get_transaction_metadata([t["transaction_id"] for t in rows])
+    buckets = defaultdict(lambda: [0.0, 0, 0.0])
+    for t in rows:
+        if t["amount"] <= 0:
+            continue
+        bucket = buckets[(t["date"][:8] + "01", t["category"][0])]
+        bucket[0] += t["amount"]
+        bucket[1] += 1
+        bucket[2] += t["amount"] * (scores.get(t["transaction_id"], {}).get("regret_score") or 0) / 100
+    return {key: (round(total, 2), count, round(weighted, 2)) for key, (total, count, weighted) in buckets.items()}
+
+
+def stored_rollups(database, item_id):
+    result = database.get_spending_rollups(item_id, "month", "category")
+    return {(b["bucket"], b["key"]): (b["total"], b["count"], b["regret_weighted"]) for b in result["buckets"]}
+
+
+def check_rollups(database, label):
+    stored, expected = stored_rollups(database, "item-test"), expected_rollups(database, "item-test")
+    print(f"{'✅' if stored == expected else '❌'} Rollups match the stored transactions {label}"
+          + ("" if stored == expected else f": {stored} vs {expected}"))
+
+
+async def test_transaction_sync():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "transaction_sync.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    import main
+    import database
+    import transaction_sync
+    from transaction_sync import TransactionSyncService
+
+    today = date.today()
+    last_month = today.replace(day=1) - timedelta(days=1)
+    initial = [plaid_transaction(f"t{i}", 10.0 + i, today - timedelta(days=i % 3)) for i in range(9)]
+    initial += [plaid_transaction("paycheck", -2500.0, today, "Transfer", "Employer"),
+                plaid_transaction("flight", 320.0, last_month, "Travel", "Airline")]
+    fake = FakePlaid([
+        {"added": initial},
+        {"added": [plaid_transaction("t_new", 55.0, today, "Shops", "Store")],
+         "modified": [plaid_transaction("t1", 99.0, today - timedelta(days=1))],
+         "removed": ["t2", "flight"]},
+    ])
+    main.plaid_service = fake
+    main.transaction_sync = sync = TransactionSyncService(fake)
+    main.plaid_connection.set("access-sandbox-test", "item-test")
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        print("\n--- First request: full sync into the local store ---")
+        fake.mutate_once_at = 2
+        data = (await client.get("/api/plaid/transactions", params={"days": 60})).json()
+        ids = {t["transaction_id"] for t in data["transactions"]}
+        cursor = database.get_sync_cursor("item-test")
+        ok = ids == {t.transaction_id for t in initial} and cursor == "1:0" and fake.requests.count("") == 2
+        print(f"{'✅' if ok else '❌'} {len(ids)} transactions stored from {len(fake.requests)} sync pages "
+              f"(restarted once after a mutation during pagination); cursor {cursor!r}")
+        check_rollups(database, "after the first sync")
+
+        print("\n--- Later requests: served from the store ---")
+        requests = len(fake.requests)
+        for _ in range(3):
+            await client.get("/api/plaid/transactions", params={"days": 60})
+        await asyncio.sleep(0.1)
+        print(f"{'✅' if len(fake.requests) == requests else '❌'} 3 more requests made "
+              f"{len(fake.requests) - requests} sync calls (item was just synced)")
+
+        print("\n--- Incremental sync ---")
+        requests = len(fake.requests)
+        counts = await sync.sync("access-sandbox-test", "item-test")
+        rows = {t["transaction_id"]: t for t in database.get_stored_transactions("item-test")}
+        ok = (fake.requests[requests] == "1:0" and counts == {"added": 1, "modified": 1, "removed": 2}
+              and "t_new" in rows and rows["t1"]["amount"] == 99.0 and "t2" not in rows and "flight" not in rows)
+        print(f"{'✅' if ok else '❌'} Resumed from cursor {fake.requests[requests]!r} and applied {counts}")
+        check_rollups(database, "after added, modified and removed deltas")
+
+        print("\n--- An item that keeps changing ---")
+        transaction_sync.SYNC_MUTATION_BACKOFF_SECONDS = 0.05
+        fake.always_mutate = True
+        requests, cursor = len(fake.requests), database.get_sync_cursor("item-test")
+        start = asyncio.get_running_loop().time()
+        try:
+            await asyncio.wait_for(sync.sync("access-sandbox-test", "item-test"), timeout=10)
+            error = None
+        except Exception as e:
+            error = e
+        elapsed = asyncio.get_running_loop().time() - start
+        fake.always_mutate = False
+        attempts = len(fake.requests) - requests
+        ok = (isinstance(error, plaid.ApiException) and attempts == transaction_sync.SYNC_MUTATION_MAX_ATTEMPTS
+              and database.get_sync_cursor("item-test") == cursor and elapsed >= 0.05 * (1 + 2 + 4) / 2)
+        print(f"{'✅' if ok else '❌'} Gave up after {attempts} attempts in {elapsed:.2f}s and raised "
+              f"{type(error).__name__}; cursor unchanged")
+
+        print("\n--- Regret scores ---")
+        database.save_transaction_regret("t1", 80, "Impulse")
+        database.save_transaction_regret("t3", 40, "Maybe")
+        database.save_transaction_regret("t1", 20, "Rescored")
+        check_rollups(database, "after scoring and re-scoring")
+
+        r = await client.get("/api/plaid/spending-rollups", params={"granularity": "month", "dimension": "category"})
+        totals = {t["key"]: t["total"] for t in r.json()["totals"]}
+        expected = {key: value[0] for (bucket, key), value in expected_rollups(database, "item-test").items()}
+        print(f"{'✅' if totals == expected else '❌'} /api/plaid/spending-rollups totals: {totals}")
+
+        print("\n--- Disconnect ---")
+        await client.post("/api/plaid/disconnect")
+        ok = (database.get_sync_cursor("item-test") is None and not database.get_stored_transactions("item-test")
+              and not stored_rollups(database, "item-test"))
+        print(f"{'✅' if ok else '❌'} Disconnect cleared the item's transactions, rollups and cursor")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_transaction_sync())
@@ -0,0 +1,96 @@
+"""
+Deep analysis workflow check.
+
+Runs the engine on two slow independent steps plus one step that depends on
+both, and checks three things:
+- The independent steps overlap.
+- Output comes out in step order.
+- A failing step skips only its dependents.
+
+It then runs ChatService's analysis workflow against a fake streaming model.
+That run must stream each step's progress and output, report per-step
+timing, and finish without the old one-second pause.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+STEP_LATENCY = 0.3
+
+
+def slow_step(text, fail=False):
+    async def run(outputs):
+        await asyncio.sleep(STEP_LATENCY)
+        if fail:
+            raise RuntimeError("model unavailable")
+        yield text + (f" <- {sorted(outputs)}" if outputs else "")
+    return run
+
+
+class FakeStreamingDedalus:
+    async def chat_completion(self, model, messages, stream=False, **kwargs):
+        async def tokens():
+            await asyncio.sleep(0.2)
+            for word in f"{model} reply".split():
+                await asyncio.sleep(0.02)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+        return tokens()
+
+
+async def test_workflow():
+    os.environ["FINANCE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "workflow.db")
+    os.environ.setdefault("EXPO_PUBLIC_DEDALUS_API_KEY", "test")
+    from chat import ChatService
+    from workflow import Step, Workflow
+
+    print("\n--- Engine ---")
+    workflow = Workflow([
+        Step("a", "A", slow_step("a")),
+        Step("b", "B", slow_step("b")),
+        Step("c", "C", slow_step("c"), depends_on=("a", "b")),
+    ])
+    start = time.perf_counter()
+    events = [e async for e in workflow.stream()]
+    elapsed = time.perf_counter() - start
+    text = [e.text for e in events if e.kind == "chunk"]
+    print(f"{elapsed:.2f}s, output {text}")
+    if elapsed < STEP_LATENCY * 2.5 and text == ["a", "b", "c <- ['a', 'b']"]:
+        print("✅ Independent steps ran concurrently; output is in step order.")
+    else:
+        print("❌ Steps ran sequentially or out of order.")
+
+    failing = Workflow([
+        Step("a", "A", slow_step("a", fail=True)),
+        Step("b", "B", slow_step("b")),
+        Step("c", "C", slow_step("c"), depends_on=("a",)),
+    ])
+    kinds = [(e.step.name, e.kind) for e in [e async for e in failing.stream()] if e.kind != "chunk"]
+    print(kinds)
+    if ("a", "failed") in kinds and ("b", "finished") in kinds and ("c", "skipped") in kinds:
+        print("✅ A failed step skips only its dependents.")
+    else:
+        print("❌ Unexpected failure handling.")
+
+    print("\n--- Deep analysis workflow ---")
+    service = ChatService()
+    service.dedalus_client = FakeStreamingDedalus()
+    messages = [{"role": "user", "content": "Analyze my spending and plan my savings"}]
+    start = time.perf_counter()
+    arrivals = []
+    async for chunk in service.get_response_stream(messages, "Net Worth: $1,000\n"):
+        arrivals.append((time.perf_counter() - start, chunk))
+    elapsed = time.perf_counter() - start
+    output = "".join(c for _, c in arrivals)
+    print(output)
+    first_progress = next(t for t, c in arrivals if c.startswith("**Step 1"))
+    if elapsed < 1.0 and first_progress < 0.05 and "Step timing" in output and "Step 3" in output:
+        print(f"✅ Workflow streamed progress immediately and finished in {elapsed:.2f}s with step timing.")
+    else:
+        print(f"❌ Workflow took {elapsed:.2f}s (first progress at {first_progress:.2f}s).")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_workflow())
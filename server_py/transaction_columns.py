@@ -0,0 +1,279 @@
+"""
+Columnar Transaction Container
+
+A compact, array-backed alternative to passing transactions around as lists of
+per-transaction dicts. Numeric fields live in NumPy arrays and repeated strings
+(account, name, merchant, category path, channel, currency, regret reason) are
+dictionary-encoded, so each distinct value is stored once and rows hold int32
+codes.
+
+Filtering and aggregation run as vectorized array operations; `to_dicts()` and
+iteration produce the usual API transaction dicts for serialization.
+
+`from_dicts()` also takes client-posted transactions, so malformed fields are
+coerced rather than rejected: a missing id becomes "", an unparseable date
+None, a non-numeric amount 0 and a single category string a one-element path.
+"""
+
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+NO_REGRET = -1
+
+# Dimensions accepted by TransactionColumns.sum_by
+AGGREGATE_DIMENSIONS = ("category", "merchant", "account", "payment_channel")
+
+
+def _day(value) -> np.datetime64:
+    """`value` as a day, or NaT if it isn't a parseable date."""
+    if isinstance(value, date):
+        value = value.isoformat()
+    if not isinstance(value, str) or value == "NaT":
+        return np.datetime64("NaT")
+    try:
+        return np.datetime64(value, "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _amount(value) -> float:
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _category_path(value) -> tuple:
+    if isinstance(value, str):
+        return (value,)
+    if isinstance(value, (list, tuple)):
+        return tuple(str(part) for part in value)
+    return ()
+
+
+class StringTable:
+    """Append-only intern table mapping distinct values to dense integer codes."""
+
+    __slots__ = ("values", "_index")
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._index: Dict[Any, int] = {}
+
+    def code(self, value) -> int:
+        c = self._index.get(value)
+        if c is None:
+            c = len(self.values)
+            self._index[value] = c
+            self.values.append(value)
+        return c
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class _Tables:
+    __slots__ = ("account", "name", "merchant", "category", "payment_channel", "currency", "reason")
+
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, StringTable())
+
+
+class TransactionColumns:
+    """
+    Column-oriented set of transactions.
+
+    Derived views (slices, filter results) share the parent's intern tables, so
+    they cost only the index arrays.
+    """
+
+    __slots__ = (
+        "transaction_id", "amount", "date", "pending", "regret_score",
+        "account", "name", "merchant", "category", "payment_channel", "currency", "reason",
+        "_tables",
+    )
+
+    def __init__(self, tables: _Tables, columns: Dict[str, np.ndarray]):
+        self._tables = tables
+        for field, values in columns.items():
+            setattr(self, field, values)
+
+    @classmethod
+    def from_dicts(cls, transactions: Iterable[Dict[str, Any]]) -> "TransactionColumns":
+        """Build from API-shaped transaction dicts (any iterable, consumed once)."""
+        tables = _Tables()
+        ids, amounts, dates, pending, regret = [], [], [], [], []
+        codes: Dict[str, List[int]] = {field: [] for field in _Tables.__slots__}
+
+        for t in transactions:
+            if not isinstance(t, dict):
+                continue
+            ids.append(str(t.get("transaction_id") or "").encode())
+            amounts.append(t.get("amount") or 0.0)
+            dates.append(t.get("date") or "NaT")
+            pending.append(bool(t.get("pending")))
+            score = t.get("regretScore")
+            regret.append(NO_REGRET if score is None else score)
+            codes["account"].append(tables.account.code(t.get("account_id")))
+            codes["name"].append(tables.name.code(t.get("name")))
+            codes["merchant"].append(tables.merchant.code(t.get("merchant_name")))
+            codes["category"].append(tables.category.code(_category_path(t.get("category"))))
+            codes["payment_channel"].append(tables.payment_channel.code(t.get("payment_channel")))
+            codes["currency"].append(tables.currency.code(t.get("iso_currency_code")))
+            codes["reason"].append(tables.reason.code(t.get("regretReason")))
+
+        # Convert in bulk; only a column with a malformed value is converted row by row
+        try:
+            amount_column = np.array(amounts, dtype=np.float64)
+        except (TypeError, ValueError):
+            amount_column = np.array([_amount(a) for a in amounts], dtype=np.float64)
+        try:
+            date_column = np.array(dates, dtype="datetime64[D]")
+        except (TypeError, ValueError):
+            date_column = np.array([_day(d) for d in dates], dtype="datetime64[D]")
+
+        columns = {
+            # Plaid ids are ASCII, so fixed-width UTF-8 bytes is ~1 byte/char vs ~50 bytes of str overhead
+            "transaction_id": np.array(ids, dtype="S"),
+            "amount": amount_column,
+            "date": date_column,
+            "pending": np.array(pending, dtype=bool),
+            "regret_score": np.array(regret, dtype=np.int16),
+        }
+        for field, values in codes.items():
+            columns[field] = np.array(values, dtype=np.int32)
+        return cls(tables, columns)
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def _take(self, index) -> "TransactionColumns":
+        return TransactionColumns(
+            self._tables,
+            {field: getattr(self, field)[index] for field in self.__slots__ if field != "_tables"},
+        )
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self._row(int(index))
+        return self._take(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for start in range(0, len(self), 1024):
+            yield from self._take(slice(start, start + 1024)).to_dicts()
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        return self._take(slice(i, i + 1)).to_dicts()[0]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Serialize to API transaction dicts, converting each column in bulk."""
+        tables = self._tables
+        accounts = tables.account.values
+        names = tables.name.values
+        merchants = tables.merchant.values
+        categories = tables.category.values
+        channels = tables.payment_channel.values
+        currencies = tables.currency.values
+        reasons = tables.reason.values
+        return [
+            {
+                "transaction_id": tid.decode(),
+                "account_id": accounts[account],
+                "name": names[name],
+                "amount": amount,
+                "date": None if day == "NaT" else day,
+                "category": list(categories[category]),
+                "pending": pending,
+                "merchant_name": merchants[merchant],
+                "payment_channel": channels[channel],
+                "iso_currency_code": currencies[currency],
+                "regretScore": None if score == NO_REGRET else score,
+                "regretReason": reasons[reason],
+            }
+            for tid, account, name, amount, day, category, pending, merchant, channel, currency, score, reason in zip(
+                self.transaction_id.tolist(), self.account.tolist(), self.name.tolist(),
+                self.amount.tolist(), self.date.astype(str).tolist(), self.category.tolist(),
+                self.pending.tolist(), self.merchant.tolist(), self.payment_channel.tolist(),
+                self.currency.tolist(), self.regret_score.tolist(), self.reason.tolist(),
+            )
+        ]
+
+    def _primary_category_codes(self):
+        """Per-row code into (distinct primary categories), plus that key list."""
+        primaries = StringTable()
+        mapping = np.array(
+            [primaries.code(path[0] if path else "Uncategorized") for path in self._tables.category.values],
+            dtype=np.int32,
+        )
+        return mapping[self.category], primaries.values
+
+    def _codes_for(self, dimension: str):
+        if dimension == "category":
+            return self._primary_category_codes()
+        if dimension == "merchant":
+            # Fall back to name when there is no merchant, as the SQLite store does
+            tables = self._tables
+            keys = StringTable()
+            merchant_keys = np.array([keys.code(m) for m in tables.merchant.values], dtype=np.int32)
+            name_keys = np.array([keys.code(n) for n in tables.name.values], dtype=np.int32)
+            none_code = tables.merchant._index.get(None, -1)
+            codes = np.where(self.merchant == none_code, name_keys[self.name], merchant_keys[self.merchant])
+            return codes, keys.values
+        if dimension == "account":
+            return self.account, self._tables.account.values
+        if dimension == "payment_channel":
+            return self.payment_channel, self._tables.payment_channel.values
+        raise ValueError(f"Unknown dimension '{dimension}', expected one of {list(AGGREGATE_DIMENSIONS)}")
+
+    def filter(self, start_date=None, end_date=None, category: Optional[str] = None,
+               merchant: Optional[str] = None, min_amount: Optional[float] = None,
+               max_amount: Optional[float] = None, min_regret: Optional[int] = None) -> "TransactionColumns":
+        """Vectorized equivalent of the /transactions/query filters (category/merchant are case-insensitive)."""
+        mask = np.ones(len(self), dtype=bool)
+        if start_date is not None:
+            mask &= self.date >= np.datetime64(str(start_date), "D")
+        if end_date is not None:
+            mask &= self.date <= np.datetime64(str(end_date), "D")
+        if min_amount is not None:
+            mask &= self.amount >= min_amount
+        if max_amount is not None:
+            mask &= self.amount <= max_amount
+        if min_regret is not None:
+            mask &= self.regret_score >= min_regret
+        for dimension, wanted in (("category", category), ("merchant", merchant)):
+            if wanted is None:
+                continue
+            codes, keys = self._codes_for(dimension)
+            matching = [i for i, k in enumerate(keys) if isinstance(k, str) and k.lower() == wanted.lower()]
+            mask &= np.isin(codes, matching)
+        return self._take(np.flatnonzero(mask))
+
+    def spend(self) -> "TransactionColumns":
+        """Outflows only (positive Plaid amounts)."""
+        return self._take(np.flatnonzero(self.amount > 0))
+
+    def sum_by(self, dimension: str = "category") -> Dict[Any, Dict[str, Any]]:
+        """Total, count and regret-weighted total per key, largest total first."""
+        codes, keys = self._codes_for(dimension)
+        n = len(keys)
+        totals = np.bincount(codes, weights=self.amount, minlength=n)
+        counts = np.bincount(codes, minlength=n)
+        scores = np.where(self.regret_score == NO_REGRET, 0, self.regret_score)
+        regret = np.bincount(codes, weights=self.amount * scores / 100.0, minlength=n)
+
+        result = {}
+        for code in np.argsort(-totals):
+            if counts[code]:
+                result[keys[code]] = {
+                    "total": round(float(totals[code]), 2),
+                    "count": int(counts[code]),
+                    "regret_weighted": round(float(regret[code]), 2),
+                }
+        return result
+
+    def nbytes(self) -> int:
+        """Approximate size of the column arrays (excludes the shared intern tables)."""
+        return sum(getattr(self, field).nbytes for field in self.__slots__ if field != "_tables")
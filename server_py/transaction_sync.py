@@ -0,0 +1,217 @@
+"""
+Plaid Transaction Sync
+
+Keeps the local transaction store (see database.py) current using Plaid's
+cursor-based /transactions/sync endpoint. Each sync pulls only the
+added/modified/removed deltas since the stored cursor and writes them, together
+with the new cursor, in a single SQLite transaction.
+
+Also provides fetch_transaction_pages for pulling a full date range through
+/transactions/get with concurrent page requests.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+import plaid
+from plaid.model.transactions_get_request import TransactionsGetRequest
+from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+from plaid.model.transactions_sync_request import TransactionsSyncRequest
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Max transactions Plaid returns per /transactions/sync page
+SYNC_PAGE_SIZE = 500
+
+# Don't start another background refresh for an item more often than this
+MIN_REFRESH_INTERVAL_SECONDS = float(os.environ.get("PLAID_SYNC_MIN_INTERVAL", "30"))
+
+MUTATION_DURING_PAGINATION = "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
+# Attempts at a full pagination when the item keeps changing mid-sync, and the
+# first (jittered, doubling) pause before restarting
+SYNC_MUTATION_MAX_ATTEMPTS = int(os.environ.get("PLAID_SYNC_MUTATION_MAX_ATTEMPTS", "4"))
+SYNC_MUTATION_BACKOFF_SECONDS = float(os.environ.get("PLAID_SYNC_MUTATION_BACKOFF", "0.5"))
+
+# Max transactions per /transactions/get page, and how many pages to request at once
+GET_PAGE_SIZE = 500
+PAGE_CONCURRENCY = int(os.environ.get("PLAID_PAGE_CONCURRENCY", "4"))
+
+
+def map_transaction(txn) -> Dict[str, Any]:
+    """Convert a Plaid Transaction model into the dict shape served by the API."""
+    # Time of day is only reported by some institutions
+    timestamp = getattr(txn, "datetime", None) or getattr(txn, "authorized_datetime", None)
+    return {
+        "transaction_id": txn.transaction_id,
+        "account_id": txn.account_id,
+        "name": txn.name,
+        "amount": txn.amount,
+        "date": str(txn.date),
+        "category": list(txn.category) if txn.category else [],
+        "pending": txn.pending,
+        "merchant_name": txn.merchant_name,
+        "payment_channel": str(txn.payment_channel),
+        "iso_currency_code": txn.iso_currency_code,
+        "datetime": str(timestamp) if timestamp else None,
+    }
+
+
+async def fetch_transaction_pages(
+    plaid_service,
+    access_token: str,
+    start_date,
+    end_date,
+    page_size: int = GET_PAGE_SIZE,
+    max_concurrency: int = PAGE_CONCURRENCY,
+) -> AsyncGenerator[Tuple[int, List[Dict[str, Any]], int], None]:
+    """
+    Fetch every transaction in [start_date, end_date] via /transactions/get.
+
+    The first page is requested alone to learn total_transactions; the remaining
+    pages are then requested concurrently (at most `max_concurrency` in flight).
+    Yields (page_index, transactions, total) as each page arrives, so pages after
+    the first may come out of order.
+    """
+    async def get_page(offset: int):
+        request = TransactionsGetRequest(
+            access_token=access_token,
+            start_date=start_date,
+            end_date=end_date,
+            options=TransactionsGetRequestOptions(count=page_size, offset=offset),
+        )
+        return await plaid_service.transactions_get(request)
+
+    first = await get_page(0)
+    total = first.total_transactions
+    yield 0, [map_transaction(t) for t in first.transactions], total
+
+    page_count = -(-total // page_size)
+    if page_count <= 1:
+        return
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded_page(index: int):
+        async with semaphore:
+            response = await get_page(index * page_size)
+        return index, response
+
+    tasks = [asyncio.create_task(bounded_page(i)) for i in range(1, page_count)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, response = await next_done
+            yield index, [map_transaction(t) for t in response.transactions], total
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class TransactionSyncService:
+    """
+    Incremental Plaid -> SQLite transaction sync.
+    One sync runs per item at a time; background refreshes are rate limited.
+    """
+
+    def __init__(self, plaid_service):
+        self.plaid_service = plaid_service
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._last_sync: Dict[str, float] = {}
+
+    def has_synced(self, item_id: str) -> bool:
+        return database.get_sync_cursor(item_id) is not None
+
+    async def sync(self, access_token: str, item_id: str) -> Dict[str, int]:
+        """Pull all pending deltas for an item and persist them. Returns delta counts."""
+        lock = self._locks.setdefault(item_id, asyncio.Lock())
+        async with lock:
+            cursor = database.get_sync_cursor(item_id)
+            added, modified, removed, next_cursor = await self._fetch_deltas(access_token, cursor)
+            database.apply_transaction_sync(item_id, added, modified, removed, next_cursor)
+            self._last_sync[item_id] = time.monotonic()
+
+        counts = {"added": len(added), "modified": len(modified), "removed": len(removed)}
+        logger.info(f"Synced Plaid item {item_id}: {counts}")
+        return counts
+
+    async def _fetch_deltas(
+        self, access_token: str, cursor: Optional[str]
+    ) -> Tuple[List[Dict], List[Dict], List[str], str]:
+        for attempt in range(1, SYNC_MUTATION_MAX_ATTEMPTS + 1):
+            try:
+                return await self._fetch_pages(access_token, cursor)
+            except plaid.ApiException as e:
+                error_body = json.loads(e.body) if e.body else {}
+                if error_body.get("error_code") != MUTATION_DURING_PAGINATION or attempt == SYNC_MUTATION_MAX_ATTEMPTS:
+                    raise
+                # Plaid requires restarting the whole pagination from the original cursor;
+                # give the item a moment to settle first
+                delay = SYNC_MUTATION_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logger.warning(f"Transactions changed during sync pagination, restarting in {delay:.1f}s "
+                               f"(attempt {attempt} of {SYNC_MUTATION_MAX_ATTEMPTS})")
+                await asyncio.sleep(delay)
+
+    async def _fetch_pages(
+        self, access_token: str, cursor: Optional[str]
+    ) -> Tuple[List[Dict], List[Dict], List[str], str]:
+        added: List[Dict] = []
+        modified: List[Dict] = []
+        removed: List[str] = []
+        next_cursor = cursor or ""
+        has_more = True
+
+        while has_more:
+            request_args = {"access_token": access_token, "count": SYNC_PAGE_SIZE}
+            if next_cursor:
+                request_args["cursor"] = next_cursor
+            request = TransactionsSyncRequest(**request_args)
+            response = await self.plaid_service.transactions_sync(request)
+
+            added.extend(map_transaction(t) for t in response.added)
+            modified.extend(map_transaction(t) for t in response.modified)
+            removed.extend(r.transaction_id for r in response.removed)
+            next_cursor = response.next_cursor
+            has_more = response.has_more
+
+        return added, modified, removed, next_cursor
+
+    def refresh_in_background(self, access_token: str, item_id: str) -> bool:
+        """
+        Schedule a sync without waiting for it. Skipped if one is already running
+        or the item was synced within MIN_REFRESH_INTERVAL_SECONDS.
+        Returns True if a refresh was started.
+        """
+        task = self._tasks.get(item_id)
+        if task and not task.done():
+            return False
+
+        last = self._last_sync.get(item_id)
+        if last is not None and time.monotonic() - last < MIN_REFRESH_INTERVAL_SECONDS:
+            return False
+
+        self._tasks[item_id] = asyncio.create_task(self._background_sync(access_token, item_id))
+        return True
+
+    async def _background_sync(self, access_token: str, item_id: str) -> None:
+        try:
+            await self.sync(access_token, item_id)
+        except plaid.ApiException as e:
+            error_body = json.loads(e.body) if e.body else {}
+            logger.error(f"Background transaction sync failed: {error_body}")
+        except Exception as e:
+            logger.error(f"Background transaction sync failed: {e}")
+
+    def forget(self, item_id: str) -> None:
+        """Drop local state for an item (e.g. after disconnect)."""
+        task = self._tasks.pop(item_id, None)
+        if task and not task.done():
+            task.cancel()
+        self._last_sync.pop(item_id, None)
+        database.clear_item_transactions(item_id)
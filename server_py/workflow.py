@@ -0,0 +1,113 @@
+"""
+Workflow Engine
+
+Runs a small DAG of streaming analysis steps for the advisor chat.
+
+- Each Step names the steps it depends on and is an async generator of text
+  chunks, called with the finished outputs of its dependencies.
+- A step starts as soon as its dependencies finish, so independent steps run
+  concurrently.
+- Workflow.stream() yields events in the steps' declared order. The step
+  being shown streams live; later steps that are already running buffer their
+  chunks and flush as soon as their turn comes.
+- A failed step is reported and its dependents are skipped; unrelated steps
+  carry on. Closing the stream cancels every step still running.
+- Each step's finished event carries its start offset and duration.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+
+@dataclass
+class Step:
+    name: str
+    title: str
+    run: Callable[[Dict[str, str]], AsyncIterator[str]]
+    depends_on: Sequence[str] = ()
+
+
+@dataclass
+class WorkflowEvent:
+    kind: str  # "started" | "chunk" | "finished" | "failed" | "skipped"
+    step: Step
+    text: str = ""
+    started_at: Optional[float] = None  # seconds after the workflow started
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class _StepState:
+    # _STARTED, then text chunks, then None when the step ends
+    chunks: "asyncio.Queue[Optional[str]]" = field(default_factory=asyncio.Queue)
+    done: "asyncio.Future[bool]" = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+    output: List[str] = field(default_factory=list)
+    started_at: Optional[float] = None
+    duration: Optional[float] = None
+    error: Optional[str] = None
+    skipped: bool = False
+
+
+_STARTED = object()
+
+
+class Workflow:
+    def __init__(self, steps: List[Step]):
+        names = [s.name for s in steps]
+        if len(set(names)) != len(names):
+            raise ValueError("Workflow step names must be unique")
+        known = set()
+        for step in steps:
+            missing = [d for d in step.depends_on if d not in known]
+            if missing:
+                raise ValueError(f"Step {step.name!r} depends on {missing}, which must be declared before it")
+            known.add(step.name)
+        self.steps = steps
+
+    async def _run_step(self, step: Step, states: Dict[str, _StepState], t0: float) -> None:
+        state = states[step.name]
+        try:
+            ok = all(await asyncio.gather(*(states[d].done for d in step.depends_on)))
+            if not ok:
+                state.skipped = True
+                return
+            state.started_at = time.perf_counter() - t0
+            state.chunks.put_nowait(_STARTED)
+            outputs = {d: "".join(states[d].output) for d in step.depends_on}
+            async for chunk in step.run(outputs):
+                state.output.append(chunk)
+                state.chunks.put_nowait(chunk)
+        except Exception as e:
+            state.error = str(e) or type(e).__name__
+        finally:
+            if state.started_at is not None:
+                state.duration = time.perf_counter() - t0 - state.started_at
+            state.chunks.put_nowait(None)
+            if not state.done.done():
+                state.done.set_result(state.error is None and not state.skipped)
+
+    async def stream(self) -> AsyncIterator[WorkflowEvent]:
+        t0 = time.perf_counter()
+        states = {step.name: _StepState() for step in self.steps}
+        tasks = [asyncio.create_task(self._run_step(step, states, t0)) for step in self.steps]
+        try:
+            for step in self.steps:
+                state = states[step.name]
+                item = await state.chunks.get()
+                if item is None:
+                    yield WorkflowEvent("skipped", step)
+                    continue
+                yield WorkflowEvent("started", step, started_at=state.started_at)
+                item = await state.chunks.get()
+                while item is not None:
+                    yield WorkflowEvent("chunk", step, text=item)
+                    item = await state.chunks.get()
+                kind = "failed" if state.error else "finished"
+                yield WorkflowEvent(kind, step, started_at=state.started_at, duration=state.duration, error=state.error)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)